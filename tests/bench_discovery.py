@@ -0,0 +1,113 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive discovery benchmark.
+
+Compares probing every archive method per path, as done previously, with
+extension-based method lookup on scanned directory entries.
+
+Usage: python tests/bench_discovery.py [ENTRY_COUNT]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tzar.internal import (  # noqa: E402
+    DiscoveredArchive,
+    METHOD_MAP,
+    get_timestamp_matcher,
+)
+from tzar.internal.metadata import (  # noqa: E402
+    get_metadata_folder,
+    is_metadata_name,
+)
+
+EXTENSIONS = ['.tar.gz', '.tar.xz', '.zip', '.txt']
+
+
+def populate(folder: Path, entry_count: int):
+    # Real archive folders have a metadata folder, which is not an archive.
+    get_metadata_folder(folder).mkdir()
+    for entry_idx in range(entry_count):
+        seconds = entry_idx % 60
+        minutes = (entry_idx // 60) % 60
+        hours = (entry_idx // 3600) % 24
+        name = f'test_20200101-{hours:02d}{minutes:02d}{seconds:02d}_{entry_idx}'
+        if entry_idx % 10 == 0:
+            (folder / name).mkdir()
+        else:
+            (folder / f'{name}{EXTENSIONS[entry_idx % len(EXTENSIONS)]}').touch()
+
+
+def probe_method(method_cls, path: Path) -> bool:
+    # Former per-method check, with a stat() call per method and path.
+    if method_cls.folder:
+        if not path.is_dir():
+            return False
+    elif not path.is_file():
+        return False
+    return not method_cls.extension or path.name.endswith(method_cls.extension)
+
+
+def discover_probing(folder: Path) -> int:
+    count = 0
+    for path in folder.glob('*'):
+        if is_metadata_name(path.name):
+            continue
+        for method_cls in METHOD_MAP.values():
+            if probe_method(method_cls, path):
+                path.stat()
+                count += 1
+                break
+    return count
+
+
+def discover_scanning(folder: Path) -> int:
+    timestamp_matcher = get_timestamp_matcher('%Y%m%d-%H%M%S')
+    count = 0
+    with os.scandir(folder) as dir_entries:
+        for dir_entry in dir_entries:
+            if is_metadata_name(dir_entry.name):
+                continue
+            if DiscoveredArchive.get(folder / dir_entry.name,
+                                     timestamp_matcher,
+                                     dir_entry=dir_entry) is not None:
+                count += 1
+    return count
+
+
+def main():
+    entry_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with TemporaryDirectory() as temp_folder:
+        folder = Path(temp_folder)
+        populate(folder, entry_count)
+        for label, function in (('probing', discover_probing),
+                                ('scanning', discover_scanning)):
+            start_time = time.perf_counter()
+            count = function(folder)
+            elapsed = time.perf_counter() - start_time
+            print(f'{label:10s} {count:8d} archives {elapsed:8.3f} seconds')
+
+
+if __name__ == '__main__':
+    main()
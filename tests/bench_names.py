@@ -0,0 +1,66 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Archive name parsing benchmark.
+
+Parses a batch of synthetic archive names with time stamps spread over 25
+years, for the default and a non-default timestamp format.
+
+Usage: python tests/bench_names.py [NAME_COUNT]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tzar.internal import (  # noqa: E402
+    ArchiveNameParser,
+    get_timestamp_matcher,
+)
+
+TIMESTAMP_FORMATS = ['%Y%m%d-%H%M%S', '%Y-%m-%dT%H.%M.%S']
+TAGS = ['', '_a', '_a,b', '_b_c', '_daily']
+
+
+def make_names(name_count: int, timestamp_format: str) -> list[str]:
+    rng = random.Random(1)
+    start_time = time.mktime((2000, 1, 1, 0, 0, 0, 0, 0, -1))
+    names: list[str] = []
+    for name_idx in range(name_count):
+        name_time = time.localtime(start_time + rng.randrange(25 * 365 * 86400))
+        names.append(f'src{name_idx % 50}'
+                     f'_{time.strftime(timestamp_format, name_time)}'
+                     f'{rng.choice(TAGS)}')
+    return names
+
+
+def main():
+    name_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for timestamp_format in TIMESTAMP_FORMATS:
+        names = make_names(name_count, timestamp_format)
+        parser = ArchiveNameParser(get_timestamp_matcher(timestamp_format))
+        start_time = time.perf_counter()
+        parser.parse_names(names)
+        elapsed = time.perf_counter() - start_time
+        print(f'{timestamp_format:20s} {name_count:8d} names {elapsed:8.3f} seconds')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+import fcntl
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import (
+    Mock,
+    patch,
+)
+
+from tzar.internal import (
+    clean_partial_archives,
+    has_trash,
+    save_archive,
+)
+from tzar.internal.archive import (
+    CatalogSpec,
+    PARTIAL_FOLDER_NAME,
+)
+from tzar.internal.metadata import get_metadata_folder
+
+# Fake rsync that logs its arguments and whether the destination already
+# existed, and fails after copying one file when a "fail" file is present.
+# Files missing from the source are deleted from the destination with --delete.
+FAKE_RSYNC = f'''#!{sys.executable}
+import json, os, shutil, sys
+bin_folder = os.path.dirname(sys.argv[0])
+source, destination = sys.argv[-2:]
+with open(os.path.join(bin_folder, 'rsync.log'), 'a') as log_file:
+    log_file.write(json.dumps([sys.argv[1:], os.path.isdir(destination)]) + '\\n')
+if os.path.exists(os.path.join(bin_folder, 'fail')):
+    os.makedirs(destination, exist_ok=True)
+    shutil.copy2(os.path.join(source, 'a.txt'), destination)
+    sys.exit(1)
+shutil.copytree(source, destination, dirs_exist_ok=True)
+if '--delete' in sys.argv:
+    for name in set(os.listdir(destination)) - set(os.listdir(source)):
+        os.unlink(os.path.join(destination, name))
+'''
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.temp_path = Path(self.temp_folder.name)
+        self.source_folder = self.temp_path / 'src'
+        self.source_folder.mkdir()
+        (self.source_folder / 'a.txt').write_text('a')
+        (self.source_folder / 'b.txt').write_text('b')
+        self.archive_folder = self.temp_path / 'archives'
+        self.partial_folder = get_metadata_folder(self.archive_folder, PARTIAL_FOLDER_NAME)
+        self.bin_folder = self.temp_path / 'bin'
+        self.bin_folder.mkdir()
+        self._write_program('rsync', FAKE_RSYNC)
+        params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+        self.runtime = Mock(get_param=params.get, options=Mock(dry_run=False, verbose=False))
+        self.catalog_spec = CatalogSpec(self.source_folder, self.archive_folder, 'src')
+        self.path_patch = patch.dict(os.environ, {
+            'PATH': os.pathsep.join([str(self.bin_folder), os.environ['PATH']])})
+        self.path_patch.start()
+
+    def tearDown(self):
+        self.path_patch.stop()
+        self.temp_folder.cleanup()
+
+    def _write_program(self, name: str, text: str):
+        program_path = self.bin_folder / name
+        program_path.write_text(text)
+        program_path.chmod(0o755)
+
+    def _read_rsync_log(self) -> list[tuple[list[str], bool]]:
+        with open(self.bin_folder / 'rsync.log', encoding='utf-8') as log_file:
+            return [tuple(json.loads(line)) for line in log_file]
+
+    def _list_partial_folder(self) -> list[str]:
+        # Lock files are left behind.
+        return sorted(name for name in os.listdir(self.partial_folder)
+                      if not name.startswith('.'))
+
+    def test_failed_save(self):
+        self._write_program('pigz', '#!/bin/sh\ncat > /dev/null\nexit 1\n')
+        with self.assertRaises(SystemExit):
+            save_archive(self.runtime, self.catalog_spec, 'gz')
+        self.assertEqual([], [name for name in os.listdir(self.archive_folder)
+                              if not name.startswith('.')])
+        self.assertEqual([], self._list_partial_folder())
+
+    def test_locked_save(self):
+        self.partial_folder.mkdir(parents=True)
+        with open(self.partial_folder / '.src.tar.gz.lock', 'w', encoding='utf-8') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            with self.assertRaises(SystemExit):
+                save_archive(self.runtime, self.catalog_spec, 'gz')
+        self.assertFalse((self.archive_folder / 'src.tar.gz').exists())
+
+    def test_resumed_save(self):
+        (self.bin_folder / 'fail').touch()
+        with self.assertRaises(SystemExit):
+            save_archive(self.runtime, self.catalog_spec, 'files')
+        # The partial archive is kept for the next save.
+        self.assertEqual(['src'], self._list_partial_folder())
+        (self.bin_folder / 'fail').unlink()
+        save_archive(self.runtime, self.catalog_spec, 'files')
+        (first_arguments, first_existed), (second_arguments, second_existed) = \
+            self._read_rsync_log()
+        self.assertEqual(first_arguments[-1], second_arguments[-1])
+        self.assertFalse(first_existed)
+        self.assertTrue(second_existed)
+        self.assertEqual(['a.txt', 'b.txt'], sorted(os.listdir(self.archive_folder / 'src')))
+        self.assertEqual([], self._list_partial_folder())
+
+    def test_resumed_save_deleted_file(self):
+        (self.bin_folder / 'fail').touch()
+        with self.assertRaises(SystemExit):
+            save_archive(self.runtime, self.catalog_spec, 'files')
+        (self.bin_folder / 'fail').unlink()
+        (self.source_folder / 'a.txt').unlink()
+        save_archive(self.runtime, self.catalog_spec, 'files')
+        (first_arguments, _first_existed), (second_arguments, _second_existed) = \
+            self._read_rsync_log()
+        self.assertNotIn('--delete', first_arguments)
+        self.assertIn('--delete', second_arguments)
+        self.assertIn('--delete-excluded', second_arguments)
+        self.assertEqual(['b.txt'], os.listdir(self.archive_folder / 'src'))
+
+    def test_republished_folder(self):
+        save_archive(self.runtime, self.catalog_spec, 'files')
+        (self.source_folder / 'b.txt').write_text('changed')
+        save_archive(self.runtime, self.catalog_spec, 'files')
+        (_first_arguments, _first_existed), (second_arguments, _second_existed) = \
+            self._read_rsync_log()
+        # The existing folder archive is linked, replaced, and the old one deleted.
+        self.assertIn(f'--link-dest={self.archive_folder.absolute() / "src"}', second_arguments)
+        self.assertEqual('changed', (self.archive_folder / 'src' / 'b.txt').read_text())
+        self.assertFalse(has_trash(self.archive_folder))
+
+    def test_clean_partial_archives(self):
+        self.partial_folder.mkdir(parents=True)
+        (self.partial_folder / 'src.tar.gz').write_bytes(b'stale')
+        (self.partial_folder / 'other.tar.gz').write_bytes(b'saving')
+        (self.partial_folder / 'resumable').mkdir()
+        (self.partial_folder / '.tzar_new.tmp').write_bytes(b'new')
+        old_temporary_path = self.partial_folder / '.tzar_old.tmp'
+        old_temporary_path.write_bytes(b'old')
+        old_time = time.time() - 2 * 86400
+        os.utime(old_temporary_path, (old_time, old_time))
+        with open(self.partial_folder / '.other.tar.gz.lock', 'w', encoding='utf-8') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            clean_partial_archives(self.archive_folder)
+        self.assertEqual(['.other.tar.gz.lock',
+                          '.src.tar.gz.lock',
+                          '.tzar_new.tmp',
+                          'other.tar.gz',
+                          'resumable'],
+                         sorted(os.listdir(self.partial_folder)))
@@ -0,0 +1,80 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal import (
+    AutoSaver,
+    SaveSchedule,
+    WatchEvent,
+    WatchedSource,
+)
+from tzar.internal.archive import CatalogSpec
+from tzar.internal.watch import InotifyWatcher
+
+
+class LimitedWatcher(InotifyWatcher):
+    """Inotify watcher stand-in that runs out of watches."""
+
+    def __init__(self, watch_limit: int):
+        self.watch_limit = watch_limit
+        self.folders: list[Path] = []
+
+    def add_folder(self, folder: Path) -> bool:
+        if len(self.folders) >= self.watch_limit:
+            return False
+        self.folders.append(folder)
+        return True
+
+    def close(self):
+        pass
+
+
+class TestAutoSave(unittest.TestCase):
+
+    def test_due_time(self):
+        schedule = SaveSchedule(debounce=30, min_interval=600, max_staleness=3600)
+        source = WatchedSource(CatalogSpec(Path('/src'), Path('/archives'), 'src'))
+        self.assertIsNone(source.get_due_time(schedule))
+        source.mark_changed(1000)
+        # Debounced after the last change.
+        self.assertEqual(1030, source.get_due_time(schedule))
+        source.mark_changed(1020)
+        self.assertEqual(1050, source.get_due_time(schedule))
+        # Continuous changes are saved after the maximum staleness.
+        source.mark_changed(4590)
+        self.assertEqual(4600, source.get_due_time(schedule))
+        # Never sooner than the minimum interval after the last save.
+        source.last_save_time = 4500
+        self.assertEqual(5100, source.get_due_time(schedule))
+
+    def test_watch_failure(self):
+        with TemporaryDirectory() as temp_folder:
+            source_folder = Path(temp_folder) / 'src'
+            (source_folder / 'sub').mkdir(parents=True)
+            catalog_spec = CatalogSpec(source_folder, Path(temp_folder) / 'archives', 'src')
+            auto_saver = AutoSaver(None, [catalog_spec], LimitedWatcher(1), 'gz', SaveSchedule())
+            source = auto_saver.sources[0]
+            auto_saver._watch_folder(source_folder, source)
+            self.assertFalse(source.assume_changes)
+            # A new sub-folder can't be watched, so the source falls back to
+            # periodic checks, instead of missing changes.
+            auto_saver.handle_events([WatchEvent(source_folder, 'sub', is_folder=True)])
+            self.assertTrue(source.assume_changes)
+            self.assertIsNotNone(source.get_due_time(auto_saver.schedule))
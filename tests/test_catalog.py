@@ -15,17 +15,28 @@
 # You should have received a copy of the GNU General Public License
 # along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
 
+import csv
+import json
+import os
 import re
+import time
 from pathlib import Path
 from time import strptime, mktime
 import unittest
+from unittest.mock import patch
 
 import jiig
 
 from tzar.internal import (
+    ArchiveNameParser,
+    CatalogItem,
+    CatalogQueryIndex,
     DiscoveredArchive,
     build_catalog_list,
+    format_catalog,
     get_timestamp_matcher,
+    paginate_catalog_items,
+    sort_catalog_items,
 )
 
 
@@ -173,6 +184,110 @@ class TestCatalog(unittest.TestCase):
 
         )
 
+    def test_method_lookup(self):
+        for name, assumed_type, expected in (
+            ('test_20200101-000000.tar.gz', 1, 'gz'),
+            ('test_20200101-000000_a,b.tar.xz', 1, 'xz'),
+            ('test_20200101-000000.fluff.zip', 1, 'zip'),
+            ('test_20200101-000000.gz', 1, None),
+            ('test_20200101-000000.txt', 1, None),
+            ('test_20200101-000000', 2, 'files'),
+            ('test_20200101-000000.zip', 2, 'files'),
+        ):
+            registered_method = DiscoveredArchive.get_method(name, assumed_type=assumed_type)
+            actual = registered_method.name if registered_method is not None else None
+            self.assertEqual(actual, expected, name)
+
+    def test_name_parser_fast_path(self):
+        fast_parser = ArchiveNameParser(self.timestamp_matcher)
+        slow_parser = ArchiveNameParser(self.timestamp_matcher)
+        slow_parser.fast_path = False
+        self.assertTrue(fast_parser.fast_path)
+        for name in (
+            'test',
+            'test_',
+            'test_20200329-020458',
+            'test_20200329-020458_a,b_c',
+            'test_20200329-020458.fluff,muggle,fluffy',
+            'test_2020032-020458_a',
+            'test_20200329x020458_a',
+            'test_20191232-235959',
+            'test_abc,def',
+        ):
+            self.assertEqual(fast_parser.parse(name), slow_parser.parse(name), name)
+
+    def test_name_parser_daylight_savings(self):
+        # Days with daylight savings changes are converted per hour, and others per day.
+        with patch.dict(os.environ, {'TZ': 'America/New_York'}):
+            time.tzset()
+            try:
+                parser = ArchiveNameParser(self.timestamp_matcher)
+                for time_text in ('20200308-013000',
+                                  '20200308-030000',
+                                  '20200308-235959',
+                                  '20201101-003000',
+                                  '20201101-020000',
+                                  '20200309-120000'):
+                    self.assertEqual(mktime(strptime(time_text, '%Y%m%d-%H%M%S')),
+                                     parser.parse(f'test_{time_text}').time_stamp,
+                                     time_text)
+            finally:
+                time.tzset()
+
+    def test_query_index(self):
+        items = [
+            CatalogItem(Path(f'/my/archives/test_{idx}.zip'), 'zip', tags, 0, float(idx))
+            for idx, tags in enumerate((['a'], ['a', 'b'], [], ['b'], ['a', 'b'], ['a']))
+        ]
+        query_index = CatalogQueryIndex(list(reversed(items)))
+        self.assertEqual([item.time for item in query_index.query()], [5, 4, 3, 2, 1, 0])
+        self.assertEqual([item.time for item in query_index.query(timestamp_min=1,
+                                                                  timestamp_max=4)],
+                         [4, 3, 2, 1])
+        self.assertEqual([item.time for item in query_index.query(filter_tag_set={'a', 'b'})],
+                         [4, 1])
+        self.assertEqual([item.time for item in query_index.query(timestamp_max=3.5,
+                                                                  filter_tag_set={'a'})],
+                         [1, 0])
+        self.assertEqual(query_index.query(filter_tag_set={'c'}), [])
+        self.assertEqual(query_index.query(timestamp_min=10), [])
+
+    def test_sort_and_paginate(self):
+        items = [
+            CatalogItem(Path(f'/my/archives/test_{idx}.zip'), 'zip', [], size, 1000.0 - idx)
+            for idx, size in enumerate((30, 10, 20))
+        ]
+        self.assertEqual([item.size for item in sort_catalog_items(items, sort='size')],
+                         [30, 20, 10])
+        self.assertEqual([item.time for item in sort_catalog_items(items, ascending=True)],
+                         [998.0, 999.0, 1000.0])
+        self.assertEqual([item.size for item in paginate_catalog_items(items, offset=1, limit=1)],
+                         [10])
+        self.assertEqual(len(list(paginate_catalog_items(items, offset=1))), 2)
+
+    def test_output_formats(self):
+        items = [
+            CatalogItem(Path('/my/archives/test_20200101-000000_a,b.zip'), 'zip', ['a', 'b'], 10,
+                        mktime(strptime('20200101-000000', self.timestamp_format))),
+            CatalogItem(Path('/my/archives/test_20200102-000000.zip'), 'zip', [], 1234567,
+                        mktime(strptime('20200102-000000', self.timestamp_format))),
+        ]
+        table_lines = list(format_catalog(iter(items),
+                                          flagged_names=['test_20200102-000000.zip'],
+                                          flag_text='(flagged)'))
+        self.assertEqual(len(table_lines), 4)
+        self.assertTrue(table_lines[2].endswith('test_20200101-000000_a,b.zip'))
+        self.assertTrue(table_lines[3].endswith('test_20200102-000000.zip  (flagged)'))
+        json_data = json.loads('\n'.join(format_catalog(iter(items), output_format='json')))
+        self.assertEqual([row['tags'] for row in json_data], [['a', 'b'], []])
+        self.assertEqual(json_data[0]['time_string'], '2020-01-01T00:00:00')
+        self.assertEqual(json.loads('\n'.join(format_catalog([], output_format='json'))), [])
+        ndjson_lines = list(format_catalog(iter(items), output_format='ndjson'))
+        self.assertEqual(json.loads(ndjson_lines[1])['size'], 1234567)
+        csv_rows = list(csv.DictReader(format_catalog(iter(items), output_format='csv')))
+        self.assertEqual(csv_rows[0]['tags'], 'a,b')
+        self.assertEqual(csv_rows[1]['name'], 'test_20200102-000000.zip')
+
     def new_fake_file(self,
                       path: str | Path,
                       file_size: int,
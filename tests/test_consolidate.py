@@ -0,0 +1,140 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import os
+import shutil
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import (
+    Mock,
+    patch,
+)
+import zipfile
+
+from tzar.internal import (
+    CatalogItem,
+    can_consolidate_to,
+    consolidate_archives,
+)
+from tzar.internal.archive import CatalogSpec
+from tzar.internal.consolidate import merge_archive_members
+from tzar.internal.delta import (
+    DELTA_MANIFEST_NAME,
+    DELTA_VERSION,
+    get_delta_sidecar_path,
+    _write_json,
+)
+
+
+def _add_file(tar_file: tarfile.TarFile, name: str, data: bytes, mtime: int):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = mtime
+    tar_file.addfile(info, io.BytesIO(data))
+
+
+class TestConsolidate(unittest.TestCase):
+
+    def test_can_consolidate_to(self):
+        self.assertTrue(can_consolidate_to('gz'))
+        self.assertTrue(can_consolidate_to('xz'))
+        self.assertFalse(can_consolidate_to('files'))
+        self.assertFalse(can_consolidate_to('zip'))
+        self.assertFalse(can_consolidate_to('gz-shards'))
+
+    def test_merge(self):
+        with TemporaryDirectory() as temp_folder:
+            old_path = Path(temp_folder) / 'src_20230101-000000.tar.gz'
+            with tarfile.open(old_path, 'w:gz') as tar_file:
+                _add_file(tar_file, './a.txt', b'old a', 100)
+                _add_file(tar_file, './b.txt', b'old b', 100)
+            new_path = Path(temp_folder) / 'src_20230102-000000_pending.zip'
+            with zipfile.ZipFile(new_path, 'w') as zip_file:
+                zip_file.writestr('a.txt', b'new a')
+                zip_file.writestr('c/c.txt', b'new c')
+            items = [
+                CatalogItem(new_path, 'zip', ['pending'], 0, 200.0),
+                CatalogItem(old_path, 'gz', [], 0, 100.0),
+            ]
+            output_stream = io.BytesIO()
+            members_file = io.StringIO()
+            with tarfile.open(fileobj=output_stream, mode='w|') as output_tar:
+                self.assertEqual(3, merge_archive_members(items, output_tar, members_file))
+            output_stream.seek(0)
+            with tarfile.open(fileobj=output_stream, mode='r:') as tar_file:
+                self.assertEqual(['a.txt', 'c/c.txt', 'b.txt'], tar_file.getnames())
+                self.assertEqual(b'new a', tar_file.extractfile('a.txt').read())
+                self.assertEqual(b'old b', tar_file.extractfile('b.txt').read())
+            self.assertEqual(['a.txt', 'c/c.txt', 'b.txt'],
+                             [line.split('\t')[2] for line in members_file.getvalue().splitlines()])
+
+    @unittest.skipUnless(shutil.which('xz'), 'xz is required')
+    def test_consolidate_archives(self):
+        with TemporaryDirectory() as temp_folder:
+            # Only xz is available, i.e. no pixz, so "xz -T0" is chosen.
+            bin_folder = Path(temp_folder) / 'bin'
+            bin_folder.mkdir()
+            (bin_folder / 'xz').symlink_to(shutil.which('xz'))
+            archive_folder = Path(temp_folder) / 'archives'
+            archive_folder.mkdir()
+            old_path = archive_folder / 'src_20230101-000000.tar.gz'
+            with tarfile.open(old_path, 'w:gz') as tar_file:
+                _add_file(tar_file, 'a.txt', b'old a', 100)
+            new_path = archive_folder / 'src_20230102-000000.tar.gz'
+            with tarfile.open(new_path, 'w:gz') as tar_file:
+                _add_file(tar_file, 'a.txt', b'new a', 200)
+            items = [
+                CatalogItem(new_path, 'gz', [], 0, 200.0),
+                CatalogItem(old_path, 'gz', [], 0, 100.0),
+            ]
+            params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+            runtime = Mock(get_param=params.get)
+            catalog_spec = CatalogSpec(Path(temp_folder), archive_folder, 'src')
+            with patch.dict(os.environ, {'PATH': str(bin_folder)}):
+                archive_path = consolidate_archives(runtime, catalog_spec, items, 'xz')
+            with tarfile.open(archive_path, 'r:xz') as tar_file:
+                self.assertEqual(b'new a', tar_file.extractfile('a.txt').read())
+
+    def test_replace_delta_base(self):
+        with TemporaryDirectory() as temp_folder:
+            archive_folder = Path(temp_folder)
+            base_path = archive_folder / 'src_20230101-000000.tar.gz'
+            with tarfile.open(base_path, 'w:gz') as tar_file:
+                _add_file(tar_file, 'big.img', b'big', 100)
+            # A newer archive's deltas are based on the archive to replace.
+            delta_path = archive_folder / 'src_20230102-000000.tar.gz'
+            with tarfile.open(delta_path, 'w:gz'):
+                pass
+            sidecar_path = get_delta_sidecar_path(delta_path)
+            sidecar_path.mkdir(parents=True)
+            _write_json(sidecar_path / DELTA_MANIFEST_NAME, {
+                'version': DELTA_VERSION,
+                'files': {'big.img': {'base': base_path.name, 'delta': None}},
+            })
+            params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+            runtime = Mock(get_param=params.get)
+            catalog_spec = CatalogSpec(archive_folder, archive_folder, 'src')
+            with self.assertRaises(SystemExit):
+                consolidate_archives(runtime,
+                                     catalog_spec,
+                                     [CatalogItem(base_path, 'gz', [], 0, 100.0)],
+                                     'gz',
+                                     replace=True)
+            self.assertTrue(base_path.exists())
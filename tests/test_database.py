@@ -0,0 +1,89 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal.database import open_catalog_database
+from tzar.internal.index import CatalogIndexEntry
+
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.database_path = Path(self.temp_folder.name) / 'catalog.sqlite'
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    @staticmethod
+    def entry(name: str, size: int, time_stamp: float, tags: list[str]) -> CatalogIndexEntry:
+        return CatalogIndexEntry(name=name,
+                                 method_name='gz',
+                                 size=size,
+                                 file_time=0.0,
+                                 source_name=name.split('_')[0],
+                                 time_stamp=time_stamp,
+                                 tags=tags)
+
+    def test_queries(self):
+        with open_catalog_database(self.database_path) as database:
+            database.add_archive(Path('/a'), self.entry('a_1.tar.gz', 100, 1.0, ['x']))
+            database.add_archive(Path('/a'), self.entry('a_2.tar.gz', 300, 2.0, ['x', 'y']))
+            database.add_archive(Path('/b'), self.entry('b_3.tar.gz', 200, 3.0, []))
+        with open_catalog_database(self.database_path) as database:
+            self.assertEqual([archive.path.name for archive in database.query(sort='size', limit=2)],
+                             ['a_2.tar.gz', 'b_3.tar.gz'])
+            self.assertEqual([archive.path.name for archive in database.query(tags=['x'])],
+                             ['a_2.tar.gz', 'a_1.tar.gz'])
+            self.assertEqual(database.query(tags=['x', 'y'])[0].tags, ['x', 'y'])
+            self.assertEqual([archive.path.name for archive in database.query(timestamp_min=2.5)],
+                             ['b_3.tar.gz'])
+            database.remove_archive(Path('/a/a_2.tar.gz'))
+            self.assertEqual(len(database.query(source_name='a')), 1)
+            database.remove_folders_except([Path('/b')])
+            self.assertEqual([archive.path.name for archive in database.query()],
+                             ['b_3.tar.gz'])
+
+    def test_members(self):
+        with open_catalog_database(self.database_path) as database:
+            database.add_archive(Path('/a'), self.entry('a_1.tar.gz', 100, 1.0, []))
+            database.add_archive(Path('/a'), self.entry('a_2.tar.gz', 300, 2.0, []))
+            self.assertEqual(len(database.query_unindexed()), 2)
+            database.set_archive_members(Path('/a/a_1.tar.gz'),
+                                         [('config', None, 5.0), ('config/prod.yaml', 10, 5.0)])
+            database.set_archive_members(Path('/a/a_2.tar.gz'),
+                                         [('config/prod.yaml', 12, 6.0), ('configure', 1, 6.0)])
+            self.assertEqual(database.query_unindexed(), [])
+            self.assertEqual([(member.path, member.archive_path.name, member.size)
+                              for member in database.find_members('config')],
+                             [('config', 'a_1.tar.gz', None),
+                              ('config/prod.yaml', 'a_1.tar.gz', 10),
+                              ('config/prod.yaml', 'a_2.tar.gz', 12)])
+            self.assertEqual([member.path for member in database.find_members('*.yaml')],
+                             ['config/prod.yaml', 'config/prod.yaml'])
+            # Changed archives need to be indexed again.
+            database.add_archive(Path('/a'), self.entry('a_2.tar.gz', 400, 2.0, []))
+            self.assertEqual([archive.path.name for archive in database.query_unindexed()],
+                             ['a_2.tar.gz'])
+            database.remove_archive(Path('/a/a_2.tar.gz'))
+            database.remove_unused_member_paths()
+            self.assertEqual(database.find_members('configure'), [])
+            self.assertEqual(len(database.find_members('config/prod.yaml')), 1)
@@ -0,0 +1,208 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+import io
+import os
+import shutil
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import (
+    Mock,
+    patch,
+)
+
+from tzar.internal import (
+    DeltaSave,
+    diff_archives,
+    list_archive,
+    read_delta_manifest,
+    restore_file,
+)
+from tzar.internal.delta import (
+    DELTA_MANIFEST_NAME,
+    DELTA_VERSION,
+    get_delta_sidecar_path,
+    _write_json,
+)
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_dir.name) / 'archives'
+        self.source_folder = Path(self.temp_dir.name) / 'source'
+        self.archive_folder.mkdir()
+        self.source_folder.mkdir()
+        self.saved_folder = os.getcwd()
+        os.chdir(self.source_folder)
+
+    def tearDown(self):
+        os.chdir(self.saved_folder)
+        self.temp_dir.cleanup()
+
+    def save_state(self, chain: int = 1) -> os.stat_result:
+        """Record big.img as saved in full in an older archive."""
+        Path('big.img').write_bytes(b'x' * 1000)
+        file_stat = os.stat('big.img')
+        (self.archive_folder / 'src_20230101-000000.tar.gz').write_bytes(b'')
+        delta_save = DeltaSave(self.archive_folder, 'src', 100)
+        delta_save.signatures_folder.mkdir(parents=True)
+        (delta_save.signatures_folder / 'big.sig').write_bytes(b'')
+        _write_json(delta_save.signatures_folder / 'state.json', {
+            'version': DELTA_VERSION,
+            'files': {'big.img': {'archive': 'src_20230101-000000.tar.gz',
+                                  'chain': chain,
+                                  'size': file_stat.st_size,
+                                  'mtime_ns': file_stat.st_mtime_ns,
+                                  'signature': 'big.sig'}},
+        })
+        return file_stat
+
+    def test_add_file(self):
+        file_stat = self.save_state()
+        Path('small.txt').write_bytes(b'x')
+        delta_save = DeltaSave(self.archive_folder, 'src', 100)
+        self.assertFalse(delta_save.add_file('small.txt', os.stat('small.txt')))
+        self.assertTrue(delta_save.add_file('big.img', file_stat))
+        Path('new.img').write_bytes(b'y' * 1000)
+        self.assertFalse(delta_save.add_file('new.img', os.stat('new.img')))
+        self.assertEqual(['new.img'], list(delta_save.full_files.keys()))
+        # Long chains and missing base archives cause full saves.
+        self.assertFalse(DeltaSave(self.archive_folder, 'src', 100, chain_limit=1)
+                         .add_file('big.img', file_stat))
+        (self.archive_folder / 'src_20230101-000000.tar.gz').unlink()
+        self.assertFalse(DeltaSave(self.archive_folder, 'src', 100).add_file('big.img', file_stat))
+
+    def test_unchanged_file(self):
+        file_stat = self.save_state()
+        archive_path = self.archive_folder / 'src_20230102-000000.tar.gz'
+        delta_save = DeltaSave(self.archive_folder, 'src', 100)
+        self.assertTrue(delta_save.add_file('big.img', file_stat))
+        # Unchanged files are neither read nor diffed.
+        with patch('tzar.internal.delta._run_delta_program') as run_delta_program:
+            self.assertEqual(0, delta_save.write_deltas(archive_path))
+            run_delta_program.assert_not_called()
+        archive_path.write_bytes(b'')
+        delta_save.publish()
+        self.assertEqual({'big.img': {'base': 'src_20230101-000000.tar.gz',
+                                      'delta': None,
+                                      'size': file_stat.st_size,
+                                      'mtime': file_stat.st_mtime}},
+                         read_delta_manifest(archive_path))
+        self.assertEqual('src_20230101-000000.tar.gz',
+                         DeltaSave(self.archive_folder, 'src', 100).state['big.img']['archive'])
+
+    def test_discard(self):
+        self.save_state()
+        Path('new.img').write_bytes(b'y' * 1000)
+        delta_save = DeltaSave(self.archive_folder, 'src', 100)
+        delta_save.add_file('new.img', os.stat('new.img'))
+        with patch('tzar.internal.delta._run_delta_program',
+                   side_effect=lambda *args: Path(args[-1]).write_bytes(b'')):
+            delta_save.write_deltas(self.archive_folder / 'src_20230102-000000.tar.gz')
+        delta_save.discard()
+        self.assertEqual(['big.sig', 'state.json'],
+                         sorted(path.name for path in delta_save.signatures_folder.iterdir()))
+        self.assertEqual([], list(delta_save.partial_folder.parent.iterdir()))
+
+    @unittest.skipUnless(shutil.which('gzip'), 'gzip is required')
+    def test_restore_unchanged_from_recompressed_base(self):
+        base_path = self.archive_folder / 'src_20230101-000000.tar.gz'
+        with tarfile.open(base_path, 'w:gz') as tar_file:
+            data = b'data' * 1000
+            info = tarfile.TarInfo('big.img')
+            info.size = len(data)
+            tar_file.addfile(info, io.BytesIO(data))
+        archive_path = self.archive_folder / 'src_20230102-000000.tar.gz'
+        with tarfile.open(archive_path, 'w:gz'):
+            pass
+        sidecar_path = get_delta_sidecar_path(archive_path)
+        sidecar_path.mkdir(parents=True)
+        # The base was recompressed since, and has a different extension.
+        _write_json(sidecar_path / DELTA_MANIFEST_NAME, {
+            'version': DELTA_VERSION,
+            'files': {'big.img': {'base': 'src_20230101-000000.tar.xz', 'delta': None}},
+        })
+        runtime = Mock(get_param=lambda name: '%Y%m%d-%H%M%S')
+        output_path = Path(self.temp_dir.name) / 'big.img'
+        restore_file(runtime, archive_path, './big.img', output_path)
+        self.assertEqual(b'data' * 1000, output_path.read_bytes())
+        with self.assertRaises(SystemExit):
+            restore_file(runtime, archive_path, 'big.img', output_path)
+
+    def test_list_delta_members(self):
+        base_path = self.archive_folder / 'src_20230101-000000.tar.gz'
+        with tarfile.open(base_path, 'w:gz') as tar_file:
+            for name in ('big.img', 'small.txt'):
+                info = tarfile.TarInfo(name)
+                info.size = 3
+                info.mtime = 100
+                tar_file.addfile(info, io.BytesIO(b'abc'))
+        archive_path = self.archive_folder / 'src_20230102-000000.tar.gz'
+        with tarfile.open(archive_path, 'w:gz') as tar_file:
+            info = tarfile.TarInfo('small.txt')
+            info.size = 3
+            info.mtime = 100
+            tar_file.addfile(info, io.BytesIO(b'abc'))
+        sidecar_path = get_delta_sidecar_path(archive_path)
+        sidecar_path.mkdir(parents=True)
+        _write_json(sidecar_path / DELTA_MANIFEST_NAME, {
+            'version': DELTA_VERSION,
+            'files': {'big.img': {'base': base_path.name, 'delta': None, 'size': 3, 'mtime': 100}},
+        })
+        runtime = Mock(get_param={'timestamp_format': '%Y%m%d-%H%M%S'}.get)
+        # Listed twice, from the archive, and then from the new member list sidecar.
+        for _pass in range(2):
+            self.assertEqual([('small.txt', 3), ('big.img', 3)],
+                             [(str(item.path), item.size)
+                              for item in list_archive(runtime, archive_path)])
+        self.assertEqual(['big.img'],
+                         [str(item.path)
+                          for item in list_archive(runtime, archive_path, prefix='b')])
+        # The file saved as a delta is unchanged, not removed.
+        self.assertEqual([], list(diff_archives(runtime, base_path, archive_path)))
+
+    @unittest.skipUnless(shutil.which('rdiff'), 'rdiff is required')
+    def test_delta_round_trip(self):
+        Path('big.img').write_bytes(os.urandom(100_000))
+        first_path = self.archive_folder / 'src_20230101-000000.tar.gz'
+        delta_save = DeltaSave(self.archive_folder, 'src', 100)
+        self.assertFalse(delta_save.add_file('big.img', os.stat('big.img')))
+        delta_save.write_deltas(first_path)
+        with tarfile.open(first_path, 'w:gz') as tar_file:
+            tar_file.add('big.img')
+        delta_save.publish()
+        with open('big.img', 'r+b') as big_file:
+            big_file.seek(50_000)
+            big_file.write(b'changed')
+        os.utime('big.img', ns=(0, 0))
+        second_path = self.archive_folder / 'src_20230102-000000.tar.gz'
+        delta_save = DeltaSave(self.archive_folder, 'src', 100)
+        self.assertTrue(delta_save.add_file('big.img', os.stat('big.img')))
+        self.assertLess(delta_save.write_deltas(second_path), 10_000)
+        with tarfile.open(second_path, 'w:gz'):
+            pass
+        delta_save.publish()
+        output_path = Path(self.temp_dir.name) / 'big.img'
+        restore_file(Mock(get_param=lambda name: '%Y%m%d-%H%M%S'),
+                     second_path,
+                     'big.img',
+                     output_path)
+        self.assertEqual(Path('big.img').read_bytes(), output_path.read_bytes())
+
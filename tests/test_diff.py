@@ -0,0 +1,62 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+from tzar.internal.diff import (
+    compare_sorted_members,
+    iterate_sorted_members,
+)
+
+
+class TestDiff(unittest.TestCase):
+
+    def test_sort(self):
+        members = [
+            ('c', 1, 0, None),
+            ('a', 1, 0, None),
+            ('b', None, 0, None),
+            ('a', 2, 0, None),
+            ('d', 1, 0, None),
+        ]
+        for chunk_size in (2, 100):
+            self.assertEqual([('a', 2, 0, None), ('b', None, 0, None),
+                              ('c', 1, 0, None), ('d', 1, 0, None)],
+                             list(iterate_sorted_members(members, chunk_size=chunk_size)))
+
+    def test_compare(self):
+        old_members = [
+            ('a', 1, 0, None),
+            ('b', 2, 0, None),
+            ('c', 3, 0, None),
+            ('d', None, 0, None),
+            ('e', 5, 0, 'x'),
+        ]
+        new_members = [
+            ('b', 2, 1, None),
+            ('c', 4, 0, None),
+            ('d', None, 1, None),
+            ('e', 5, 1, 'x'),
+            ('f', 6, 0, None),
+        ]
+        self.assertEqual([('a', 'removed', -1),
+                          ('b', 'changed', 0),
+                          ('c', 'changed', 1),
+                          ('f', 'added', 6)],
+                         [(item.path, item.change, item.size_delta)
+                          for item in compare_sorted_members(iter(old_members),
+                                                             iter(new_members))])
@@ -0,0 +1,56 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal.fanout import save_tar_fanout
+from tzar.internal.methods import MethodStreamResult
+
+
+@unittest.skipUnless(shutil.which('tar') and shutil.which('gzip'), 'tar and gzip are required')
+class TestFanout(unittest.TestCase):
+
+    def test_fanout(self):
+        with TemporaryDirectory() as temp_folder:
+            temp_path = Path(temp_folder)
+            source_folder = temp_path / 'source'
+            (source_folder / 'sub').mkdir(parents=True)
+            (source_folder / 'a.txt').write_text('a' * 1000)
+            (source_folder / 'sub' / 'b.txt').write_text('b')
+            list_path = temp_path / 'list.txt'
+            list_path.write_text('a.txt\nsub/b.txt\n')
+            archive_paths = [temp_path / 'one.tar.gz', temp_path / 'two.tar.gz']
+            stream_results = [MethodStreamResult(archive_path, ['gzip'])
+                              for archive_path in archive_paths]
+            # A missing destination folder fails only that destination.
+            bad_path = temp_path / 'missing' / 'three.tar.gz'
+            stream_results.append(MethodStreamResult(bad_path, ['gzip']))
+            working_folder = os.getcwd()
+            os.chdir(source_folder)
+            try:
+                saved_paths = save_tar_fanout(list_path, stream_results)
+            finally:
+                os.chdir(working_folder)
+            self.assertEqual(set(archive_paths), saved_paths)
+            for archive_path in archive_paths:
+                with tarfile.open(archive_path, 'r:gz') as tar_file:
+                    self.assertEqual(['a.txt', 'sub/b.txt'], tar_file.getnames())
@@ -0,0 +1,93 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal import get_tree_fingerprint
+from tzar.internal.fingerprint import (
+    delete_fingerprint_sidecar,
+    read_archive_fingerprint,
+    record_archive_fingerprint,
+)
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.source_folder = Path(self.temp_folder.name) / 'source'
+        self.cache_folder = Path(self.temp_folder.name) / 'cache'
+        (self.source_folder / 'sub').mkdir(parents=True)
+        (self.source_folder / 'a.txt').write_text('a')
+        (self.source_folder / 'sub' / 'b.txt').write_text('b')
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def get_digest(self) -> str:
+        return get_tree_fingerprint(self.source_folder, cache_folder=self.cache_folder).digest
+
+    @staticmethod
+    def bump_time(path: Path):
+        # Make sure the modification time changes, regardless of resolution.
+        path_stat = path.stat()
+        os.utime(path, ns=(path_stat.st_atime_ns, path_stat.st_mtime_ns + 1_000_000_000))
+
+    def test_unchanged(self):
+        fingerprint = get_tree_fingerprint(self.source_folder, cache_folder=self.cache_folder)
+        self.assertEqual(2, fingerprint.file_count)
+        self.assertEqual({self.source_folder, self.source_folder / 'sub'},
+                         set(fingerprint.folders))
+        self.assertEqual(1, len(list(self.cache_folder.iterdir())))
+        # The cached listing gives the same result as a fresh one.
+        self.assertEqual(fingerprint.digest, self.get_digest())
+        self.assertEqual(fingerprint.digest, get_tree_fingerprint(self.source_folder).digest)
+
+    def test_changes(self):
+        digests = {self.get_digest()}
+        # Modified file, without a folder time change.
+        self.bump_time(self.source_folder / 'sub' / 'b.txt')
+        digests.add(self.get_digest())
+        # Added file in a nested folder.
+        (self.source_folder / 'sub' / 'deeper').mkdir()
+        (self.source_folder / 'sub' / 'deeper' / 'c.txt').write_text('c')
+        self.bump_time(self.source_folder / 'sub' / 'deeper')
+        self.bump_time(self.source_folder / 'sub')
+        digests.add(self.get_digest())
+        # Removed file.
+        (self.source_folder / 'a.txt').unlink()
+        self.bump_time(self.source_folder)
+        digests.add(self.get_digest())
+        self.assertEqual(4, len(digests))
+        self.assertEqual(get_tree_fingerprint(self.source_folder).digest, self.get_digest())
+
+    def test_empty_folder_ignored(self):
+        digest = self.get_digest()
+        (self.source_folder / 'empty').mkdir()
+        self.bump_time(self.source_folder)
+        self.assertEqual(digest, self.get_digest())
+
+    def test_sidecar(self):
+        archive_path = Path(self.temp_folder.name) / 'source_20230101-000000.tar.gz'
+        self.assertIsNone(read_archive_fingerprint(archive_path))
+        record_archive_fingerprint(archive_path, 'abc')
+        self.assertEqual('abc', read_archive_fingerprint(archive_path))
+        delete_fingerprint_sidecar(archive_path)
+        self.assertIsNone(read_archive_fingerprint(archive_path))
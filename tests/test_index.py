@@ -0,0 +1,93 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal import (
+    CatalogIndex,
+    changing_archive_folder,
+    discover_archives,
+    updating_catalog_index,
+)
+
+
+class TestIndex(unittest.TestCase):
+
+    timestamp_format = '%Y%m%d-%H%M%S'
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_folder.name)
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def add_archive(self, name: str):
+        (self.archive_folder / name).write_bytes(b'fake')
+        # Make sure the folder modification time changes, regardless of resolution.
+        folder_stat = self.archive_folder.stat()
+        os.utime(self.archive_folder, ns=(folder_stat.st_atime_ns,
+                                          folder_stat.st_mtime_ns + 1_000_000_000))
+
+    def discover_names(self) -> list[str]:
+        return sorted(archive.path.name
+                      for archive in discover_archives(self.archive_folder,
+                                                       self.timestamp_format))
+
+    def test_index(self):
+        self.add_archive('test_20200101-000000_abc.tar.gz')
+        self.assertEqual(self.discover_names(), ['test_20200101-000000_abc.tar.gz'])
+        catalog_index = CatalogIndex.load(self.archive_folder, self.timestamp_format)
+        self.assertTrue(catalog_index.is_current())
+        entry = catalog_index.entries['test_20200101-000000_abc.tar.gz']
+        self.assertEqual(entry.tags, ['abc'])
+        self.assertEqual(entry.method_name, 'gz')
+        self.assertIsNone(CatalogIndex.load(self.archive_folder, '%Y%m%d'))
+
+    def test_invalidation(self):
+        self.add_archive('test_20200101-000000.tar.gz')
+        self.discover_names()
+        self.add_archive('test_20200102-000000.zip')
+        self.assertEqual(self.discover_names(), ['test_20200101-000000.tar.gz',
+                                                 'test_20200102-000000.zip'])
+
+    def test_incremental_update(self):
+        self.add_archive('test_20200101-000000.tar.gz')
+        self.add_archive('test_20200102-000000.tar.gz')
+        self.discover_names()
+        with updating_catalog_index(self.archive_folder, self.timestamp_format) as catalog_index:
+            self.assertIsNotNone(catalog_index)
+            with changing_archive_folder(catalog_index):
+                (self.archive_folder / 'test_20200101-000000.tar.gz').unlink()
+            del catalog_index.entries['test_20200101-000000.tar.gz']
+        self.assertTrue(CatalogIndex.load(self.archive_folder, self.timestamp_format).is_current())
+        self.assertEqual(self.discover_names(), ['test_20200102-000000.tar.gz'])
+
+    def test_concurrent_change(self):
+        self.add_archive('test_20200101-000000.tar.gz')
+        self.discover_names()
+        with updating_catalog_index(self.archive_folder, self.timestamp_format) as catalog_index:
+            # Another command saves an archive before this one publishes its own.
+            self.add_archive('test_20200102-000000.tar.gz')
+            with changing_archive_folder(catalog_index):
+                (self.archive_folder / 'test_20200101-000000.tar.gz').unlink()
+            del catalog_index.entries['test_20200101-000000.tar.gz']
+        self.assertFalse(CatalogIndex.load(self.archive_folder, self.timestamp_format).is_current())
+        self.assertEqual(self.discover_names(), ['test_20200102-000000.tar.gz'])
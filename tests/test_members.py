@@ -0,0 +1,90 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal import MethodListItem
+from tzar.internal.methods.members import (
+    clean_member_sidecars,
+    get_member_sidecar_path,
+    iterate_cached_members,
+    normalize_member_path,
+    read_member_sidecar,
+)
+
+
+class TestMembers(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_folder.name)
+        self.archive_path = self.archive_folder / 'test_20200101-000000.tar.gz'
+        self.archive_path.write_bytes(b'fake')
+        self.list_count = 0
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def list_fake(self, prefix: str | None):
+        self.list_count += 1
+        for item in (MethodListItem(path=Path('a/b.txt'), time=100.0, size=10),
+                     MethodListItem(path=Path('a'), time=200.0, size=None),
+                     MethodListItem(path=Path('c.txt'), time=300.0, size=20)):
+            if not prefix or str(item.path).startswith(prefix):
+                yield item
+
+    def test_cached_listing(self):
+        self.assertIsNone(read_member_sidecar(self.archive_path))
+        first = list(iterate_cached_members(self.archive_path, self.list_fake))
+        second = list(iterate_cached_members(self.archive_path, self.list_fake))
+        self.assertEqual(first, second)
+        self.assertEqual(self.list_count, 1)
+
+    def test_prefix_listing(self):
+        filtered = list(iterate_cached_members(self.archive_path, self.list_fake, prefix='a/'))
+        self.assertEqual([str(item.path) for item in filtered], ['a/b.txt'])
+        self.assertIsNone(read_member_sidecar(self.archive_path))
+        list(iterate_cached_members(self.archive_path, self.list_fake))
+        filtered = list(iterate_cached_members(self.archive_path, self.list_fake, prefix='a'))
+        self.assertEqual([str(item.path) for item in filtered], ['a/b.txt', 'a'])
+        self.assertEqual(self.list_count, 2)
+
+    def test_stale_listing(self):
+        list(iterate_cached_members(self.archive_path, self.list_fake))
+        self.archive_path.write_bytes(b'changed')
+        self.assertIsNone(read_member_sidecar(self.archive_path))
+        list(iterate_cached_members(self.archive_path, self.list_fake))
+        self.assertEqual(self.list_count, 2)
+
+    def test_cleanup(self):
+        list(iterate_cached_members(self.archive_path, self.list_fake))
+        sidecar_path = get_member_sidecar_path(self.archive_path)
+        clean_member_sidecars(self.archive_folder)
+        self.assertTrue(sidecar_path.exists())
+        clean_member_sidecars(self.archive_folder, max_bytes=0)
+        self.assertFalse(sidecar_path.exists())
+        list(iterate_cached_members(self.archive_path, self.list_fake))
+        self.archive_path.unlink()
+        clean_member_sidecars(self.archive_folder)
+        self.assertFalse(sidecar_path.exists())
+
+    def test_normalize_member_path(self):
+        self.assertEqual('a/b', normalize_member_path('./a/b'))
+        self.assertEqual('a/b', normalize_member_path('/a//b/'))
+        self.assertEqual('a/b', normalize_member_path(Path('a/b')))
@@ -0,0 +1,222 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import json
+import shutil
+import tarfile
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import (
+    Mock,
+    patch,
+)
+
+from tzar.internal import (
+    CatalogItem,
+    PrunePlan,
+    RetentionPolicy,
+    apply_prune_plan,
+    apply_retention_policy,
+    apply_size_budget,
+    empty_trash,
+    has_trash,
+    parse_size,
+    plan_prune,
+    restore_file,
+)
+from tzar.internal.archive import CatalogSpec
+from tzar.internal.delta import (
+    DELTA_MANIFEST_NAME,
+    DELTA_VERSION,
+    get_delta_sidecar_path,
+    _write_json,
+)
+
+
+class TestPrune(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_folder.name)
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def save_delta_chain(self) -> list[Path]:
+        """Save a full archive, then two with big.img unchanged, and one without it."""
+        archive_paths = [self.archive_folder / f'test_2020010{day}-000000.tar.gz'
+                         for day in range(1, 5)]
+        for archive_path in archive_paths:
+            with tarfile.open(archive_path, 'w:gz') as tar_file:
+                for name, data in (('small.txt', archive_path.name.encode()),
+                                   ('big.img', b'big' * 1000)):
+                    if name == 'small.txt' or archive_path == archive_paths[0]:
+                        info = tarfile.TarInfo(name)
+                        info.size = len(data)
+                        tar_file.addfile(info, io.BytesIO(data))
+        # Each delta archive is based on the previous one.
+        for base_path, archive_path in zip(archive_paths[:2], archive_paths[1:3]):
+            sidecar_path = get_delta_sidecar_path(archive_path)
+            sidecar_path.mkdir(parents=True)
+            _write_json(sidecar_path / DELTA_MANIFEST_NAME, {
+                'version': DELTA_VERSION,
+                'files': {'big.img': {'base': base_path.name, 'delta': None}},
+            })
+        return archive_paths
+
+    def new_plan(self, names: list[str], delete_names: set[str]) -> PrunePlan:
+        items = [
+            CatalogItem(self.archive_folder / name, 'gz', [], 100, 1000.0 - name_idx)
+            for name_idx, name in enumerate(names)
+        ]
+        return PrunePlan(self.archive_folder, 'test', items, delete_names)
+
+    def test_plan_save_load(self):
+        plan = self.new_plan(['test_2.tar.gz', 'test_1.tar.gz', 'test_0.tar.gz'],
+                             {'test_1.tar.gz'})
+        plan_path = self.archive_folder / 'plan.json'
+        plan.save(plan_path)
+        loaded_plan = PrunePlan.load(plan_path)
+        self.assertEqual(loaded_plan.archive_folder, self.archive_folder)
+        self.assertEqual(loaded_plan.delete_names, {'test_1.tar.gz'})
+        self.assertEqual([item.path for item in loaded_plan.kept_items],
+                         [self.archive_folder / 'test_2.tar.gz',
+                          self.archive_folder / 'test_0.tar.gz'])
+        self.assertEqual([item.path.name for item in loaded_plan.deleted_items],
+                         ['test_1.tar.gz'])
+
+    def test_plan_rejects_outside_paths(self):
+        plan = self.new_plan(['test_1.tar.gz'], {'test_1.tar.gz'})
+        data = plan.get_data()
+        data['archives'][0]['name'] = '../test_1.tar.gz'
+        plan_path = self.archive_folder / 'plan.json'
+        plan_path.write_text(json.dumps(data))
+        with self.assertRaises(SystemExit):
+            PrunePlan.load(plan_path)
+
+    def test_apply_plan_trash(self):
+        names = ['test_2.tar.gz', 'test_1.tar.gz', 'test_0.tar.gz']
+        for name in names:
+            (self.archive_folder / name).write_bytes(b'archive')
+        params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+        runtime = Mock(get_param=params.get)
+        deleted_items = apply_prune_plan(runtime, self.new_plan(names, {'test_1.tar.gz'}))
+        self.assertEqual(['test_1.tar.gz'], [item.path.name for item in deleted_items])
+        self.assertFalse((self.archive_folder / 'test_1.tar.gz').exists())
+        # The trash is left for the next prune to empty.
+        self.assertTrue(has_trash(self.archive_folder))
+        self.assertEqual(empty_trash(self.archive_folder), 1)
+
+    def test_retention_policy(self):
+        # Archives every 6 hours for 60 days, newest first.
+        newest_time = datetime(2020, 3, 1, 18).timestamp()
+        items = [
+            CatalogItem(self.archive_folder / f'test_{item_idx}.tar.gz', 'gz', [], 100,
+                        newest_time - item_idx * 6 * 3600)
+            for item_idx in range(240)
+        ]
+        keep_reasons = apply_retention_policy(items, RetentionPolicy(last=2, daily=7, monthly=3))
+        # Day boundaries are 4 items apart. The newest archive is kept by every rule.
+        self.assertEqual(keep_reasons['test_0.tar.gz'], 'last,daily,monthly')
+        self.assertEqual(keep_reasons['test_1.tar.gz'], 'last')
+        self.assertNotIn('test_2.tar.gz', keep_reasons)
+        # February 29 18:00 is the newest archive of the previous day and month.
+        self.assertEqual(keep_reasons['test_4.tar.gz'], 'daily,monthly')
+        self.assertEqual(keep_reasons['test_8.tar.gz'], 'daily')
+        # January 31 18:00 is the newest archive of the month before that.
+        self.assertEqual(keep_reasons['test_120.tar.gz'], 'monthly')
+        self.assertEqual(sorted(keep_reasons.keys()),
+                         sorted(f'test_{item_idx}.tar.gz'
+                                for item_idx in (0, 1, 4, 8, 12, 16, 20, 24, 120)))
+        self.assertEqual(apply_retention_policy(items, RetentionPolicy()), {})
+        self.assertFalse(RetentionPolicy().is_active)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('123'), 123)
+        self.assertEqual(parse_size('500G'), 500 * 1024 ** 3)
+        self.assertEqual(parse_size('1.5KiB'), 1536)
+        self.assertEqual(parse_size('2 MB'), 2000000)
+        for bad_text in ('', 'G', '12X', '5Gi'):
+            with self.assertRaises(ValueError):
+                parse_size(bad_text)
+
+    def test_size_budget(self):
+        # Hourly archives, with a dense burst of archives from 10 to 11 hours ago.
+        times = [1000000.0 - hours * 3600 for hours in range(10)]
+        times.extend(1000000.0 - 10 * 3600 - minutes * 60 for minutes in range(1, 6))
+        times.extend(1000000.0 - hours * 3600 for hours in range(11, 15))
+        items = [
+            CatalogItem(self.archive_folder / f'test_{item_idx}.tar.gz', 'gz', [], 100, item_time)
+            for item_idx, item_time in enumerate(times)
+        ]
+        self.assertEqual(apply_size_budget(items, 1900), [])
+        deleted_items = apply_size_budget(items, 1500)
+        self.assertEqual(len(deleted_items), 4)
+        # The burst is thinned out first.
+        self.assertTrue(all(10 * 3600 < 1000000.0 - item.time < 11 * 3600
+                            for item in deleted_items))
+        # The newest is kept even when it exceeds the budget.
+        self.assertEqual(len(apply_size_budget(items, 0)), len(items) - 1)
+
+    def test_prune_delta_chain(self):
+        archive_paths = self.save_delta_chain()
+        params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+        runtime = Mock(get_param=params.get)
+        catalog_spec = CatalogSpec(self.archive_folder, self.archive_folder, 'test')
+        # Chains with no kept delta archives are deleted.
+        plan = plan_prune(runtime, catalog_spec, retention_policy=RetentionPolicy(last=1))
+        self.assertEqual(set(path.name for path in archive_paths[:3]), plan.delete_names)
+        # Chains with kept delta archives are kept.
+        plan = plan_prune(runtime, catalog_spec, retention_policy=RetentionPolicy(last=2))
+        self.assertEqual(set(), plan.delete_names)
+        self.assertEqual({archive_paths[0].name: 'delta base',
+                          archive_paths[1].name: 'delta base',
+                          archive_paths[2].name: 'last',
+                          archive_paths[3].name: 'last'},
+                         plan.keep_reasons)
+        # Plans saved before the deltas skip the bases.
+        plan = self.new_plan([path.name for path in reversed(archive_paths)],
+                             {archive_paths[0].name, archive_paths[3].name})
+        apply_prune_plan(runtime, plan)
+        self.assertEqual([path.name for path in archive_paths[:3]],
+                         sorted(path.name for path in self.archive_folder.glob('*.tar.gz')))
+        output_path = Path(self.temp_folder.name) / 'big.img'
+        restore_file(runtime, archive_paths[2], 'big.img', output_path)
+        self.assertEqual(b'big' * 1000, output_path.read_bytes())
+
+    def test_prune_delta_base_budget(self):
+        archive_paths = self.save_delta_chain()
+        old_path = self.archive_folder / 'test_20191231-000000.tar.gz'
+        shutil.copyfile(archive_paths[3], old_path)
+        params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+        runtime = Mock(get_param=params.get)
+        catalog_spec = CatalogSpec(self.archive_folder, self.archive_folder, 'test')
+        kept_size = sum(path.stat().st_size for path in archive_paths)
+        with patch('tzar.internal.prune.log_warning') as log_warning, \
+                patch('tzar.internal.prune.format_human_byte_count', side_effect=str):
+            plan = plan_prune(runtime, catalog_spec, max_total_size=kept_size)
+            log_warning.assert_not_called()
+            # Only archives outside of the delta chain are deleted to fit the budget.
+            self.assertEqual({old_path.name}, plan.delete_names)
+            plan = plan_prune(runtime, catalog_spec, max_total_size=100)
+            self.assertEqual({old_path.name}, plan.delete_names)
+            log_warning.assert_called_once_with(
+                f'The total size budget can not be met.'
+                f' Kept archives exceed it by {kept_size - 100}.')
@@ -0,0 +1,119 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import os
+import shutil
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import Mock
+
+from tzar.internal import (
+    CatalogIndex,
+    CatalogItem,
+    can_recompress,
+    discover_archives,
+    recompress_archive,
+    recompress_archives,
+)
+from tzar.internal.fingerprint import (
+    read_archive_fingerprint,
+    record_archive_fingerprint,
+)
+from tzar.internal.metadata import get_metadata_folder
+from tzar.internal.recompress import get_recompressed_path
+from tzar.internal.throttle import Throttle
+
+
+class TestRecompress(unittest.TestCase):
+
+    def test_can_recompress(self):
+        self.assertTrue(can_recompress('gz', 'xz'))
+        self.assertFalse(can_recompress('xz', 'xz'))
+        self.assertFalse(can_recompress('zip', 'xz'))
+        self.assertFalse(can_recompress('gz', 'files'))
+        self.assertFalse(can_recompress('gz-shards', 'xz'))
+
+    @unittest.skipUnless(shutil.which('gzip') and shutil.which('xz'), 'gzip and xz are required')
+    def test_recompress(self):
+        with TemporaryDirectory() as temp_folder:
+            archive_path = Path(temp_folder) / 'src_20230101-000000_daily.tar.gz'
+            with tarfile.open(archive_path, 'w:gz') as tar_file:
+                data = b'data' * 1000
+                info = tarfile.TarInfo('a.txt')
+                info.size = len(data)
+                tar_file.addfile(info, io.BytesIO(data))
+            os.utime(archive_path, (1_000_000_000, 1_000_000_000))
+            record_archive_fingerprint(archive_path, 'abc')
+            new_path = get_recompressed_path(archive_path, 'gz', 'xz')
+            self.assertEqual('src_20230101-000000_daily.tar.xz', new_path.name)
+            self.assertEqual(new_path, recompress_archive(archive_path,
+                                                          new_path,
+                                                          ['gzip', '-dc'],
+                                                          ['xz'],
+                                                          throttle=Throttle(100_000_000)))
+            self.assertFalse(archive_path.exists())
+            self.assertEqual(1_000_000_000, new_path.stat().st_mtime)
+            self.assertEqual('abc', read_archive_fingerprint(new_path))
+            self.assertIsNone(read_archive_fingerprint(archive_path))
+            with tarfile.open(new_path, 'r:xz') as tar_file:
+                self.assertEqual(['a.txt'], tar_file.getnames())
+            self.assertEqual([new_path.name],
+                             [path.name for path in Path(temp_folder).iterdir()
+                              if not path.name.startswith('.')])
+
+    @unittest.skipUnless(shutil.which('xz'), 'xz is required')
+    def test_recompress_failure(self):
+        with TemporaryDirectory() as temp_folder:
+            archive_path = Path(temp_folder) / 'src_20230101-000000.tar.gz'
+            archive_path.write_bytes(b'not compressed')
+            new_path = get_recompressed_path(archive_path, 'gz', 'xz')
+            with self.assertRaises(OSError):
+                recompress_archive(archive_path, new_path, ['xz', '-dc'], ['xz'])
+            self.assertTrue(archive_path.exists())
+            self.assertFalse(new_path.exists())
+            self.assertEqual([archive_path.name],
+                             [path.name for path in Path(temp_folder).iterdir()
+                              if not path.name.startswith('.')])
+            # The temporary file is removed from the metadata folder.
+            self.assertEqual([], list(get_metadata_folder(Path(temp_folder), 'partial').iterdir()))
+
+    @unittest.skipUnless(shutil.which('gzip') and shutil.which('xz'), 'gzip and xz are required')
+    def test_recompress_archives(self):
+        with TemporaryDirectory() as temp_folder:
+            archive_path = Path(temp_folder) / 'src_20230101-000000.tar.gz'
+            with tarfile.open(archive_path, 'w:gz') as tar_file:
+                tar_file.addfile(tarfile.TarInfo('a.txt'), io.BytesIO())
+            params = {'timestamp_format': '%Y%m%d-%H%M%S', 'catalog_database': ''}
+            runtime = Mock(get_param=params.get)
+            discover_archives(Path(temp_folder), params['timestamp_format'])
+            # Programs are chosen from the method's alternatives, including
+            # ones with arguments, e.g. "gzip -dc" and "xz -T0".
+            self.assertEqual(1, recompress_archives(runtime,
+                                                    Path(temp_folder),
+                                                    [CatalogItem(archive_path, 'gz', [], 0, 0.0)],
+                                                    'xz'))
+            new_path = Path(temp_folder) / 'src_20230101-000000.tar.xz'
+            self.assertFalse(archive_path.exists())
+            with tarfile.open(new_path, 'r:xz') as tar_file:
+                self.assertEqual(['a.txt'], tar_file.getnames())
+            # The catalog index is updated along with the replacement.
+            catalog_index = CatalogIndex.load(Path(temp_folder), params['timestamp_format'])
+            self.assertTrue(catalog_index.is_current())
+            self.assertEqual([new_path.name], list(catalog_index.entries.keys()))
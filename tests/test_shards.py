@@ -0,0 +1,97 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from tzar.internal.archive import lookup_method
+from tzar.internal.methods import ArchiveMethodShardsGZ
+from tzar.internal.methods.shards import (
+    get_shard_names,
+    split_shard_ranges,
+)
+
+
+def _write_shard(shard_path: Path, names: list[str]):
+    with tarfile.open(shard_path, mode='w:gz') as tar_file:
+        for name in names:
+            info = tarfile.TarInfo(name)
+            info.size = len(name)
+            tar_file.addfile(info, io.BytesIO(name.encode()))
+
+
+class TestShards(unittest.TestCase):
+
+    def test_split_balanced(self):
+        self.assertEqual([(0, 2), (2, 4)], split_shard_ranges([10, 10, 10, 10], 2))
+        self.assertEqual([(0, 1), (1, 4)], split_shard_ranges([30, 10, 10, 10], 2))
+        self.assertEqual([(0, 3), (3, 4)], split_shard_ranges([1, 1, 1, 100], 2))
+
+    def test_split_limits(self):
+        # No more shards than files, and no empty shards.
+        self.assertEqual([(0, 1), (1, 2)], split_shard_ranges([5, 5], 8))
+        self.assertEqual([(0, 1), (1, 2), (2, 3)], split_shard_ranges([100, 0, 0], 3))
+        self.assertEqual([(0, 0)], split_shard_ranges([], 4))
+        self.assertEqual([(0, 3)], split_shard_ranges([1, 2, 3], 1))
+
+    def test_shard_names(self):
+        with TemporaryDirectory() as temp_folder:
+            list_path = Path(temp_folder) / 'files.txt'
+            list_path.write_text('a\nb\nc\n', encoding='utf-8')
+            ranges = [(0, 2), (2, 3)]
+            names = get_shard_names(list_path, ranges, [1, 2, 3], [10, 20, 30], 'gz')
+            self.assertEqual(['000-', '001-'], [name[:4] for name in names])
+            self.assertTrue(all(name.endswith('.tar.gz') for name in names))
+            # Only shards with changed files get new names.
+            changed_names = get_shard_names(list_path, ranges, [1, 2, 4], [10, 20, 30], 'gz')
+            self.assertEqual(names[0], changed_names[0])
+            self.assertNotEqual(names[1], changed_names[1])
+
+    def test_lookup(self):
+        self.assertEqual('gz-shards', lookup_method('src_20230101-000000.tar.gz.shards', 2).name)
+        self.assertEqual('xz-shards', lookup_method('src_20230101-000000.tar.xz.shards', 2).name)
+        self.assertEqual('files', lookup_method('src_20230101-000000', 2).name)
+        self.assertIsNone(lookup_method('src_20230101-000000.tar.gz.shards', 1))
+        self.assertEqual('gz', lookup_method('src_20230101-000000.tar.gz', 1).name)
+
+    def test_list(self):
+        with TemporaryDirectory() as temp_folder:
+            archive_path = Path(temp_folder) / 'src_20230101-000000.tar.gz.shards'
+            archive_path.mkdir()
+            names = [f'src/{shard_index}/{name_index}.txt'
+                     for shard_index in range(3)
+                     for name_index in range(10)]
+            for shard_index in range(3):
+                _write_shard(archive_path / f'{shard_index:03d}-shard.tar.gz',
+                             names[shard_index * 10:(shard_index + 1) * 10])
+            # Prefixed listings read the shards, rather than a member list sidecar.
+            # Shards with more members than fit in their queues are still listed in order.
+            with patch('tzar.internal.methods.shards.LIST_QUEUE_SIZE', 2):
+                self.assertEqual(names, [str(item.path) for item in
+                                         ArchiveMethodShardsGZ.handle_list(archive_path,
+                                                                           prefix='src/')])
+                # Listings that are not read to the end release the shard readers.
+                items = ArchiveMethodShardsGZ.handle_list(archive_path, prefix='src/')
+                self.assertEqual('src/0/0.txt', str(next(items).path))
+                items.close()
+            (archive_path / '001-shard.tar.gz').write_bytes(b'bad')
+            with self.assertRaises((OSError, tarfile.TarError)):
+                list(ArchiveMethodShardsGZ.handle_list(archive_path, prefix='src/'))
@@ -0,0 +1,79 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal import (
+    CatalogQueryIndex,
+    DiscoveredArchive,
+    FolderSize,
+    get_folder_size,
+    get_timestamp_matcher,
+    walk_folder_size,
+)
+from tzar.internal.sizes import (
+    get_size_sidecar_path,
+    record_folder_size,
+)
+
+
+class TestSizes(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_folder.name)
+        self.archive_path = self.archive_folder / 'test_20200101-000000'
+        (self.archive_path / 'a' / 'b').mkdir(parents=True)
+        (self.archive_path / 'one').write_bytes(b'1' * 100)
+        (self.archive_path / 'a' / 'two').write_bytes(b'2' * 200)
+        (self.archive_path / 'a' / 'b' / 'three').write_bytes(b'3' * 300)
+        # Shared with another snapshot, and linked twice within this one.
+        (self.archive_folder / 'shared').write_bytes(b'4' * 400)
+        os.link(self.archive_folder / 'shared', self.archive_path / 'four')
+        os.link(self.archive_folder / 'shared', self.archive_path / 'a' / 'four')
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def test_walk(self):
+        self.assertEqual(walk_folder_size(self.archive_path, max_workers=2),
+                         FolderSize(total_bytes=1000, total_files=4,
+                                    linked_bytes=400, linked_files=1))
+
+    def test_sidecar(self):
+        mtime_ns = self.archive_path.stat().st_mtime_ns
+        record_folder_size(self.archive_path, FolderSize(total_bytes=5, total_files=1))
+        self.assertEqual(get_folder_size(self.archive_path, mtime_ns).total_bytes, 5)
+        # An out of date sidecar is replaced.
+        self.assertEqual(get_folder_size(self.archive_path, mtime_ns + 1).total_bytes, 1000)
+        archive = DiscoveredArchive.get(self.archive_path, get_timestamp_matcher('%Y%m%d-%H%M%S'))
+        self.assertEqual(archive.method_name, 'files')
+        self.assertEqual(archive.file_size, 1000)
+
+    def test_lazy_size(self):
+        archive = DiscoveredArchive.get(self.archive_path, get_timestamp_matcher('%Y%m%d-%H%M%S'))
+        # Discovery neither walks the folder nor records a sidecar.
+        self.assertIsNone(archive.known_file_size)
+        self.assertIsNone(archive.get_index_entry().size)
+        self.assertFalse(get_size_sidecar_path(self.archive_path).exists())
+        self.assertEqual(archive.get_index_entry(with_size=True).size, 1000)
+        self.assertTrue(get_size_sidecar_path(self.archive_path).exists())
+        item = CatalogQueryIndex.from_archives([archive], 'test').items[0]
+        self.assertEqual(item.get_size(), 1000)
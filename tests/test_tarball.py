@@ -0,0 +1,59 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+from unittest.mock import patch
+
+from tzar.internal.methods import (
+    ArchiveMethodXZ,
+    MethodSaveData,
+)
+
+
+class TestTarball(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.temp_path = Path(self.temp_folder.name)
+        # Only a fake xz is available, i.e. no pixz.
+        xz_path = self.temp_path / 'xz'
+        xz_path.write_text('#!/bin/sh\n')
+        xz_path.chmod(0o755)
+        self.save_data = MethodSaveData(source_path=self.temp_path,
+                                        source_list_path=self.temp_path / 'list.txt',
+                                        archive_path=self.temp_path / 'test',
+                                        verbose=False,
+                                        dry_run=False,
+                                        progress=False,
+                                        total_bytes=0,
+                                        total_files=0,
+                                        total_folders=0)
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def test_save_compressor_fallback(self):
+        with patch.dict(os.environ, {'PATH': str(self.temp_path)}):
+            save_result = ArchiveMethodXZ.handle_save(self.save_data)
+        self.assertEqual(['|', 'xz', '-T0', '>'], save_result.command_arguments[5:9])
+
+    def test_stream_compressor_fallback(self):
+        with patch.dict(os.environ, {'PATH': str(self.temp_path)}):
+            stream_result = ArchiveMethodXZ.handle_stream(self.save_data)
+        self.assertEqual(['xz', '-T0'], stream_result.compressor_arguments)
@@ -0,0 +1,58 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from tzar.internal import (
+    empty_trash,
+    has_trash,
+    move_to_trash,
+)
+
+
+class TestTrash(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_folder.name)
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def test_trash(self):
+        file_archive = self.archive_folder / 'test_20200101-000000.tar.gz'
+        file_archive.write_bytes(b'fake')
+        folder_archive = self.archive_folder / 'test_20200102-000000'
+        for folder_idx in range(3):
+            sub_folder = folder_archive / f'sub{folder_idx}' / 'deeper'
+            sub_folder.mkdir(parents=True)
+            for file_idx in range(300):
+                (sub_folder / f'file{file_idx}').write_text('x')
+        os.symlink(self.archive_folder, folder_archive / 'link')
+        move_to_trash(file_archive)
+        move_to_trash(folder_archive)
+        self.assertFalse(file_archive.exists())
+        self.assertFalse(folder_archive.exists())
+        self.assertTrue(has_trash(self.archive_folder))
+        self.assertEqual(empty_trash(self.archive_folder, max_workers=2, rate_limit=100000), 2)
+        self.assertFalse(has_trash(self.archive_folder))
+        # The symbolic link target was not followed.
+        self.assertTrue(self.archive_folder.is_dir())
+        self.assertEqual(empty_trash(self.archive_folder), 0)
@@ -0,0 +1,142 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable
+import unittest
+from unittest.mock import Mock
+
+from tzar.internal import (
+    CatalogIndex,
+    LiveCatalog,
+    WatchEvent,
+    create_folder_watcher,
+    read_settled_events,
+    run_live_catalogs,
+)
+from tzar.internal.watch import PollingWatcher
+
+
+class _ScriptDone(Exception):
+    pass
+
+
+class ScriptedWatcher:
+    """Watcher stand-in that makes changes and reports events from a script."""
+
+    def __init__(self, steps: list[Callable[[], list[WatchEvent]]]):
+        self.steps = steps
+        self.folders: set[Path] = set()
+
+    def add_folder(self, folder: Path) -> bool:
+        if not folder.is_dir():
+            return False
+        self.folders.add(folder)
+        return True
+
+    def remove_folder(self, folder: Path):
+        self.folders.discard(folder)
+
+    def read_events(self, timeout: float = None) -> list[WatchEvent]:
+        # Settling reads have a timeout, and get nothing.
+        if timeout is not None:
+            return []
+        if not self.steps:
+            raise _ScriptDone()
+        return self.steps.pop(0)()
+
+    def close(self):
+        pass
+
+
+class TestWatch(unittest.TestCase):
+
+    timestamp_format = '%Y%m%d-%H%M%S'
+
+    def setUp(self):
+        self.temp_folder = TemporaryDirectory()
+        self.archive_folder = Path(self.temp_folder.name)
+
+    def tearDown(self):
+        self.temp_folder.cleanup()
+
+    def bump_folder_time(self):
+        # Make sure the folder modification time changes, regardless of resolution.
+        folder_stat = self.archive_folder.stat()
+        os.utime(self.archive_folder, ns=(folder_stat.st_atime_ns,
+                                          folder_stat.st_mtime_ns + 1_000_000_000))
+
+    def check_live_catalog(self, watcher):
+        (self.archive_folder / 'test_20200101-000000.tar.gz').write_bytes(b'fake')
+        live_catalog = LiveCatalog(self.archive_folder, self.timestamp_format)
+        self.assertTrue(watcher.add_folder(self.archive_folder))
+        (self.archive_folder / 'test_20200102-000000_abc.tar.gz').write_bytes(b'fake')
+        (self.archive_folder / 'test_20200101-000000.tar.gz').unlink()
+        self.bump_folder_time()
+        folder_mtime_ns = self.archive_folder.stat().st_mtime_ns
+        events = read_settled_events(watcher, timeout=5, settle_time=0.1)
+        self.assertTrue(events)
+        live_catalog.apply_events(events)
+        self.assertEqual([item.path.name
+                          for item in live_catalog.get_query_index('test').query()],
+                         ['test_20200102-000000_abc.tar.gz'])
+        live_catalog.save_index(folder_mtime_ns)
+        catalog_index = CatalogIndex.load(self.archive_folder, self.timestamp_format)
+        self.assertTrue(catalog_index.is_current())
+        self.assertEqual(list(catalog_index.entries.keys()), ['test_20200102-000000_abc.tar.gz'])
+
+    def test_default_watcher(self):
+        watcher = create_folder_watcher()
+        try:
+            self.check_live_catalog(watcher)
+        finally:
+            watcher.close()
+
+    def test_polling_watcher(self):
+        self.check_live_catalog(PollingWatcher(poll_interval=0.05))
+
+    def test_new_archive_folders(self):
+        root_folder = self.archive_folder
+        source_folder = root_folder / 'src'
+
+        def _create_source() -> list[WatchEvent]:
+            source_folder.mkdir()
+            (source_folder / 'src_20200101-000000.tar.gz').write_bytes(b'fake')
+            return [WatchEvent(root_folder, 'src', is_folder=True)]
+
+        def _remove_source() -> list[WatchEvent]:
+            shutil.rmtree(source_folder)
+            return [WatchEvent(source_folder, None, is_folder=True, removed=True),
+                    WatchEvent(root_folder, 'src', is_folder=True, removed=True)]
+
+        watcher = ScriptedWatcher([_create_source, _remove_source, _create_source])
+        changed_folders: list[Path] = []
+        runtime = Mock(get_param=lambda name: self.timestamp_format)
+        with self.assertRaises(_ScriptDone):
+            run_live_catalogs(runtime,
+                              [],
+                              watcher,
+                              on_change=lambda live_catalog: changed_folders.append(
+                                  live_catalog.archive_folder),
+                              record_database=False,
+                              root_folder=root_folder)
+        # The source folder is picked up when created, and again when re-created.
+        self.assertEqual([source_folder, source_folder], changed_folders)
+        self.assertEqual({root_folder, source_folder}, watcher.folders)
@@ -20,14 +20,116 @@ from .archive import (
     METHOD_MAP,
     METHOD_NAMES,
     MethodListItem,
+    SHARDS_METHOD_SUFFIX,
+    SaveDestination,
+    clean_partial_archives,
+    delete_archive,
+    find_delta_base_archive,
+    get_delta_base_names,
     get_timestamp_matcher,
     list_archive,
+    parse_archive_names,
     save_archive,
 )
+from .autosave import (
+    AutoSaver,
+    SaveSchedule,
+    WatchedSource,
+)
 from .catalog import (
+    CATALOG_FORMATS,
+    CATALOG_SORT_KEYS,
     CatalogItem,
+    CatalogQueryIndex,
     build_catalog_list,
+    discover_archives,
+    filter_catalog_intervals,
+    find_archive_folders,
+    format_catalog,
     format_catalog_table,
     get_catalog_spec,
+    get_catalog_timestamp_range,
+    get_latest_fingerprint,
     list_catalog,
+    paginate_catalog_items,
+    query_catalog_database,
+    reindex_catalog_database,
+    sort_catalog_items,
+)
+from .consolidate import (
+    can_consolidate_to,
+    consolidate_archives,
+    get_consolidated_path,
+)
+from .contents import (
+    MemberVersion,
+    find_member_versions,
+    index_archive_contents,
+)
+from .database import (
+    SORT_COLUMNS,
+    record_deleted_archives,
+)
+from .delta import (
+    DEFAULT_DELTA_CHAIN_LIMIT,
+    DeltaSave,
+    list_delta_archive_names,
+    read_delta_manifest,
+)
+from .diff import (
+    ArchiveDiffItem,
+    diff_archives,
+)
+from .fingerprint import (
+    TreeFingerprint,
+    get_source_fingerprint,
+    get_tree_fingerprint,
+)
+from .index import (
+    CatalogIndex,
+    changing_archive_folder,
+    updating_catalog_index,
+)
+from .monitor import (
+    LiveCatalog,
+    run_live_catalogs,
+)
+from .names import (
+    ArchiveNameData,
+    ArchiveNameParser,
+)
+from .prune import (
+    PrunePlan,
+    apply_prune_plan,
+    plan_prune,
+)
+from .recompress import (
+    can_recompress,
+    recompress_archive,
+    recompress_archives,
+)
+from .restore import (
+    restore_file,
+)
+from .retention import (
+    RetentionPolicy,
+    apply_retention_policy,
+    apply_size_budget,
+    parse_size,
+)
+from .sizes import (
+    FolderSize,
+    get_folder_size,
+    walk_folder_size,
+)
+from .trash import (
+    empty_trash,
+    has_trash,
+    move_to_trash,
+)
+from .watch import (
+    FolderWatcher,
+    WatchEvent,
+    create_folder_watcher,
+    read_settled_events,
 )
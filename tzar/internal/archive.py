@@ -15,25 +15,37 @@
 # You should have received a copy of the GNU General Public License
 # along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
 
+import fcntl
 import os
 import re
-import time
+import stat
+import subprocess
+from contextlib import (
+    ExitStack,
+    contextmanager,
+)
 from dataclasses import dataclass
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 from time import (
-    mktime,
     strftime,
+    time,
 )
 from typing import (
+    Collection,
+    Iterable,
+    Iterator,
     Self,
     Sequence,
+    TextIO,
     Type,
 )
 
 from jiig import Runtime
 from jiig.util.filesystem import (
     create_folder,
+    delete_file,
+    delete_folder,
     iterate_filtered_files,
     iterate_git_pending,
     short_path,
@@ -41,20 +53,70 @@ from jiig.util.filesystem import (
 )
 from jiig.util.log import (
     abort,
+    log_error,
     log_message,
     log_warning,
 )
 from jiig.util.process import shell_command_string
 from jiig.util.text.human_units import format_human_byte_count
 
+from .database import record_saved_archive
+from .delta import (
+    DeltaSave,
+    delete_delta_sidecar,
+    list_delta_archive_names,
+    read_delta_manifest,
+)
+from .fingerprint import (
+    delete_fingerprint_sidecar,
+    record_archive_fingerprint,
+)
+from .fanout import save_tar_fanout
+from .index import (
+    CatalogIndexEntry,
+    changing_archive_folder,
+    updating_catalog_index,
+)
 from .methods import (
     ArchiveMethodBase,
     ArchiveMethodGZ,
+    ArchiveMethodShardsGZ,
+    ArchiveMethodShardsXZ,
     ArchiveMethodSync,
     ArchiveMethodXZ,
     ArchiveMethodZip,
     MethodListItem,
     MethodSaveData,
+    MethodStreamResult,
+)
+from .methods.members import (
+    TEMPORARY_MAX_AGE,
+    clean_member_sidecars,
+    delete_member_sidecar,
+    discard_member_sidecar,
+    normalize_member_path,
+    open_member_sidecar,
+    publish_member_sidecar,
+    write_member,
+)
+from .metadata import (
+    get_metadata_folder,
+    is_metadata_name,
+)
+from .names import (
+    ArchiveNameData,
+    ArchiveNameParser,
+    get_timestamp_matcher,
+)
+from .sizes import (
+    FolderSize,
+    delete_size_sidecar,
+    get_folder_size,
+    record_folder_size,
+)
+from .trash import (
+    empty_trash,
+    move_to_trash,
 )
 
 
@@ -66,21 +128,28 @@ class CatalogSpec:
     source_name: str
 
 
-@dataclass
-class ArchiveNameData:
-    source_name: str
-    time_stamp: float | None
-    tags: list[str]
-
-
 METHOD_MAP: dict[str, Type[ArchiveMethodBase]] = {
     'files': ArchiveMethodSync,
     'gz': ArchiveMethodGZ,
+    'gz-shards': ArchiveMethodShardsGZ,
     'xz': ArchiveMethodXZ,
+    'xz-shards': ArchiveMethodShardsXZ,
     'zip': ArchiveMethodZip,
 }
 
 METHOD_NAMES = list(sorted(METHOD_MAP.keys()))
+# Suffix for sharded variants of method names.
+SHARDS_METHOD_SUFFIX = '-shards'
+# Metadata folder for archives that are being saved.
+PARTIAL_FOLDER_NAME = 'partial'
+_LOCK_SUFFIX = '.lock'
+
+
+@dataclass
+class SaveDestination:
+    """Additional archive folder and method for saving to multiple destinations."""
+    archive_folder: Path
+    method_name: str
 
 
 @dataclass
@@ -90,13 +159,81 @@ class RegisteredMethod:
     method_cls: Type[ArchiveMethodBase]
 
 
+# File and folder methods by extension and the default folder method, for
+# recognizing archives by name, without probing each method.
+EXTENSION_METHOD_MAP: dict[str, RegisteredMethod] = {
+    method_cls.extension: RegisteredMethod(name, method_cls)
+    for name, method_cls in METHOD_MAP.items()
+    if method_cls.extension and not method_cls.folder
+}
+FOLDER_EXTENSION_METHOD_MAP: dict[str, RegisteredMethod] = {
+    method_cls.extension: RegisteredMethod(name, method_cls)
+    for name, method_cls in METHOD_MAP.items()
+    if method_cls.extension and method_cls.folder
+}
+FOLDER_METHOD: RegisteredMethod | None = next(
+    (RegisteredMethod(name, method_cls)
+     for name, method_cls in METHOD_MAP.items()
+     if method_cls.folder and not method_cls.extension),
+    None)
+
+
+def lookup_extension_method(name: str) -> RegisteredMethod | None:
+    """
+    Look up file archive method based on name extension.
+
+    Checks the last extension, e.g. ".zip", followed by the last two, e.g.
+    ".tar.gz".
+
+    :param name: archive file name
+    :return: registered archive method or None if the extension is unsupported
+    """
+    last_dot = name.rfind('.')
+    if last_dot <= 0:
+        return None
+    registered_method = EXTENSION_METHOD_MAP.get(name[last_dot:])
+    if registered_method is None:
+        previous_dot = name.rfind('.', 0, last_dot)
+        if previous_dot > 0:
+            registered_method = EXTENSION_METHOD_MAP.get(name[previous_dot:])
+    return registered_method
+
+
+def lookup_method(name: str,
+                  object_type: int | None,
+                  ) -> RegisteredMethod | None:
+    """
+    Look up archive method based on name and object type.
+
+    :param name: archive file or folder name
+    :param object_type: 1=file, 2=folder, None=other
+    :return: registered archive method or None if unsupported
+    """
+    if object_type == 2:
+        for extension, registered_method in FOLDER_EXTENSION_METHOD_MAP.items():
+            if name.endswith(extension):
+                return registered_method
+        return FOLDER_METHOD
+    if object_type == 1:
+        return lookup_extension_method(name)
+    return None
+
+
+def _get_object_type(path_stat: os.stat_result) -> int | None:
+    if stat.S_ISREG(path_stat.st_mode):
+        return 1
+    if stat.S_ISDIR(path_stat.st_mode):
+        return 2
+    return None
+
+
 class DiscoveredArchive:
 
     def __init__(
         self,
         path: Path,
         file_time: float,
-        file_size: int,
+        file_size: int | None,
         method_name: str,
         method_cls: Type[ArchiveMethodBase],
         timestamp_matcher: re.Pattern,
@@ -106,19 +243,43 @@ class DiscoveredArchive:
 
         :param path: path to archive file or folder
         :param file_time: file time
-        :param file_size: file size
+        :param file_size: file size or None to get a folder archive size when needed
         :param method_name: archive method name
         :param method_cls: archive method class
         :param timestamp_matcher: regular expression for parsing file name timestamps
         """
         self.path = path
         self.file_time = file_time
-        self.file_size = file_size
+        self._file_size = file_size
         self.method_name = method_name
         self.method_cls = method_cls
         self.timestamp_matcher = timestamp_matcher
         self._archive_name_data: ArchiveNameData | None = None
 
+    @property
+    def file_size(self) -> int:
+        """
+        Archive size, getting a folder archive size from its sidecar or by walking it.
+
+        :return: archive size in bytes
+        """
+        if self._file_size is None:
+            try:
+                self._file_size = get_folder_size(self.path,
+                                                  self.path.stat().st_mtime_ns).total_bytes
+            except OSError:
+                self._file_size = 0
+        return self._file_size
+
+    @property
+    def known_file_size(self) -> int | None:
+        """
+        Archive size, if known without accessing the archive.
+
+        :return: archive size in bytes or None if a folder archive size is needed
+        """
+        return self._file_size
+
     @property
     def archive_name(self) -> str:
         return self.method_cls.handle_get_name(self.path.name)
@@ -126,33 +287,8 @@ class DiscoveredArchive:
     @property
     def archive_name_data(self) -> ArchiveNameData:
         if self._archive_name_data is None:
-            name_parts = self.archive_name.split('_')
-            source_name = name_parts[0]
-            # Parse name to extract date, time, and tags.
-            tags: list[str] = []
-            time_stamp: float | None = None
-            if len(name_parts) >= 2:
-                timestamp_matched = self.timestamp_matcher.match(name_parts[1])
-                if timestamp_matched:
-                    current_time = time.localtime()
-                    groups = timestamp_matched.groupdict()
-                    year = int(groups.get('year', current_time.tm_year))
-                    if year < 100:
-                        year += (current_time.tm_year % 100) * 100
-                    time_stamp = mktime((
-                        year,
-                        int(groups.get('month', current_time.tm_mon)),
-                        int(groups.get('day', current_time.tm_mday)),
-                        int(groups.get('hours', current_time.tm_hour)),
-                        int(groups.get('minutes', current_time.tm_min)),
-                        int(groups.get('seconds', current_time.tm_sec)),
-                        0, 0, -1))
-                    # Handles both comma and underscore-separated tags.
-                    raw_tags = ','.join(name_parts[2:])
-                else:
-                    raw_tags = ','.join(name_parts[1:])
-                tags = sorted(list(set([tag for tag in raw_tags.split(',') if tag.isalnum()])))
-            self._archive_name_data = ArchiveNameData(source_name, time_stamp, tags)
+            self._archive_name_data = ArchiveNameParser(
+                self.timestamp_matcher).parse(self.archive_name)
         return self._archive_name_data
 
     @property
@@ -181,47 +317,125 @@ class DiscoveredArchive:
         :param assumed_type: For testing, 1=file, 2=folder, None=check physical object
         :return: registered archive method or None if unsupported file type
         """
-        for name, method_cls in METHOD_MAP.items():
-            base_path = method_cls.check_supported(Path(path), assumed_type=assumed_type)
-            if base_path:
-                return RegisteredMethod(name, method_cls)
-        return None
+        if not isinstance(path, Path):
+            path = Path(path)
+        if assumed_type is None:
+            try:
+                assumed_type = _get_object_type(path.stat())
+            except OSError:
+                return None
+        return lookup_method(path.name, assumed_type)
+
+    @classmethod
+    def from_index_entry(cls,
+                         archive_folder: Path,
+                         entry: CatalogIndexEntry,
+                         timestamp_matcher: re.Pattern,
+                         ) -> Self | None:
+        """
+        Create DiscoveredArchive from catalog index entry without accessing it.
+
+        :param archive_folder: archive folder path
+        :param entry: catalog index entry
+        :param timestamp_matcher: regular expression for parsing file name timestamps
+        :return: DiscoveredArchive instance or None if the method is unknown
+        """
+        method_cls = METHOD_MAP.get(entry.method_name)
+        if method_cls is None:
+            return None
+        archive = cls(path=archive_folder / entry.name,
+                      file_time=entry.file_time,
+                      file_size=entry.size,
+                      method_name=entry.method_name,
+                      method_cls=method_cls,
+                      timestamp_matcher=timestamp_matcher)
+        archive._archive_name_data = ArchiveNameData(entry.source_name,
+                                                     entry.time_stamp,
+                                                     entry.tags)
+        return archive
+
+    def get_index_entry(self, with_size: bool = False) -> CatalogIndexEntry:
+        """
+        Produce catalog index entry.
+
+        :param with_size: get a folder archive size that is not known yet if True,
+                          e.g. for the catalog database
+        :return: catalog index entry
+        """
+        return CatalogIndexEntry(name=self.path.name,
+                                 method_name=self.method_name,
+                                 size=self.file_size if with_size else self._file_size,
+                                 file_time=self.file_time,
+                                 source_name=self.source_name,
+                                 time_stamp=self.archive_name_data.time_stamp,
+                                 tags=self.tags)
 
     @classmethod
     def get(cls,
             path: str | Path,
             timestamp_matcher: re.Pattern,
+            dir_entry: os.DirEntry = None,
             ) -> Self | None:
         """
         Create DiscoveredArchive for physical file or folder.
 
+        Requires a single stat() call, or none at all for a scanned directory
+        entry that is neither a folder nor named like an archive. Folder archive
+        sizes are the total archived file sizes, cached in a size sidecar. They
+        are only read, or computed, when first needed, so that discovery stays
+        cheap.
+
         :param path: path to archive file or folder
         :param timestamp_matcher: regular expression for parsing file name timestamps
+        :param dir_entry: optional os.scandir() entry for path
         :return: DiscoveredArchive instance.
         :raise ValueError: when the input is not a valid archive
         """
         if not isinstance(path, Path):
             path = Path(path)
-        registered_method = cls.get_method(path)
+        if dir_entry is not None:
+            if not dir_entry.is_dir() and lookup_extension_method(dir_entry.name) is None:
+                return None
+            file_stat = dir_entry.stat()
+        else:
+            try:
+                file_stat = path.stat()
+            except FileNotFoundError:
+                return None
+        registered_method = lookup_method(path.name, _get_object_type(file_stat))
         if registered_method is None:
             return None
-        file_stat = path.stat()
         return cls(path=path,
                    file_time=file_stat.st_mtime,
-                   file_size=file_stat.st_size,
+                   file_size=None if registered_method.method_cls.folder else file_stat.st_size,
                    method_name=registered_method.name,
                    method_cls=registered_method.method_cls,
                    timestamp_matcher=timestamp_matcher)
 
 
+def get_member_cache_limit(runtime: Runtime) -> int | None:
+    """
+    Get maximum total member list sidecar bytes per archive folder.
+
+    :param runtime: Jiig runtime API.
+    :return: maximum bytes or None for no limit
+    """
+    limit = runtime.get_param('member_cache_limit')
+    if not limit:
+        return None
+    return int(limit)
+
+
 def list_archive(runtime: Runtime,
                  archive_path: str | Path,
+                 prefix: str = None,
                  ) -> Sequence[MethodListItem]:
     """
     List tarball contents.
 
     :param runtime: Jiig runtime API.
     :param archive_path: archive tarball file path
+    :param prefix: optional member path prefix filter
     :return: sequence of archive items
     """
     timestamp_matcher = get_timestamp_matcher(str(runtime.get_param('timestamp_format')))
@@ -229,11 +443,102 @@ def list_archive(runtime: Runtime,
         discovered_archive = DiscoveredArchive.get(archive_path, timestamp_matcher)
         if discovered_archive is None:
             abort(f'Unsupported archive: {archive_path}')
-        return discovered_archive.method_cls().handle_list(archive_path)
+        clean_member_sidecars(discovered_archive.path.parent,
+                              max_bytes=get_member_cache_limit(runtime))
+        return discovered_archive.method_cls().handle_list(discovered_archive.path,
+                                                           prefix=prefix)
     except ValueError as exc:
         abort(exc)
 
 
+def parse_archive_names(archives: Iterable[DiscoveredArchive]):
+    """
+    Parse names for a batch of archives, sharing parsers and conversions.
+
+    :param archives: discovered archives
+    """
+    # Names are parsed in batches, one per timestamp format.
+    batches: dict[re.Pattern, list[DiscoveredArchive]] = {}
+    for archive in archives:
+        if archive._archive_name_data is None:
+            batches.setdefault(archive.timestamp_matcher, []).append(archive)
+    for timestamp_matcher, batch in batches.items():
+        archive_names = [archive.archive_name for archive in batch]
+        name_data_list = ArchiveNameParser(timestamp_matcher).parse_names(archive_names)
+        for archive, name_data in zip(batch, name_data_list):
+            archive._archive_name_data = name_data
+
+
+def find_delta_base_archive(archive_folder: Path, base_name: str) -> Path | None:
+    """
+    Find the archive that a delta manifest names as a base.
+
+    :param archive_folder: archive folder path
+    :param base_name: base archive name from a delta manifest
+    :return: base archive path or None if it is missing
+    """
+    base_path = archive_folder / base_name
+    if os.path.lexists(base_path):
+        return base_path
+    # A recompressed base archive keeps its name, apart from the extension.
+    registered_method = lookup_method(base_name, 1) or lookup_method(base_name, 2)
+    if registered_method is None:
+        return None
+    base_key = registered_method.method_cls.handle_get_name(base_name)
+    with os.scandir(archive_folder) as dir_entries:
+        for dir_entry in dir_entries:
+            if is_metadata_name(dir_entry.name):
+                continue
+            entry_method = lookup_method(dir_entry.name, 2 if dir_entry.is_dir() else 1)
+            if (entry_method is not None
+                    and entry_method.method_cls.handle_get_name(dir_entry.name) == base_key):
+                return Path(dir_entry.path)
+    return None
+
+
+def get_delta_base_names(archive_folder: Path,
+                         deleted_names: Collection[str] = None,
+                         ) -> set[str]:
+    """
+    Get names of archives that other archives' deltas are based on.
+
+    Bases of bases are included, since deltas are applied in a chain.
+
+    :param archive_folder: archive folder path
+    :param deleted_names: optional names of archives about to be deleted, whose
+                          deltas are not considered
+    :return: base archive names
+    """
+    pending_names = [name for name in list_delta_archive_names(archive_folder)
+                     if name not in (deleted_names or ())
+                     and os.path.lexists(archive_folder / name)]
+    base_names: set[str] = set()
+    while pending_names:
+        manifest = read_delta_manifest(archive_folder / pending_names.pop())
+        for manifest_base_name in set(entry['base'] for entry in (manifest or {}).values()):
+            base_path = find_delta_base_archive(archive_folder, manifest_base_name)
+            if base_path is not None and base_path.name not in base_names:
+                base_names.add(base_path.name)
+                pending_names.append(base_path.name)
+    return base_names
+
+
+def delete_archive(archive_path: Path):
+    """
+    Delete archive file or folder along with its metadata.
+
+    :param archive_path: archive file or folder path
+    """
+    if archive_path.is_dir():
+        delete_folder(archive_path, quiet=True)
+    else:
+        delete_file(archive_path, quiet=True)
+    delete_member_sidecar(archive_path)
+    delete_size_sidecar(archive_path)
+    delete_fingerprint_sidecar(archive_path)
+    delete_delta_sidecar(archive_path)
+
+
 def save_archive(runtime: Runtime,
                  catalog_spec: CatalogSpec,
                  method_name: str,
@@ -244,12 +549,21 @@ def save_archive(runtime: Runtime,
                  timestamp: bool = False,
                  progress: bool = False,
                  keep_list: bool = False,
+                 fingerprint: str = None,
+                 destinations: Sequence[SaveDestination] = None,
+                 shard_count: int = 0,
+                 delta_min_size: int = None,
+                 delta_chain_limit: int = None,
                  dry_run: bool = None,
                  verbose: bool = None,
                  ):
     """
     Save an archive of a source folder.
 
+    With additional destinations, the source is read once, and the tar stream
+    is shared by all destinations with tar-based methods. Destinations with
+    the same compression also share compressed output.
+
     :param runtime: Jiig runtime API.
     :param catalog_spec: source folder, archive folder, and source name
     :param method_name: archive method name
@@ -260,6 +574,13 @@ def save_archive(runtime: Runtime,
     :param timestamp: assign time stamp to archive (added to file name)
     :param progress: show progress if True
     :param keep_list: do not delete temporary file list file if True
+    :param fingerprint: optional source fingerprint digest to record for the archive
+    :param destinations: optional additional archive folders and methods
+    :param shard_count: number of shards for sharded methods (default: CPU count)
+    :param delta_min_size: optional minimum size of files to save as deltas
+                           against their previous version
+    :param delta_chain_limit: maximum deltas in a row before a file is saved in
+                              full again (default: DEFAULT_DELTA_CHAIN_LIMIT)
     :param dry_run: avoid destructive actions if True
     :param verbose: display extra messages if True
     """
@@ -268,10 +589,13 @@ def save_archive(runtime: Runtime,
     if verbose is None:
         verbose = runtime.options.verbose
     timestamp_format = str(runtime.get_param('timestamp_format'))
-    method_cls = METHOD_MAP.get(method_name)
-    if not method_cls:
-        raise RuntimeError(f'Bad archive method name "{method_name}".')
-    create_folder(catalog_spec.archive_folder)
+    targets = [_SaveTarget(catalog_spec.archive_folder, method_name)]
+    for destination in destinations or []:
+        targets.append(_SaveTarget(destination.archive_folder, destination.method_name))
+    if delta_min_size and (len(targets) > 1 or targets[0].method_cls.source_copy):
+        abort('Delta saves require a single destination and an archive file method.')
+    for target in targets:
+        create_folder(target.archive_folder)
     # Temporarily relocate in order to resolve relative paths.
     with temporary_working_folder(catalog_spec.source_folder):
         name_parts = [catalog_spec.source_name]
@@ -279,7 +603,10 @@ def save_archive(runtime: Runtime,
             name_parts.append(strftime(timestamp_format))
         if tags:
             name_parts.extend(tags)
-        full_folder_path = catalog_spec.archive_folder / '_'.join(name_parts)
+        archive_name = '_'.join(name_parts)
+        # Partial archive names have no time stamp, so that a later save can
+        # continue where an interrupted one stopped.
+        partial_name = '_'.join([catalog_spec.source_name] + list(tags or []))
         if pending:
             source_file_iterator = iterate_git_pending(catalog_spec.source_folder)
             if gitignore or excludes:
@@ -292,8 +619,9 @@ def save_archive(runtime: Runtime,
         if dry_run:
             for path_idx, path in enumerate(source_file_iterator):
                 if path_idx == 0:
-                    log_message(f'Saving archive (dry run)'
-                                f': {short_path(full_folder_path)}')
+                    for target in targets:
+                        log_message(f'Saving archive (dry run)'
+                                    f': {short_path(target.archive_folder / archive_name)}')
                 log_message(f'  {path}')
             return
         # Save and flush the file path list as a temporary file in order to
@@ -305,20 +633,41 @@ def save_archive(runtime: Runtime,
         total_files = 0
         total_folders = 0
         total_bytes = 0
+        total_file_bytes = 0
         visited_folders: set[str] = set()
+        # Member list sidecars are written alongside the file list and published
+        # once the archives are successfully saved.
+        members_files: list[TextIO] = []
+        for target in targets:
+            if target.method_cls.member_sidecar:
+                target.members_file = open_member_sidecar(target.archive_folder)
+                members_files.append(target.members_file)
+        delta_save: DeltaSave | None = None
+        if delta_min_size:
+            delta_save = DeltaSave(catalog_spec.archive_folder,
+                                   catalog_spec.source_name,
+                                   delta_min_size,
+                                   chain_limit=delta_chain_limit)
         with NamedTemporaryFile(prefix=f'tzar_{catalog_spec.source_name}_',
                                 suffix='.txt',
                                 mode='w',
                                 encoding='utf-8',
-                                **temp_options) as temp_file:
+                                **temp_options) as temp_file, ExitStack() as lock_stack:
             if keep_list:
                 log_message(f'File list: {temp_file.name}')
             for file_path in source_file_iterator:
                 if file_path.is_file():
+                    file_stat = file_path.stat(follow_symlinks=False)
+                    if delta_save is not None and delta_save.add_file(
+                            normalize_member_path(file_path), file_stat):
+                        continue
                     temp_file.write(str(file_path))
                     temp_file.write(os.linesep)
                     total_files += 1
-                    total_bytes += file_path.stat(follow_symlinks=False).st_size
+                    total_bytes += file_stat.st_size
+                    total_file_bytes += file_stat.st_size
+                    for members_file in members_files:
+                        write_member(members_file, file_path, file_stat.st_mtime, file_stat.st_size)
                     folder_path = file_path.parent or Path('.')
                     if folder_path not in visited_folders:
                         visited_folders.add(str(folder_path))
@@ -327,44 +676,222 @@ def save_archive(runtime: Runtime,
                 else:
                     log_warning('Source path is not a file.', file_path)
             temp_file.flush()
-            method_data = MethodSaveData(
-                source_path=catalog_spec.source_folder,
-                source_list_path=Path(temp_file.name),
-                archive_path=full_folder_path,
-                verbose=verbose and not progress,
-                dry_run=dry_run,
-                progress=progress,
-                total_bytes=total_bytes,
-                total_files=total_files,
-                total_folders=total_folders,
-            )
-            save_data = method_cls.handle_save(method_data)
-            log_message(f'Saving archive: {short_path(save_data.archive_path)}')
-            full_command = shell_command_string(*save_data.command_arguments)
-            if verbose:
-                log_message('Archive command:', full_command)
+            for target in targets:
+                partial_folder = get_metadata_folder(target.archive_folder, PARTIAL_FOLDER_NAME)
+                create_folder(partial_folder)
+                extension = target.method_cls.extension or ''
+                lock_stack.enter_context(
+                    _lock_partial_archive(partial_folder / f'{partial_name}{extension}'))
+                existing_path = target.archive_folder / f'{archive_name}{extension}'
+                link_path = None
+                if target.method_cls.resumable and existing_path.is_dir():
+                    link_path = existing_path
+                method_data = MethodSaveData(
+                    source_path=catalog_spec.source_folder,
+                    source_list_path=Path(temp_file.name),
+                    archive_path=partial_folder / partial_name,
+                    verbose=verbose and not progress,
+                    dry_run=dry_run,
+                    progress=progress,
+                    total_bytes=total_bytes,
+                    total_files=total_files,
+                    total_folders=total_folders,
+                    shard_count=shard_count,
+                    link_path=link_path,
+                )
+                # A single destination uses the method's own command, e.g. with progress.
+                if len(targets) > 1:
+                    target.stream_result = target.method_cls.handle_stream(method_data)
+                if target.stream_result is not None:
+                    target.partial_path = target.stream_result.archive_path
+                else:
+                    save_data = target.method_cls.handle_save(method_data)
+                    target.partial_path = save_data.archive_path
+                    target.command = shell_command_string(*save_data.command_arguments)
+                    if save_data.parallel_command_arguments:
+                        target.parallel_commands = [
+                            shell_command_string(*command_arguments)
+                            for command_arguments in save_data.parallel_command_arguments
+                        ]
+                        target.checkpoint_paths = save_data.checkpoint_paths
+                # The method adds its extension to the partial name.
+                target.archive_path = (target.archive_folder
+                                       / f'{archive_name}{target.partial_path.name[len(partial_name):]}')
+                log_message(f'Saving archive: {short_path(target.archive_path)}')
+                if verbose:
+                    for command in target.parallel_commands or [target.command]:
+                        if command is not None:
+                            log_message('Archive command:', command)
             formatted_bytes = format_human_byte_count(total_bytes, unit_format='b')
             log_message(f'Archiving {formatted_bytes}'
                         f' from {total_files} files'
                         f' in {total_folders} folders ...')
-            ret_code = os.system(full_command)
-            if ret_code != 0:
-                abort('Archive command failed.', full_command)
-
+            if delta_save is not None:
+                try:
+                    delta_bytes = delta_save.write_deltas(targets[0].archive_path)
+                except OSError as exc:
+                    delta_save.discard()
+                    for members_file in members_files:
+                        discard_member_sidecar(members_file)
+                    abort('Failed to save deltas.', exc)
+                if delta_save.delta_files:
+                    log_message(f'Saved {len(delta_save.delta_files)} large files as deltas'
+                                f' ({format_human_byte_count(delta_bytes, unit_format="b")}).')
+            saved_paths: set[Path] = set()
+            stream_results = [target.stream_result
+                              for target in targets
+                              if target.stream_result is not None]
+            if stream_results:
+                saved_paths.update(save_tar_fanout(Path(temp_file.name),
+                                                   stream_results,
+                                                   verbose=verbose and not progress))
+            for target in targets:
+                if target.parallel_commands:
+                    command_results = _run_parallel_commands(target.parallel_commands)
+                    for (temporary_path, checkpoint_path), succeeded in zip(
+                            target.checkpoint_paths or [], command_results):
+                        if succeeded:
+                            os.rename(temporary_path, checkpoint_path)
+                    if all(command_results):
+                        saved_paths.add(target.partial_path)
+                elif target.command is not None and os.system(target.command) == 0:
+                    saved_paths.add(target.partial_path)
+            failed_targets: list[_SaveTarget] = []
+            trash_folders: set[Path] = set()
+            for target in targets:
+                if target.partial_path not in saved_paths:
+                    if target.members_file is not None:
+                        discard_member_sidecar(target.members_file)
+                    if delta_save is not None:
+                        delta_save.discard()
+                    if target.method_cls.resumable:
+                        log_message(f'Partial archive kept for the next save:'
+                                    f' {short_path(target.partial_path)}')
+                    elif os.path.lexists(target.partial_path):
+                        delete_file(target.partial_path)
+                    failed_targets.append(target)
+                    continue
+                # The catalog index is only loaded for publishing, since other
+                # commands may change the archive folder while saving.
+                with updating_catalog_index(target.archive_folder,
+                                            timestamp_format) as catalog_index:
+                    with changing_archive_folder(catalog_index):
+                        if _publish_partial_archive(target.partial_path, target.archive_path):
+                            trash_folders.add(target.archive_folder)
+                    if delta_save is not None:
+                        try:
+                            delta_save.publish()
+                        except OSError as exc:
+                            log_error('Failed to publish deltas, large files are missing'
+                                      ' from the archive.', target.archive_path, exc)
+                    if target.members_file is not None:
+                        publish_member_sidecar(target.members_file, target.archive_path)
+                    if target.method_cls.source_copy:
+                        # Avoids walking the new folder archive to determine its size.
+                        record_folder_size(target.archive_path,
+                                           FolderSize(total_bytes=total_file_bytes,
+                                                      total_files=total_files))
+                    if fingerprint is not None:
+                        record_archive_fingerprint(target.archive_path, fingerprint)
+                    saved_archive = DiscoveredArchive.get(target.archive_path,
+                                                          get_timestamp_matcher(timestamp_format))
+                    if saved_archive is not None:
+                        saved_entry = saved_archive.get_index_entry(with_size=True)
+                        if catalog_index is not None:
+                            catalog_index.entries[saved_entry.name] = saved_entry
+                if saved_archive is not None:
+                    record_saved_archive(runtime, target.archive_folder, saved_entry)
+            if failed_targets:
+                abort('Archive command failed.',
+                      *(target.command or short_path(target.archive_path)
+                        for target in failed_targets))
+            for archive_folder in dict.fromkeys(target.archive_folder for target in targets):
+                if archive_folder in trash_folders:
+                    empty_trash(archive_folder)
+                clean_partial_archives(archive_folder)
+                clean_member_sidecars(archive_folder,
+                                      max_bytes=get_member_cache_limit(runtime))
+
+
+class _SaveTarget:
+
+    def __init__(self, archive_folder: Path, method_name: str):
+        self.archive_folder = archive_folder
+        self.method_cls = METHOD_MAP.get(method_name)
+        if not self.method_cls:
+            raise RuntimeError(f'Bad archive method name "{method_name}".')
+        self.members_file: TextIO | None = None
+        self.stream_result: MethodStreamResult | None = None
+        self.partial_path: Path | None = None
+        self.archive_path: Path | None = None
+        self.command: str | None = None
+        self.parallel_commands: list[str] | None = None
+        self.checkpoint_paths: list[tuple[Path, Path]] | None = None
+
+
+def _run_parallel_commands(commands: list[str]) -> list[bool]:
+    processes = [subprocess.Popen(command, shell=True) for command in commands]
+    # Waits for every process, even after a failure.
+    return [process.wait() == 0 for process in processes]
+
+
+def clean_partial_archives(archive_folder: Path):
+    """
+    Delete abandoned partial archives and temporary files from an archive folder.
 
-def get_timestamp_matcher(timestamp_format: str) -> re.Pattern:
-    """Produce compiled regular expression for parsing timestamp strings.
+    Partial archive folders of resumable methods are kept for the next save.
+    Other partial archives are deleted unless a save holds their lock, and
+    temporary files are deleted once they are older than TEMPORARY_MAX_AGE.
 
-    :param timestamp_format: timestamp format string
-    :return: compiled regular expression for parsing timestamps
+    :param archive_folder: archive folder path
     """
-    return re.compile(
-        timestamp_format.replace(
-            '%Y', r'(?P<year>\d\d\d\d)').replace(
-            '%y', r'(?P<year>\d\d)').replace(
-            '%m', r'(?P<month>\d\d)').replace(
-            '%d', r'(?P<day>\d\d)').replace(
-            '%H', r'(?P<hours>\d\d)').replace(
-            '%M', r'(?P<minutes>\d\d)').replace(
-            '%S', r'(?P<seconds>\d\d)')
-    )
+    partial_folder = get_metadata_folder(archive_folder, PARTIAL_FOLDER_NAME)
+    try:
+        entries = list(os.scandir(partial_folder))
+    except FileNotFoundError:
+        return
+    oldest_temporary_time = time() - TEMPORARY_MAX_AGE
+    for entry in entries:
+        try:
+            if entry.name.startswith('.'):
+                if (not entry.name.endswith(_LOCK_SUFFIX)
+                        and entry.stat(follow_symlinks=False).st_mtime < oldest_temporary_time):
+                    os.remove(entry.path)
+            elif not entry.is_dir(follow_symlinks=False):
+                with _open_partial_lock(Path(entry.path)) as lock_file:
+                    if _try_lock(lock_file):
+                        os.remove(entry.path)
+        except OSError as exc:
+            log_warning('Failed to clean up partial archive.', entry.path, exc)
+
+
+def _open_partial_lock(partial_path: Path) -> TextIO:
+    return open(partial_path.parent / f'.{partial_path.name}{_LOCK_SUFFIX}', 'w', encoding='utf-8')
+
+
+def _try_lock(lock_file: TextIO) -> bool:
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@contextmanager
+def _lock_partial_archive(partial_path: Path) -> Iterator[None]:
+    with _open_partial_lock(partial_path) as lock_file:
+        if not _try_lock(lock_file):
+            abort('Another save of the same archive is in progress.', short_path(partial_path))
+        yield
+
+
+def _publish_partial_archive(partial_path: Path, archive_path: Path) -> bool:
+    # Returns True if an existing folder archive was moved to the trash.
+    if archive_path.is_dir() and not archive_path.is_symlink():
+        # Folders can't be replaced atomically, but the old one is only
+        # unavailable between the two renames.
+        move_to_trash(archive_path)
+        os.rename(partial_path, archive_path)
+        return True
+    os.replace(partial_path, archive_path)
+    return False
@@ -0,0 +1,247 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Change-driven automatic saves.
+
+Source folders are watched for changes. A save is scheduled once changes stop
+arriving for a debounce period, but no sooner than a minimum interval after the
+previous save, and no later than a maximum staleness after the first unsaved
+change. Before saving, a fingerprint of the files selected by the save rules,
+i.e. excludes and gitignore, is compared with the one recorded for the newest
+archive, so that changes to excluded files do not cause saves.
+
+Sources with folders that can't be watched, e.g. beyond the inotify watch
+limit, fall back to periodic fingerprint checks, like with the polling watcher.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from jiig import Runtime
+from jiig.util.log import (
+    log_error,
+    log_message,
+    log_warning,
+)
+
+from .archive import (
+    CatalogSpec,
+    save_archive,
+)
+from .catalog import (
+    get_latest_fingerprint,
+    list_catalog,
+)
+from .fingerprint import get_source_fingerprint
+from .watch import (
+    FolderWatcher,
+    InotifyWatcher,
+    WatchEvent,
+)
+
+
+@dataclass
+class SaveSchedule:
+    """Automatic save timing rules, in seconds."""
+    debounce: float = 30.0
+    min_interval: float = 600.0
+    max_staleness: float = 3600.0
+
+
+@dataclass
+class WatchedSource:
+    """Automatic save state for a source folder."""
+    catalog_spec: CatalogSpec
+    # Times are from time.time(), so that the last save time can come from the catalog.
+    last_save_time: float = 0.0
+    first_change_time: float | None = None
+    last_change_time: float | None = None
+    fingerprint: str | None = None
+    # True if some folders could not be watched, e.g. due to the inotify watch
+    # limit, so that changes are found by periodic fingerprint checks.
+    assume_changes: bool = False
+
+    def mark_changed(self, change_time: float):
+        """
+        Record a change.
+
+        :param change_time: change time
+        """
+        if self.first_change_time is None:
+            self.first_change_time = change_time
+        self.last_change_time = change_time
+
+    def get_due_time(self, schedule: SaveSchedule) -> float | None:
+        """
+        Get the time a save is due.
+
+        :param schedule: save timing rules
+        :return: due time, or None if nothing changed
+        """
+        if self.first_change_time is None:
+            return None
+        settled_time = min(self.last_change_time + schedule.debounce,
+                           self.first_change_time + schedule.max_staleness)
+        return max(settled_time, self.last_save_time + schedule.min_interval)
+
+
+class AutoSaver:
+    """Change-driven automatic saves for source folders."""
+
+    def __init__(self,
+                 runtime: Runtime,
+                 catalog_specs: list[CatalogSpec],
+                 watcher: FolderWatcher,
+                 method_name: str,
+                 schedule: SaveSchedule,
+                 tags: list[str] = None,
+                 gitignore: bool = False,
+                 excludes: list[str] = None,
+                 ):
+        """
+        Automatic saver constructor.
+
+        :param runtime: Jiig runtime API.
+        :param catalog_specs: source folder, archive folder, and source name per source
+        :param watcher: folder watcher
+        :param method_name: archive method name
+        :param schedule: save timing rules
+        :param tags: optional tags to assign to archives
+        :param gitignore: obey .gitignore exclusions if True
+        :param excludes: file exclusion patterns
+        """
+        self.runtime = runtime
+        self.watcher = watcher
+        self.method_name = method_name
+        self.schedule = schedule
+        self.tags = tags
+        self.gitignore = gitignore
+        self.excludes = excludes
+        self.sources = [WatchedSource(catalog_spec) for catalog_spec in catalog_specs]
+        self._sources_by_folder: dict[Path, WatchedSource] = {}
+        # The polling watcher only sees added and removed entries, so sources
+        # are assumed to change continuously and fingerprints decide.
+        self.assume_changes = not isinstance(watcher, InotifyWatcher)
+
+    def start(self):
+        """Start watching sources, and schedule saves for unsaved changes."""
+        now = time.time()
+        for source in self.sources:
+            catalog_spec = source.catalog_spec
+            if catalog_spec.archive_folder.is_dir():
+                catalog_items = list_catalog(self.runtime, catalog_spec)
+                if catalog_items:
+                    source.last_save_time = catalog_items[0].time
+            source.fingerprint = get_latest_fingerprint(self.runtime, catalog_spec)
+            tree_fingerprint = get_source_fingerprint(self.runtime,
+                                                      catalog_spec.source_folder,
+                                                      gitignore=self.gitignore,
+                                                      excludes=self.excludes)
+            for folder in tree_fingerprint.folders:
+                self._watch_folder(folder, source)
+            if (tree_fingerprint.digest != source.fingerprint
+                    or self.assume_changes
+                    or source.assume_changes):
+                source.mark_changed(now)
+
+    def run(self):
+        """Save changed sources until interrupted."""
+        while True:
+            now = time.time()
+            due_times = [
+                due_time for due_time in (source.get_due_time(self.schedule)
+                                          for source in self.sources)
+                if due_time is not None
+            ]
+            timeout = max(0.0, min(due_times) - now) if due_times else None
+            self.handle_events(self.watcher.read_events(timeout=timeout))
+            now = time.time()
+            for source in self.sources:
+                due_time = source.get_due_time(self.schedule)
+                if due_time is not None and due_time <= now:
+                    self.save_source(source)
+
+    def handle_events(self, events: list[WatchEvent]):
+        """
+        Mark sources with changed folders.
+
+        :param events: folder change events
+        """
+        now = time.time()
+        for event in events:
+            source = self._sources_by_folder.get(event.folder)
+            if source is None:
+                continue
+            if event.name is None and event.removed:
+                self._sources_by_folder.pop(event.folder, None)
+            elif event.name is not None and event.is_folder and not event.removed:
+                # Watch new folders, including ones moved in with content.
+                new_folder = event.folder / event.name
+                for walk_folder, _sub_folder_names, _file_names in os.walk(new_folder):
+                    self._watch_folder(Path(walk_folder), source)
+            source.mark_changed(now)
+
+    def save_source(self, source: WatchedSource):
+        """
+        Save source if its fingerprint changed since the last save.
+
+        :param source: watched source
+        """
+        catalog_spec = source.catalog_spec
+        now = time.time()
+        fingerprint = get_source_fingerprint(self.runtime,
+                                             catalog_spec.source_folder,
+                                             gitignore=self.gitignore,
+                                             excludes=self.excludes).digest
+        source.first_change_time = source.last_change_time = None
+        if self.assume_changes or source.assume_changes:
+            source.mark_changed(now)
+        if fingerprint == source.fingerprint:
+            return
+        log_message(f'Saving changed source: {catalog_spec.source_folder}')
+        try:
+            save_archive(self.runtime,
+                         catalog_spec,
+                         self.method_name,
+                         tags=self.tags,
+                         gitignore=self.gitignore,
+                         excludes=self.excludes,
+                         timestamp=True,
+                         fingerprint=fingerprint)
+        except SystemExit as exc:
+            # A failed save aborts, which must not stop the other sources.
+            log_error('Automatic save failed.', catalog_spec.source_folder, exc)
+        else:
+            source.fingerprint = fingerprint
+        source.last_save_time = now
+
+    def _watch_folder(self, folder: Path, source: WatchedSource):
+        if folder.is_relative_to(source.catalog_spec.archive_folder):
+            return
+        if folder in self._sources_by_folder:
+            return
+        if self.watcher.add_folder(folder):
+            self._sources_by_folder[folder] = source
+        elif folder.is_dir() and not source.assume_changes:
+            # Folders that vanished meanwhile are not a problem.
+            log_warning('Failed to watch folder, the source will be checked'
+                        ' for changes periodically instead.', folder)
+            source.assume_changes = True
+            source.mark_changed(time.time())
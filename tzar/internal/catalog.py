@@ -17,8 +17,21 @@
 
 """Catalog utility functions and classes."""
 
+import csv
+import json
 import os
-from dataclasses import dataclass
+from bisect import (
+    bisect_left,
+    bisect_right,
+)
+from dataclasses import (
+    dataclass,
+    field,
+)
+from itertools import (
+    chain,
+    islice,
+)
 from pathlib import Path
 from time import (
     strftime,
@@ -26,9 +39,13 @@ from time import (
     localtime,
 )
 from typing import (
+    Any,
+    Callable,
     Collection,
     Iterable,
     Iterator,
+    Self,
+    Sequence,
 )
 
 from jiig import Runtime
@@ -36,13 +53,29 @@ from jiig.util.filesystem import (
     format_file_size,
     short_path,
 )
-from jiig.util.log import log_error
-from jiig.util.text.table import format_table
+from jiig.util.log import (
+    abort,
+    log_error,
+)
 
 from .archive import (
+    METHOD_MAP,
     CatalogSpec,
     DiscoveredArchive,
     get_timestamp_matcher,
+    lookup_extension_method,
+    parse_archive_names,
+)
+from .database import (
+    get_catalog_database_path,
+    open_catalog_database,
+)
+from .fingerprint import read_archive_fingerprint
+from .index import CatalogIndex
+from .metadata import (
+    METADATA_FOLDER_NAME,
+    get_metadata_folder,
+    is_metadata_name,
 )
 
 
@@ -52,8 +85,20 @@ class CatalogItem:
     path: Path
     method_name: str
     tags: list[str]
-    size: int
+    # None until get_size() gets a folder archive size from the archive.
+    size: int | None
     time: float
+    archive: DiscoveredArchive | None = field(default=None, repr=False, compare=False)
+
+    def get_size(self) -> int:
+        """
+        Get archive size, getting a folder archive size as needed.
+
+        :return: archive size in bytes
+        """
+        if self.size is None:
+            self.size = self.archive.file_size if self.archive is not None else 0
+        return self.size
 
     @property
     def time_struct(self) -> struct_time:
@@ -65,7 +110,36 @@ class CatalogItem:
 
     @property
     def display_name(self) -> str:
-        return short_path(self.path.name, is_folder=os.path.isdir(self.path))
+        method_cls = METHOD_MAP.get(self.method_name)
+        return short_path(self.path.name, is_folder=method_cls is not None and method_cls.folder)
+
+    def get_data(self) -> dict:
+        """
+        Produce item data for machine-readable output.
+
+        :return: item data dictionary with CATALOG_FIELD_NAMES keys
+        """
+        return {
+            'name': self.path.name,
+            'path': str(self.path),
+            'method': self.method_name,
+            'tags': self.tags,
+            'size': self.get_size(),
+            'time': self.time,
+            'time_string': strftime('%Y-%m-%dT%H:%M:%S', self.time_struct),
+        }
+
+
+CATALOG_FORMATS = ('table', 'json', 'ndjson', 'csv')
+CATALOG_FIELD_NAMES = ('name', 'path', 'method', 'tags', 'size', 'time', 'time_string')
+CATALOG_SORT_KEYS: dict[str, Callable[[CatalogItem], Any]] = {
+    'time': lambda item: item.time,
+    'size': lambda item: (item.get_size(), item.time),
+    'name': lambda item: item.path.name,
+    'method': lambda item: (item.method_name, item.time),
+}
+# Number of leading table rows used to determine column widths.
+TABLE_WIDTH_SAMPLE_SIZE = 1000
 
 
 def get_catalog_spec(runtime: Runtime,
@@ -130,25 +204,18 @@ def list_catalog(runtime: Runtime,
     :param tags: optional tags for filtering catalog archives (all are required)
     :return: found catalog items
     """
-    timestamp_matcher = get_timestamp_matcher(str(runtime.get_param('timestamp_format')))
-    timestamp_min = max(filter(lambda ts: ts is not None, (date_min, age_max)),
-                        default=None)
-    timestamp_max = min(filter(lambda ts: ts is not None, (date_max, age_min)),
-                        default=None)
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    timestamp_min, timestamp_max = get_catalog_timestamp_range(date_min=date_min,
+                                                               date_max=date_max,
+                                                               age_min=age_min,
+                                                               age_max=age_max)
     if not catalog_spec.archive_folder.is_dir():
         log_error('Catalog archive folder does not exist.', catalog_spec.archive_folder)
         return []
     if not catalog_spec.source_folder.is_dir():
         log_error(f'Source folder does not exist.', catalog_spec.source_folder)
         return []
-    discovered_archives: list[DiscoveredArchive] = []
-    for path in catalog_spec.archive_folder.glob('*'):
-        try:
-            discovered_archive = DiscoveredArchive.get(path, timestamp_matcher)
-            if discovered_archive is not None:
-                discovered_archives.append(discovered_archive)
-        except ValueError as exc:
-            log_error(exc)
+    discovered_archives = discover_archives(catalog_spec.archive_folder, timestamp_format)
     if tags:
         filter_tag_set = set(tags)
     else:
@@ -162,6 +229,224 @@ def list_catalog(runtime: Runtime,
                               filter_tag_set=filter_tag_set)
 
 
+def get_latest_fingerprint(runtime: Runtime, catalog_spec: CatalogSpec) -> str | None:
+    """
+    Get source fingerprint recorded for the newest catalog archive.
+
+    :param runtime: Jiig runtime API.
+    :param catalog_spec: source folder, archive folder, and source name
+    :return: fingerprint digest or None if unavailable
+    """
+    if not catalog_spec.archive_folder.is_dir():
+        return None
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    catalog_items = build_catalog_list(discover_archives(catalog_spec.archive_folder,
+                                                         timestamp_format),
+                                       catalog_spec.source_name)
+    if not catalog_items:
+        return None
+    return read_archive_fingerprint(catalog_items[0].path)
+
+
+def get_catalog_timestamp_range(date_min: float = None,
+                                date_max: float = None,
+                                age_min: float = None,
+                                age_max: float = None,
+                                ) -> tuple[float | None, float | None]:
+    """
+    Combine date and age limits into a time stamp range.
+
+    :param date_min: timestamp based on minimum date
+    :param date_max: timestamp based on maximum date
+    :param age_min: timestamp based on minimum age
+    :param age_max: timestamp based on maximum age
+    :return: (minimum, maximum) time stamps, either of which may be None
+    """
+    timestamp_min = max(filter(lambda ts: ts is not None, (date_min, age_max)),
+                        default=None)
+    timestamp_max = min(filter(lambda ts: ts is not None, (date_max, age_min)),
+                        default=None)
+    return timestamp_min, timestamp_max
+
+
+def discover_archives(archive_folder: Path,
+                      timestamp_format: str,
+                      ) -> list[DiscoveredArchive]:
+    """
+    Discover archives in archive folder, using the catalog index when current.
+
+    Rescans the folder and rewrites the index when the index is missing or out
+    of date.
+
+    :param archive_folder: archive folder path
+    :param timestamp_format: timestamp format used to parse archive names
+    :return: discovered archives
+    """
+    timestamp_matcher = get_timestamp_matcher(timestamp_format)
+    catalog_index = CatalogIndex.load(archive_folder, timestamp_format)
+    if catalog_index is not None and catalog_index.is_current():
+        discovered_archives: list[DiscoveredArchive] = []
+        for entry in catalog_index.entries.values():
+            discovered_archive = DiscoveredArchive.from_index_entry(
+                archive_folder, entry, timestamp_matcher)
+            if discovered_archive is not None:
+                discovered_archives.append(discovered_archive)
+        return discovered_archives
+    # Create the metadata folder first so that it doesn't change the archive
+    # folder modification time after it is recorded.
+    try:
+        get_metadata_folder(archive_folder).mkdir(exist_ok=True)
+    except OSError:
+        pass
+    catalog_index = CatalogIndex(archive_folder, timestamp_format)
+    catalog_index.mark_current()
+    discovered_archives = []
+    with os.scandir(archive_folder) as dir_entries:
+        for dir_entry in dir_entries:
+            if is_metadata_name(dir_entry.name):
+                continue
+            try:
+                discovered_archive = DiscoveredArchive.get(archive_folder / dir_entry.name,
+                                                           timestamp_matcher,
+                                                           dir_entry=dir_entry)
+                if discovered_archive is not None:
+                    discovered_archives.append(discovered_archive)
+            except (OSError, ValueError) as exc:
+                log_error(exc)
+    parse_archive_names(discovered_archives)
+    for discovered_archive in discovered_archives:
+        catalog_index.entries[discovered_archive.path.name] = discovered_archive.get_index_entry()
+    catalog_index.save()
+    return discovered_archives
+
+
+def find_archive_folders(root_folder: Path,
+                         searched_folders: list[Path] = None,
+                         ) -> list[Path]:
+    """
+    Find archive folders below a root folder.
+
+    A folder is an archive folder if it has a metadata folder or holds archive
+    files. Sub-folders of archive folders are assumed to be folder archives,
+    unless they have their own metadata folder.
+
+    :param root_folder: root folder to search
+    :param searched_folders: optional list that receives the searched folders
+                             that are not archive folders, e.g. to watch them
+                             for new archive folders
+    :return: archive folder paths
+    """
+    archive_folders: list[Path] = []
+    pending_folders = [root_folder]
+    while pending_folders:
+        folder = pending_folders.pop()
+        try:
+            with os.scandir(folder) as dir_entries:
+                entries = list(dir_entries)
+        except OSError:
+            continue
+        is_archive_folder = any(
+            entry.name == METADATA_FOLDER_NAME
+            or (not entry.is_dir() and lookup_extension_method(entry.name) is not None)
+            for entry in entries
+        )
+        if is_archive_folder:
+            archive_folders.append(folder)
+        elif searched_folders is not None:
+            searched_folders.append(folder)
+        for entry in entries:
+            if is_metadata_name(entry.name) or not entry.is_dir(follow_symlinks=False):
+                continue
+            sub_folder = Path(entry.path)
+            if not is_archive_folder or get_metadata_folder(sub_folder).is_dir():
+                pending_folders.append(sub_folder)
+    return archive_folders
+
+
+def reindex_catalog_database(runtime: Runtime,
+                             root_folder: Path,
+                             ) -> tuple[int, int]:
+    """
+    Rebuild the global catalog database from archive folders.
+
+    :param runtime: Jiig runtime API.
+    :param root_folder: root folder to search for archive folders
+    :return: (archive folder count, archive count) tuple
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        abort('The catalog database is disabled.')
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    archive_folders = find_archive_folders(root_folder)
+    archive_folder_set = set(archive_folders)
+    archive_count = 0
+    with open_catalog_database(database_path) as database:
+        for archive_folder in archive_folders:
+            entries = [
+                archive.get_index_entry(with_size=True)
+                for archive in discover_archives(archive_folder, timestamp_format)
+                if archive.path not in archive_folder_set
+            ]
+            database.replace_folder(archive_folder, entries)
+            archive_count += len(entries)
+        database.remove_folders_except(archive_folders)
+        database.remove_unused_member_paths()
+    return len(archive_folders), archive_count
+
+
+def query_catalog_database(runtime: Runtime,
+                           source_name: str = None,
+                           method_name: str = None,
+                           tags: Collection[str] = None,
+                           date_min: float = None,
+                           date_max: float = None,
+                           age_min: float = None,
+                           age_max: float = None,
+                           sort: str = None,
+                           ascending: bool = False,
+                           limit: int = None,
+                           ) -> list[CatalogItem]:
+    """
+    Query the global catalog database across all sources.
+
+    :param runtime: Jiig runtime API.
+    :param source_name: optional source name filter
+    :param method_name: optional archive method filter
+    :param tags: optional tags filter (all are required)
+    :param date_min: timestamp based on minimum date
+    :param date_max: timestamp based on maximum date
+    :param age_min: timestamp based on minimum age
+    :param age_max: timestamp based on maximum age
+    :param sort: sort column name, one of SORT_COLUMNS (default: 'time')
+    :param ascending: sort in ascending order if True
+    :param limit: optional maximum number of archives
+    :return: found catalog items
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        abort('The catalog database is disabled.')
+    timestamp_min, timestamp_max = get_catalog_timestamp_range(date_min=date_min,
+                                                               date_max=date_max,
+                                                               age_min=age_min,
+                                                               age_max=age_max)
+    with open_catalog_database(database_path) as database:
+        return [
+            CatalogItem(path=archive.path,
+                        method_name=archive.method_name,
+                        tags=archive.tags,
+                        size=archive.size,
+                        time=archive.time)
+            for archive in database.query(source_name=source_name,
+                                          method_name=method_name,
+                                          tags=tags,
+                                          timestamp_min=timestamp_min,
+                                          timestamp_max=timestamp_max,
+                                          sort=sort,
+                                          ascending=ascending,
+                                          limit=limit)
+        ]
+
+
 def build_catalog_list(archives: list[DiscoveredArchive],
                        source_name: str,
                        timestamp_min: float = None,
@@ -184,61 +469,313 @@ def build_catalog_list(archives: list[DiscoveredArchive],
     :param filter_tag_set: optional required tags
     :return: catalog item list
     """
-    items: list[CatalogItem] = []
-    for archive in archives:
-        if ((archive.source_name == source_name)
-                and (timestamp_min is None or archive.time_stamp >= timestamp_min)
-                and (timestamp_max is None or archive.time_stamp <= timestamp_max)
-                and (filter_tag_set is None or filter_tag_set.issubset(archive.tags))):
+    return CatalogQueryIndex.from_archives(archives, source_name).query(
+        timestamp_min=timestamp_min,
+        timestamp_max=timestamp_max,
+        interval_min=interval_min,
+        interval_max=interval_max,
+        filter_tag_set=filter_tag_set)
+
+
+class CatalogQueryIndex:
+    """
+    In-memory catalog for one source, for repeated queries.
+
+    Items are kept sorted by descending time, so that time ranges are found by
+    binary search. Tag queries start from the posting list of the rarest
+    requested tag, so that query cost grows with the number of matches, rather
+    than with the catalog size.
+    """
+
+    def __init__(self, items: list[CatalogItem]):
+        """
+        Catalog query index constructor.
+
+        :param items: catalog items, in any order
+        """
+        # Stable sort, so that items with equal times keep their order.
+        self.items = sorted(items, key=lambda x: x.time, reverse=True)
+        # Negated times ascend, as required for bisection.
+        self.negative_times = [-item.time for item in self.items]
+        self.tag_sets = [set(item.tags) for item in self.items]
+        # Ascending item positions by tag.
+        self.tag_postings: dict[str, list[int]] = {}
+        for item_idx, item in enumerate(self.items):
+            for tag in item.tags:
+                self.tag_postings.setdefault(tag, []).append(item_idx)
+
+    @classmethod
+    def from_archives(cls,
+                      archives: list[DiscoveredArchive],
+                      source_name: str,
+                      ) -> Self:
+        """
+        Create query index from discovered archives for a source.
+
+        :param archives: discovered archives (file information)
+        :param source_name: source name for identifying related archives
+        :return: query index
+        """
+        parse_archive_names(archives)
+        items: list[CatalogItem] = []
+        for archive in archives:
+            name_data = archive.archive_name_data
+            if name_data.source_name != source_name:
+                continue
+            time_stamp = (name_data.time_stamp if name_data.time_stamp is not None
+                          else archive.file_time)
             items.append(CatalogItem(path=archive.path,
                                      method_name=archive.method_name,
-                                     tags=archive.tags,
-                                     size=archive.file_size,
-                                     time=archive.time_stamp))
-    # Sort by time descending and filter by any interval limits provided.
-    if items:
-        items.sort(key=lambda x: x.time, reverse=True)
-        if interval_min is not None or interval_max is not None:
-            filtered_items: list[CatalogItem] = [items[0]]
-            for item_idx, item in enumerate(items[1:], start=1):
-                delta_time = items[item_idx - 1].time - item.time
-                if ((interval_min is None or delta_time >= interval_min)
-                        and (interval_max is None or delta_time <= interval_max)):
-                    filtered_items.append(item)
-            items = filtered_items
-    return items
+                                     tags=name_data.tags,
+                                     size=archive.known_file_size,
+                                     time=time_stamp,
+                                     archive=archive))
+        return cls(items)
+
+    def query(self,
+              timestamp_min: float = None,
+              timestamp_max: float = None,
+              interval_min: float = None,
+              interval_max: float = None,
+              filter_tag_set: set[str] | None = None,
+              ) -> list[CatalogItem]:
+        """
+        Query catalog items.
+
+        :param timestamp_min: earliest time stamp to accept
+        :param timestamp_max: latest time stamp to accept
+        :param interval_min: minimum seconds between archive saves (ignored if smaller)
+        :param interval_max: maximum seconds between archive saves (ignored if larger)
+        :param filter_tag_set: optional required tags
+        :return: catalog items, sorted by descending time
+        """
+        start_idx = (bisect_left(self.negative_times, -timestamp_max)
+                     if timestamp_max is not None else 0)
+        end_idx = (bisect_right(self.negative_times, -timestamp_min)
+                   if timestamp_min is not None else len(self.items))
+        if filter_tag_set:
+            postings = [self.tag_postings.get(tag, []) for tag in filter_tag_set]
+            rarest_posting = min(postings, key=len)
+            candidate_indexes = rarest_posting[bisect_left(rarest_posting, start_idx):
+                                               bisect_left(rarest_posting, end_idx)]
+            items = [
+                self.items[item_idx]
+                for item_idx in candidate_indexes
+                if len(postings) == 1 or filter_tag_set.issubset(self.tag_sets[item_idx])
+            ]
+        else:
+            items = self.items[start_idx:end_idx]
+        return filter_catalog_intervals(items, interval_min=interval_min, interval_max=interval_max)
+
+
+def filter_catalog_intervals(items: list[CatalogItem],
+                             interval_min: float = None,
+                             interval_max: float = None,
+                             ) -> list[CatalogItem]:
+    """
+    Filter catalog items by the interval from the preceding (newer) item.
+
+    The newest item is always kept.
+
+    :param items: catalog items, sorted by descending time
+    :param interval_min: minimum seconds between archive saves (ignored if smaller)
+    :param interval_max: maximum seconds between archive saves (ignored if larger)
+    :return: filtered catalog items
+    """
+    if not items or (interval_min is None and interval_max is None):
+        return items
+    filtered_items: list[CatalogItem] = [items[0]]
+    for item_idx, item in enumerate(items[1:], start=1):
+        delta_time = items[item_idx - 1].time - item.time
+        if ((interval_min is None or delta_time >= interval_min)
+                and (interval_max is None or delta_time <= interval_max)):
+            filtered_items.append(item)
+    return filtered_items
+
+
+def sort_catalog_items(items: list[CatalogItem],
+                       sort: str = None,
+                       ascending: bool = False,
+                       ) -> list[CatalogItem]:
+    """
+    Sort catalog items.
+
+    :param items: catalog items, sorted by descending time
+    :param sort: sort key name, one of CATALOG_SORT_KEYS (default: 'time')
+    :param ascending: sort in ascending order if True
+    :return: sorted catalog items
+    """
+    if sort is None:
+        sort = 'time'
+    if sort == 'time':
+        # Already sorted by descending time.
+        if ascending:
+            items = list(reversed(items))
+        return items
+    return sorted(items, key=CATALOG_SORT_KEYS[sort], reverse=not ascending)
+
+
+def paginate_catalog_items(items: Iterable[CatalogItem],
+                           offset: int = None,
+                           limit: int = None,
+                           ) -> Iterator[CatalogItem]:
+    """
+    Select a page of catalog items.
+
+    :param items: catalog items
+    :param offset: optional number of items to skip
+    :param limit: optional maximum number of items
+    :return: catalog item iterator
+    """
+    start = offset or 0
+    stop = start + limit if limit is not None else None
+    return islice(items, start, stop)
+
+
+def format_catalog(items: Iterable[CatalogItem],
+                   output_format: str = None,
+                   unit_format: str = 'b',
+                   flagged_names: Iterable[str] = None,
+                   flag_text: str = None,
+                   ) -> Iterator[str]:
+    """
+    Format catalog items in any supported output format.
+
+    :param items: catalog items
+    :param output_format: one of CATALOG_FORMATS (default: 'table')
+    :param unit_format: table size units, 'b' for KiB/MiB/... or 'd' for KB/MB/...
+    :param flagged_names: optional table display names to flag
+    :param flag_text: optional table flag text (default: '*')
+    :return: text line iterator
+    """
+    if output_format is None or output_format == 'table':
+        return format_catalog_table(items,
+                                    unit_format=unit_format,
+                                    flagged_names=flagged_names,
+                                    flag_text=flag_text)
+    if output_format == 'json':
+        return format_catalog_json(items)
+    if output_format == 'ndjson':
+        return format_catalog_ndjson(items)
+    if output_format == 'csv':
+        return format_catalog_csv(items)
+    raise ValueError(f'Bad catalog output format "{output_format}".')
 
 
 def format_catalog_table(items: Iterable[CatalogItem],
                          unit_format: str = 'b',
                          flagged_names: Iterable[str] = None,
                          flag_text: str = None,
+                         flag_texts: dict[str, str] = None,
                          ) -> Iterator[str]:
     """
     Format catalog item table for listing.
 
+    Lines are produced as items arrive. Column widths are based on a bounded
+    number of leading items, and wider values in later items overflow.
+
     :param items: catalog items
     :param unit_format: 'b' for KiB/MiB/... or 'd' for KB/MB/... (default: 'b')
     :param flagged_names: optional display names to flag (default: no flagged items)
     :param flag_text: optional flag text (default: '*')
+    :param flag_texts: optional flag texts by display name, e.g. for differing flags
     :return: text line iterator
     """
     if flag_text is None:
         flag_text = '*'
-    headers = ['date/time', 'method', 'tags', 'size', 'archive name']
-    item_list = list(items)
-    rows = [
-        (
-            item.time_string,
-            item.method_name,
-            ','.join(item.tags),
-            format_file_size(item.size, unit_format=unit_format),
-            item.display_name,
-        )
-        for item in items
+    all_flag_texts = {name: flag_text for name in flagged_names} if flagged_names else {}
+    if flag_texts:
+        all_flag_texts.update(flag_texts)
+    headers = ('date/time', 'method', 'tags', 'size', 'archive name')
+    item_iterator = iter(items)
+    sample_rows = [
+        _get_table_row(item, unit_format)
+        for item in islice(item_iterator, TABLE_WIDTH_SAMPLE_SIZE)
     ]
-    for idx, line in enumerate(format_table(*rows, headers=headers)):
-        # Account for 2 heading lines.
-        if idx >= 2 and flagged_names and item_list[idx-2].display_name in flagged_names:
-            line += f'  {flag_text}'
+    widths = [len(header) for header in headers]
+    for row in sample_rows:
+        for column_idx, cell in enumerate(row):
+            widths[column_idx] = max(widths[column_idx], len(cell))
+    yield _format_table_line(headers, widths)
+    yield _format_table_line(['-' * width for width in widths], widths)
+    for row in chain(sample_rows,
+                     (_get_table_row(item, unit_format) for item in item_iterator)):
+        line = _format_table_line(row, widths)
+        row_flag_text = all_flag_texts.get(row[-1])
+        if row_flag_text is not None:
+            line += f'  {row_flag_text}'
         yield line
+
+
+def format_catalog_json(items: Iterable[CatalogItem]) -> Iterator[str]:
+    """
+    Format catalog items as a JSON array, one item per line.
+
+    :param items: catalog items
+    :return: text line iterator
+    """
+    yield '['
+    previous_line: str | None = None
+    for item in items:
+        if previous_line is not None:
+            yield f'{previous_line},'
+        previous_line = f'  {json.dumps(item.get_data())}'
+    if previous_line is not None:
+        yield previous_line
+    yield ']'
+
+
+def format_catalog_ndjson(items: Iterable[CatalogItem]) -> Iterator[str]:
+    """
+    Format catalog items as newline-delimited JSON.
+
+    :param items: catalog items
+    :return: text line iterator
+    """
+    for item in items:
+        yield json.dumps(item.get_data())
+
+
+def format_catalog_csv(items: Iterable[CatalogItem]) -> Iterator[str]:
+    """
+    Format catalog items as CSV with a header row.
+
+    :param items: catalog items
+    :return: text line iterator
+    """
+    # The csv writer returns whatever the stream write() call returns.
+    writer = csv.writer(_CSVLineStream(), lineterminator='')
+    yield writer.writerow(CATALOG_FIELD_NAMES)
+    for item in items:
+        item_data = item.get_data()
+        item_data['tags'] = ','.join(item_data['tags'])
+        yield writer.writerow([item_data[field_name] for field_name in CATALOG_FIELD_NAMES])
+
+
+class _CSVLineStream:
+
+    @staticmethod
+    def write(line: str) -> str:
+        return line
+
+
+def _get_table_row(item: CatalogItem, unit_format: str) -> tuple[str, str, str, str, str]:
+    return (
+        item.time_string,
+        item.method_name,
+        ','.join(item.tags),
+        format_file_size(item.get_size(), unit_format=unit_format),
+        item.display_name,
+    )
+
+
+def _format_table_line(cells: Sequence[str], widths: Sequence[int]) -> str:
+    # Left-justify text, except for the right-justified size column, and
+    # leave the last column unpadded.
+    return '  '.join([
+        cells[0].ljust(widths[0]),
+        cells[1].ljust(widths[1]),
+        cells[2].ljust(widths[2]),
+        cells[3].rjust(widths[3]),
+        cells[4],
+    ])
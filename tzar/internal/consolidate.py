@@ -0,0 +1,230 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive consolidation.
+
+Merges a chain of archives, e.g. a full save followed by saves of pending
+changes, into one new full tarball. Archives are read newest first, as member
+streams, and only the first, i.e. newest, version of each path is written.
+Nothing is extracted to disk.
+
+Tzar archives do not record deleted files, so files deleted after an older
+archive was saved are still carried forward from that archive.
+"""
+
+import os
+import subprocess
+import tarfile
+from pathlib import Path
+from typing import TextIO
+from tempfile import NamedTemporaryFile
+from time import (
+    localtime,
+    strftime,
+)
+
+from jiig import Runtime
+from jiig.util.filesystem import (
+    choose_program_alternative,
+    short_path,
+)
+from jiig.util.log import abort
+
+from .archive import (
+    METHOD_MAP,
+    PARTIAL_FOLDER_NAME,
+    CatalogSpec,
+    DiscoveredArchive,
+    get_delta_base_names,
+    get_timestamp_matcher,
+)
+from .catalog import CatalogItem
+from .database import record_archive_changes
+from .delta import read_delta_manifest
+from .index import (
+    CatalogIndexEntry,
+    changing_archive_folder,
+    updating_catalog_index,
+)
+from .metadata import get_metadata_folder
+from .methods.members import (
+    discard_member_sidecar,
+    normalize_member_path,
+    open_member_sidecar,
+    publish_member_sidecar,
+    write_member,
+)
+from .trash import (
+    empty_trash,
+    move_to_trash,
+)
+
+DEFAULT_CONSOLIDATED_TAG = 'full'
+
+
+def can_consolidate_to(method_name: str) -> bool:
+    """
+    Check if consolidated archives can be saved using a method.
+
+    :param method_name: archive method name
+    :return: True for single-file tarball methods
+    """
+    method_cls = METHOD_MAP.get(method_name)
+    return method_cls is not None and not method_cls.folder and bool(method_cls.compressors)
+
+
+def merge_archive_members(items: list[CatalogItem],
+                          output_tar: tarfile.TarFile,
+                          members_file: TextIO = None,
+                          ) -> int:
+    """
+    Write the newest version of each member of archives to an output tarball.
+
+    :param items: catalog items for archives to merge, newest first
+    :param output_tar: output tarball
+    :param members_file: optional member list sidecar stream
+    :return: number of members written
+    """
+    seen_names: set[str] = set()
+    for item in items:
+        for info, member_file in METHOD_MAP[item.method_name].handle_read(item.path):
+            name = normalize_member_path(info.name)
+            if name in seen_names or name == '.':
+                continue
+            seen_names.add(name)
+            info.name = name
+            output_tar.addfile(info, member_file)
+            if members_file is not None:
+                write_member(members_file, name, info.mtime, info.size if not info.isdir() else None)
+    return len(seen_names)
+
+
+def get_consolidated_path(runtime: Runtime,
+                          catalog_spec: CatalogSpec,
+                          items: list[CatalogItem],
+                          method_name: str,
+                          tags: list[str] = None,
+                          ) -> Path:
+    """
+    Get consolidated archive path, using the newest archive's time stamp.
+
+    :param runtime: Jiig runtime API.
+    :param catalog_spec: source folder, archive folder, and source name
+    :param items: catalog items for archives to merge, newest first
+    :param method_name: consolidated archive method name
+    :param tags: consolidated archive tags (default: DEFAULT_CONSOLIDATED_TAG)
+    :return: consolidated archive path
+    """
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    name_parts = [catalog_spec.source_name, strftime(timestamp_format, localtime(items[0].time))]
+    name_parts.extend(tags or [DEFAULT_CONSOLIDATED_TAG])
+    return catalog_spec.archive_folder / f'{"_".join(name_parts)}{METHOD_MAP[method_name].extension}'
+
+
+def consolidate_archives(runtime: Runtime,
+                         catalog_spec: CatalogSpec,
+                         items: list[CatalogItem],
+                         method_name: str,
+                         tags: list[str] = None,
+                         replace: bool = False,
+                         ) -> Path:
+    """
+    Merge archives into one new full archive.
+
+    :param runtime: Jiig runtime API.
+    :param catalog_spec: source folder, archive folder, and source name
+    :param items: catalog items for archives to merge, newest first
+    :param method_name: consolidated archive method name
+    :param tags: consolidated archive tags (default: DEFAULT_CONSOLIDATED_TAG)
+    :param replace: delete the merged archives if True
+    :return: consolidated archive path
+    """
+    archive_folder = catalog_spec.archive_folder
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    archive_path = get_consolidated_path(runtime, catalog_spec, items, method_name, tags)
+    if os.path.lexists(archive_path):
+        abort('Consolidated archive already exists.', archive_path)
+    # Files saved as deltas are not in the archives themselves.
+    delta_paths = [item.path for item in items if read_delta_manifest(item.path) is not None]
+    if delta_paths:
+        abort('Archives with deltas can not be consolidated.', *delta_paths)
+    if replace:
+        # Newer archives' deltas may be based on the replaced archives.
+        delta_base_names = get_delta_base_names(archive_folder,
+                                                [item.path.name for item in items])
+        base_paths = [item.path for item in items if item.path.name in delta_base_names]
+        if base_paths:
+            abort('Archives that other archives have deltas based on can not be replaced.',
+                  *base_paths)
+    # Alternatives with arguments are lists, and must not be converted to strings.
+    compressor_arguments = choose_program_alternative(*METHOD_MAP[method_name].compressors,
+                                                      required=True)
+    runtime.message(f'Consolidating {len(items)} archives: {short_path(archive_path)}')
+    members_file = open_member_sidecar(archive_folder)
+    # Writing elsewhere leaves the archive folder, and its catalog index, unchanged
+    # until the consolidated archive is published.
+    partial_folder = get_metadata_folder(archive_folder, PARTIAL_FOLDER_NAME)
+    partial_folder.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(prefix='.tzar_', suffix='.tmp', dir=partial_folder) as temp_file:
+        compress_process = subprocess.Popen(compressor_arguments,
+                                            stdin=subprocess.PIPE,
+                                            stdout=temp_file)
+        try:
+            with tarfile.open(fileobj=compress_process.stdin, mode='w|') as output_tar:
+                member_count = merge_archive_members(items, output_tar, members_file)
+        except (OSError, tarfile.TarError) as exc:
+            compress_process.kill()
+            compress_process.wait()
+            discard_member_sidecar(members_file)
+            abort('Failed to consolidate archives.', exc)
+        finally:
+            try:
+                compress_process.stdin.close()
+            except BrokenPipeError:
+                pass
+        if compress_process.wait() != 0:
+            discard_member_sidecar(members_file)
+            abort('Compression command failed.', ' '.join(compressor_arguments))
+        os.fsync(temp_file.fileno())
+        with updating_catalog_index(archive_folder, timestamp_format) as catalog_index:
+            # Linking fails, rather than replacing, if the name was taken meanwhile.
+            with changing_archive_folder(catalog_index):
+                os.link(temp_file.name, archive_path)
+            publish_member_sidecar(members_file, archive_path)
+            saved_entries: list[CatalogIndexEntry] = []
+            saved_archive = DiscoveredArchive.get(archive_path,
+                                                  get_timestamp_matcher(timestamp_format))
+            if saved_archive is not None:
+                saved_entry = saved_archive.get_index_entry(with_size=True)
+                saved_entries.append(saved_entry)
+                if catalog_index is not None:
+                    catalog_index.entries[saved_entry.name] = saved_entry
+            removed_paths: list[Path] = []
+            if replace:
+                for item in items:
+                    runtime.message(f'Deleting: {item.display_name}')
+                    with changing_archive_folder(catalog_index):
+                        move_to_trash(item.path)
+                    removed_paths.append(item.path)
+                    if catalog_index is not None:
+                        catalog_index.entries.pop(item.path.name, None)
+    runtime.message(f'Consolidated {member_count} members.')
+    record_archive_changes(runtime, archive_folder, saved_entries, removed_paths)
+    if removed_paths:
+        empty_trash(archive_folder)
+    return archive_path
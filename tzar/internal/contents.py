@@ -0,0 +1,136 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Cross-archive content index.
+
+Member lists of archives are indexed in the global catalog database, so that
+files can be found across all archives without listing them one at a time.
+Archives are indexed on demand, from member list sidecars when available, and
+are indexed again when their size or modification time changes.
+"""
+
+import os
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from jiig import Runtime
+from jiig.util.log import (
+    abort,
+    log_message,
+    log_warning,
+)
+
+from .archive import METHOD_MAP
+from .database import (
+    get_catalog_database_path,
+    open_catalog_database,
+)
+from .methods.members import normalize_member_path
+
+
+@dataclass
+class MemberVersion:
+    """Archived version of a file."""
+    path: str
+    archive_path: Path
+    source_name: str
+    archive_time: float
+    size: int | None
+    time: float
+    # True if it is the first version found, or it differs from the previous one.
+    changed: bool
+
+
+def index_archive_contents(runtime: Runtime,
+                           source_name: str = None,
+                           verbose: bool = False,
+                           ) -> int:
+    """
+    Index contents of archives that are not indexed or are out of date.
+
+    Each archive is committed separately, so that an interrupted run keeps
+    its progress.
+
+    :param runtime: Jiig runtime API.
+    :param source_name: optional source name filter
+    :param verbose: report each indexed archive if True
+    :return: number of indexed archives
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        abort('The catalog database is disabled.')
+    indexed_count = 0
+    with open_catalog_database(database_path) as database:
+        for archive in database.query_unindexed(source_name=source_name):
+            method_cls = METHOD_MAP.get(archive.method_name)
+            if method_cls is None or not os.path.lexists(archive.path):
+                continue
+            if verbose:
+                log_message(f'Indexing contents: {archive.path}')
+            try:
+                members = [
+                    (normalize_member_path(item.path), item.size, item.time)
+                    for item in method_cls().handle_list(archive.path)
+                ]
+            except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as exc:
+                log_warning('Failed to list archive.', archive.path, exc)
+                continue
+            database.set_archive_members(archive.path, members)
+            database.connection.commit()
+            indexed_count += 1
+    return indexed_count
+
+
+def find_member_versions(runtime: Runtime,
+                         pattern: str,
+                         source_name: str = None,
+                         changes_only: bool = False,
+                         ) -> list[MemberVersion]:
+    """
+    Find archived versions of files across all archives.
+
+    :param runtime: Jiig runtime API.
+    :param pattern: member path or glob pattern, a path also matches members
+                    below it
+    :param source_name: optional source name filter
+    :param changes_only: only include versions that differ from the previous one
+    :return: versions ordered by path and archive time
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        abort('The catalog database is disabled.')
+    with open_catalog_database(database_path) as database:
+        members = database.find_members(normalize_member_path(pattern),
+                                        source_name=source_name)
+    versions: list[MemberVersion] = []
+    previous_key: tuple | None = None
+    for member in members:
+        key = (member.path, member.source_name, member.size, int(member.time))
+        version = MemberVersion(path=member.path,
+                                archive_path=member.archive_path,
+                                source_name=member.source_name,
+                                archive_time=member.archive_time,
+                                size=member.size,
+                                time=member.time,
+                                changed=key != previous_key)
+        previous_key = key
+        if version.changed or not changes_only:
+            versions.append(version)
+    return versions
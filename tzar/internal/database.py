@@ -0,0 +1,463 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Global SQLite catalog database.
+
+The database records archives from all archive folders in order to support
+queries across sources. It is kept up to date by save and prune, and can be
+rebuilt from the archive folders by reindexing.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Collection,
+    Iterable,
+    Iterator,
+)
+
+from jiig import Runtime
+from jiig.util.log import log_warning
+
+from .index import CatalogIndexEntry
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    archive_folder TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    method TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    time REAL NOT NULL,
+    file_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archive_tags (
+    tag TEXT NOT NULL,
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, archive_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS member_paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS archive_contents (
+    archive_id INTEGER PRIMARY KEY REFERENCES archives(id) ON DELETE CASCADE,
+    size INTEGER NOT NULL,
+    file_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archive_members (
+    path_id INTEGER NOT NULL REFERENCES member_paths(id),
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    size INTEGER,
+    time REAL NOT NULL,
+    PRIMARY KEY (path_id, archive_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS archives_source ON archives(source_name, time);
+CREATE INDEX IF NOT EXISTS archives_time ON archives(time);
+CREATE INDEX IF NOT EXISTS archives_method ON archives(method, time);
+CREATE INDEX IF NOT EXISTS archives_size ON archives(size);
+CREATE INDEX IF NOT EXISTS archives_folder ON archives(archive_folder);
+CREATE INDEX IF NOT EXISTS archive_tags_archive ON archive_tags(archive_id);
+CREATE INDEX IF NOT EXISTS archive_members_archive ON archive_members(archive_id);
+'''
+
+SORT_COLUMNS = {
+    'time': 'time',
+    'size': 'size',
+    'source': 'source_name',
+    'method': 'method',
+}
+
+
+@dataclass
+class DatabaseArchive:
+    """Archive data retrieved from the catalog database."""
+    path: Path
+    source_name: str
+    method_name: str
+    size: int
+    time: float
+    tags: list[str]
+
+
+@dataclass
+class DatabaseMember:
+    """Archive member data retrieved from the catalog database."""
+    path: str
+    archive_path: Path
+    source_name: str
+    archive_time: float
+    size: int | None
+    time: float
+
+
+class CatalogDatabase:
+    """Global catalog database connection."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        """
+        Catalog database constructor.
+
+        :param connection: open SQLite connection
+        """
+        self.connection = connection
+
+    def add_archive(self,
+                    archive_folder: Path,
+                    entry: CatalogIndexEntry,
+                    ):
+        """
+        Add or replace archive.
+
+        :param archive_folder: archive folder path
+        :param entry: archive data
+        """
+        path = str(archive_folder / entry.name)
+        time = entry.time_stamp if entry.time_stamp is not None else entry.file_time
+        self.connection.execute(
+            'INSERT INTO archives'
+            ' (path, archive_folder, source_name, method, size, time, file_time)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT(path) DO UPDATE SET'
+            ' source_name=excluded.source_name, method=excluded.method,'
+            ' size=excluded.size, time=excluded.time, file_time=excluded.file_time',
+            (path, str(archive_folder), entry.source_name, entry.method_name,
+             entry.size, time, entry.file_time))
+        archive_id = self.connection.execute(
+            'SELECT id FROM archives WHERE path = ?', (path,)).fetchone()[0]
+        self.connection.execute('DELETE FROM archive_tags WHERE archive_id = ?', (archive_id,))
+        self.connection.executemany(
+            'INSERT INTO archive_tags (tag, archive_id) VALUES (?, ?)',
+            [(tag, archive_id) for tag in entry.tags])
+
+    def remove_archive(self, archive_path: Path):
+        """
+        Remove archive.
+
+        :param archive_path: archive file or folder path
+        """
+        self.connection.execute('DELETE FROM archives WHERE path = ?', (str(archive_path),))
+
+    def replace_folder(self,
+                       archive_folder: Path,
+                       entries: Iterable[CatalogIndexEntry],
+                       ):
+        """
+        Replace all archives for an archive folder.
+
+        :param archive_folder: archive folder path
+        :param entries: archive data
+        """
+        # Archives that remain are updated in place, keeping their indexed contents.
+        entries = list(entries)
+        keep_paths = set(str(archive_folder / entry.name) for entry in entries)
+        for (path,) in self.connection.execute(
+                'SELECT path FROM archives WHERE archive_folder = ?',
+                (str(archive_folder),)).fetchall():
+            if path not in keep_paths:
+                self.connection.execute('DELETE FROM archives WHERE path = ?', (path,))
+        for entry in entries:
+            self.add_archive(archive_folder, entry)
+
+    def remove_folders_except(self, archive_folders: Collection[Path]):
+        """
+        Remove archives from folders that are not in a collection.
+
+        :param archive_folders: archive folders to keep
+        """
+        keep_folders = set(str(archive_folder) for archive_folder in archive_folders)
+        for (archive_folder,) in self.connection.execute(
+                'SELECT DISTINCT archive_folder FROM archives').fetchall():
+            if archive_folder not in keep_folders:
+                self.connection.execute('DELETE FROM archives WHERE archive_folder = ?',
+                                        (archive_folder,))
+
+    def query_unindexed(self, source_name: str = None) -> list[DatabaseArchive]:
+        """
+        Query archives with missing or outdated indexed contents.
+
+        :param source_name: optional source name filter
+        :return: archives, oldest first
+        """
+        sql = ('SELECT a.path, a.source_name, a.method, a.size, a.time FROM archives a'
+               ' LEFT JOIN archive_contents c ON c.archive_id = a.id'
+               ' WHERE (c.archive_id IS NULL OR c.size != a.size OR c.file_time != a.file_time)')
+        arguments: list = []
+        if source_name is not None:
+            sql += ' AND a.source_name = ?'
+            arguments.append(source_name)
+        sql += ' ORDER BY a.time'
+        return [
+            DatabaseArchive(path=Path(path),
+                            source_name=row_source_name,
+                            method_name=row_method_name,
+                            size=size,
+                            time=time,
+                            tags=[])
+            for path, row_source_name, row_method_name, size, time
+            in self.connection.execute(sql, arguments)
+        ]
+
+    def set_archive_members(self,
+                            archive_path: Path,
+                            members: Iterable[tuple[str, int | None, float]],
+                            ):
+        """
+        Replace the indexed contents of an archive.
+
+        :param archive_path: archive file or folder path
+        :param members: (member path, size or None for folders, time) tuples
+        """
+        row = self.connection.execute('SELECT id, size, file_time FROM archives WHERE path = ?',
+                                      (str(archive_path),)).fetchone()
+        if row is None:
+            return
+        archive_id, size, file_time = row
+        members = list(members)
+        self.connection.execute('DELETE FROM archive_members WHERE archive_id = ?',
+                                (archive_id,))
+        # Paths are shared by all archives that contain them.
+        self.connection.executemany('INSERT OR IGNORE INTO member_paths (path) VALUES (?)',
+                                    [(member[0],) for member in members])
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO archive_members (path_id, archive_id, size, time)'
+            ' SELECT id, ?, ?, ? FROM member_paths WHERE path = ?',
+            [(archive_id, member_size, member_time, member_path)
+             for member_path, member_size, member_time in members])
+        self.connection.execute(
+            'INSERT OR REPLACE INTO archive_contents (archive_id, size, file_time)'
+            ' VALUES (?, ?, ?)',
+            (archive_id, size, file_time))
+
+    def find_members(self,
+                     pattern: str,
+                     source_name: str = None,
+                     ) -> list[DatabaseMember]:
+        """
+        Find archive members by path.
+
+        :param pattern: member path or glob pattern, a path also matches
+                        members below it
+        :param source_name: optional source name filter
+        :return: members ordered by path, source name, and archive time
+        """
+        if any(glob_character in pattern for glob_character in '*?['):
+            conditions = ['p.path GLOB ?']
+            arguments: list = [pattern]
+        else:
+            # '0' follows '/', so the range covers paths below the folder.
+            conditions = ['(p.path = ? OR (p.path > ? AND p.path < ?))']
+            arguments = [pattern, f'{pattern}/', f'{pattern}0']
+        if source_name is not None:
+            conditions.append('a.source_name = ?')
+            arguments.append(source_name)
+        sql = ('SELECT p.path, a.path, a.source_name, a.time, m.size, m.time'
+               ' FROM member_paths p'
+               ' JOIN archive_members m ON m.path_id = p.id'
+               ' JOIN archives a ON a.id = m.archive_id'
+               ' WHERE ' + ' AND '.join(conditions)
+               + ' ORDER BY p.path, a.source_name, a.time')
+        return [
+            DatabaseMember(path=path,
+                           archive_path=Path(archive_path),
+                           source_name=row_source_name,
+                           archive_time=archive_time,
+                           size=size,
+                           time=time)
+            for path, archive_path, row_source_name, archive_time, size, time
+            in self.connection.execute(sql, arguments)
+        ]
+
+    def remove_unused_member_paths(self):
+        """Remove member paths that are no longer in any indexed archive."""
+        self.connection.execute(
+            'DELETE FROM member_paths WHERE id NOT IN (SELECT path_id FROM archive_members)')
+
+    def query(self,
+              source_name: str = None,
+              method_name: str = None,
+              tags: Collection[str] = None,
+              timestamp_min: float = None,
+              timestamp_max: float = None,
+              sort: str = None,
+              ascending: bool = False,
+              limit: int = None,
+              ) -> list[DatabaseArchive]:
+        """
+        Query archives across all sources.
+
+        :param source_name: optional source name filter
+        :param method_name: optional archive method filter
+        :param tags: optional tags filter (all are required)
+        :param timestamp_min: optional earliest time stamp
+        :param timestamp_max: optional latest time stamp
+        :param sort: sort column name, one of SORT_COLUMNS (default: 'time')
+        :param ascending: sort in ascending order if True
+        :param limit: optional maximum number of archives
+        :return: archives
+        """
+        conditions: list[str] = []
+        arguments: list = []
+        if source_name is not None:
+            conditions.append('source_name = ?')
+            arguments.append(source_name)
+        if method_name is not None:
+            conditions.append('method = ?')
+            arguments.append(method_name)
+        if timestamp_min is not None:
+            conditions.append('time >= ?')
+            arguments.append(timestamp_min)
+        if timestamp_max is not None:
+            conditions.append('time <= ?')
+            arguments.append(timestamp_max)
+        for tag in set(tags or []):
+            conditions.append('id IN (SELECT archive_id FROM archive_tags WHERE tag = ?)')
+            arguments.append(tag)
+        sql = 'SELECT id, path, source_name, method, size, time FROM archives'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {SORT_COLUMNS[sort or "time"]} {"ASC" if ascending else "DESC"}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            arguments.append(limit)
+        rows = self.connection.execute(sql, arguments).fetchall()
+        tags_by_id: dict[int, list[str]] = {row[0]: [] for row in rows}
+        if rows:
+            placeholders = ','.join('?' * len(tags_by_id))
+            for archive_id, tag in self.connection.execute(
+                    f'SELECT archive_id, tag FROM archive_tags'
+                    f' WHERE archive_id IN ({placeholders}) ORDER BY tag',
+                    list(tags_by_id.keys())):
+                tags_by_id[archive_id].append(tag)
+        return [
+            DatabaseArchive(path=Path(path),
+                            source_name=row_source_name,
+                            method_name=row_method_name,
+                            size=size,
+                            time=time,
+                            tags=tags_by_id[archive_id])
+            for archive_id, path, row_source_name, row_method_name, size, time in rows
+        ]
+
+
+@contextmanager
+def open_catalog_database(database_path: Path) -> Iterator[CatalogDatabase]:
+    """
+    Open catalog database, creating it as needed.
+
+    Changes are committed if the block exits normally.
+
+    :param database_path: database file path
+    :return: catalog database
+    """
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(database_path)
+    try:
+        connection.execute('PRAGMA foreign_keys = ON')
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.executescript(SCHEMA)
+        with connection:
+            yield CatalogDatabase(connection)
+    finally:
+        connection.close()
+
+
+def get_catalog_database_path(runtime: Runtime) -> Path | None:
+    """
+    Get catalog database path.
+
+    :param runtime: Jiig runtime API.
+    :return: database path or None if the database is disabled
+    """
+    database_path = runtime.get_param('catalog_database')
+    if not database_path:
+        return None
+    return Path(str(database_path)).expanduser()
+
+
+def record_saved_archive(runtime: Runtime,
+                         archive_folder: Path,
+                         entry: CatalogIndexEntry,
+                         ):
+    """
+    Record saved archive in the catalog database.
+
+    Database failures are reported as warnings, since the database can be
+    rebuilt by reindexing.
+
+    :param runtime: Jiig runtime API.
+    :param archive_folder: archive folder path
+    :param entry: archive data
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        return
+    try:
+        with open_catalog_database(database_path) as database:
+            database.add_archive(archive_folder, entry)
+    except (OSError, sqlite3.Error) as exc:
+        log_warning('Failed to record archive in catalog database.', exc)
+
+
+def record_deleted_archives(runtime: Runtime,
+                            archive_paths: Iterable[Path],
+                            ):
+    """
+    Remove deleted archives from the catalog database.
+
+    :param runtime: Jiig runtime API.
+    :param archive_paths: deleted archive file or folder paths
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        return
+    try:
+        with open_catalog_database(database_path) as database:
+            for archive_path in archive_paths:
+                database.remove_archive(archive_path)
+    except (OSError, sqlite3.Error) as exc:
+        log_warning('Failed to remove archives from catalog database.', exc)
+
+
+def record_archive_changes(runtime: Runtime,
+                           archive_folder: Path,
+                           entries: Iterable[CatalogIndexEntry],
+                           removed_archive_paths: Iterable[Path],
+                           ):
+    """
+    Record added, changed, and removed archives in one database transaction.
+
+    :param runtime: Jiig runtime API.
+    :param archive_folder: archive folder path
+    :param entries: added or changed archive data
+    :param removed_archive_paths: removed archive file or folder paths
+    """
+    database_path = get_catalog_database_path(runtime)
+    if database_path is None:
+        return
+    try:
+        with open_catalog_database(database_path) as database:
+            for entry in entries:
+                database.add_archive(archive_folder, entry)
+            for archive_path in removed_archive_paths:
+                database.remove_archive(archive_path)
+    except (OSError, sqlite3.Error) as exc:
+        log_warning('Failed to record archive changes in catalog database.', exc)
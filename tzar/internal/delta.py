@@ -0,0 +1,337 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Delta saves for large, slowly changing files.
+
+Large files, e.g. database dumps and disk images, can be saved as binary
+deltas against the version in an earlier archive, rather than in full. Deltas
+are created by rdiff (librsync), using rsync-style rolling checksums, from a
+signature of the earlier version, so the earlier archive is not read.
+
+Per source, the signatures folder holds one signature for the newest saved
+version of each large file, and a state file that records the archive holding
+that version. Each archive with deltas has a deltas sidecar folder holding the
+delta files, and a manifest that maps paths to base archive names, deltas,
+sizes, and times. Archive listings include the manifest's files.
+Files unchanged since the base archive have no delta, and are not read.
+
+Rebuilding a file starts with the full version in the oldest archive of the
+chain, and applies the deltas in order. Chains are limited in length, after
+which the file is saved in full again. Deleting an archive that a newer
+archive's deltas are based on makes the newer versions impossible to rebuild.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from jiig.util.filesystem import choose_program_alternative
+from jiig.util.log import log_warning
+
+from .metadata import get_metadata_folder
+
+DELTAS_FOLDER_NAME = 'deltas'
+SIGNATURES_FOLDER_NAME = 'signatures'
+DELTA_MANIFEST_NAME = 'manifest.json'
+DELTA_STATE_NAME = 'state.json'
+DELTA_SUFFIX = '.rdelta'
+SIGNATURE_SUFFIX = '.sig'
+DELTA_VERSION = 1
+DEFAULT_DELTA_CHAIN_LIMIT = 8
+
+
+def get_delta_sidecar_path(archive_path: Path) -> Path:
+    """
+    Get deltas sidecar folder path for an archive.
+
+    :param archive_path: archive file or folder path
+    :return: sidecar folder path
+    """
+    return get_metadata_folder(archive_path.parent, DELTAS_FOLDER_NAME) / archive_path.name
+
+
+def delete_delta_sidecar(archive_path: Path):
+    """
+    Delete deltas sidecar folder, if present.
+
+    :param archive_path: archive file or folder path
+    """
+    shutil.rmtree(get_delta_sidecar_path(archive_path), ignore_errors=True)
+
+
+def rename_delta_sidecar(archive_path: Path, new_archive_path: Path):
+    """
+    Move deltas sidecar folder, if present, e.g. for a recompressed archive.
+
+    Manifests of newer archives still name the old archive as their base.
+
+    :param archive_path: old archive file or folder path
+    :param new_archive_path: new archive file or folder path
+    """
+    try:
+        os.rename(get_delta_sidecar_path(archive_path), get_delta_sidecar_path(new_archive_path))
+    except FileNotFoundError:
+        pass
+
+
+def read_delta_manifest(archive_path: Path) -> dict[str, dict] | None:
+    """
+    Read the delta manifest of an archive.
+
+    :param archive_path: archive file or folder path
+    :return: manifest entries by member path or None if the archive has no deltas
+    """
+    data = _read_json(get_delta_sidecar_path(archive_path) / DELTA_MANIFEST_NAME)
+    return data.get('files', {}) if data is not None else None
+
+
+def list_delta_archive_names(archive_folder: Path) -> list[str]:
+    """
+    Get names of archives with deltas sidecars.
+
+    :param archive_folder: archive folder path
+    :return: archive names
+    """
+    try:
+        with os.scandir(get_metadata_folder(archive_folder, DELTAS_FOLDER_NAME)) as dir_entries:
+            # Hidden folders hold deltas for saves that are in progress.
+            return [dir_entry.name for dir_entry in dir_entries
+                    if not dir_entry.name.startswith('.') and dir_entry.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def get_delta_program() -> list[str]:
+    """
+    Get the delta program command arguments.
+
+    :return: rdiff command arguments
+    """
+    return choose_program_alternative('rdiff', required=True)
+
+
+def apply_delta(base_path: Path, delta_path: Path, output_path: Path):
+    """
+    Rebuild a file from its base version and a delta.
+
+    :param base_path: base version file path
+    :param delta_path: delta file path
+    :param output_path: output file path
+    :raise OSError: if the delta can't be applied
+    """
+    _run_delta_program('patch', str(base_path), str(delta_path), str(output_path))
+
+
+class DeltaSave:
+    """Delta save of large files for one archive."""
+
+    def __init__(self,
+                 archive_folder: Path,
+                 source_name: str,
+                 min_size: int,
+                 chain_limit: int = None,
+                 ):
+        """
+        Delta save constructor.
+
+        :param archive_folder: archive folder path
+        :param source_name: source name
+        :param min_size: minimum file size to save as a delta
+        :param chain_limit: maximum deltas in a row before a file is saved in
+                            full again (default: DEFAULT_DELTA_CHAIN_LIMIT)
+        """
+        self.archive_folder = archive_folder
+        self.min_size = min_size
+        self.chain_limit = chain_limit or DEFAULT_DELTA_CHAIN_LIMIT
+        self.signatures_folder = (get_metadata_folder(archive_folder, SIGNATURES_FOLDER_NAME)
+                                  / source_name)
+        state_data = _read_json(self.signatures_folder / DELTA_STATE_NAME)
+        self.state: dict[str, dict] = state_data.get('files', {}) if state_data else {}
+        self.delta_files: dict[str, tuple[os.stat_result, dict]] = {}
+        self.full_files: dict[str, os.stat_result] = {}
+        self.archive_path: Path | None = None
+        self.partial_folder: Path | None = None
+        self.new_state: dict[str, dict] = {}
+        self.manifest: dict[str, dict] = {}
+
+    def add_file(self, path: str, file_stat: os.stat_result) -> bool:
+        """
+        Check a source file, and select it for a delta if possible.
+
+        :param path: source file path, relative to the source folder
+        :param file_stat: source file status
+        :return: True if the file is saved as a delta, instead of in the archive
+        """
+        if file_stat.st_size < self.min_size:
+            return False
+        entry = self.state.get(path)
+        if (entry is None
+                or entry['chain'] >= self.chain_limit
+                or not os.path.lexists(self.archive_folder / entry['archive'])
+                or not (self.signatures_folder / entry['signature']).is_file()):
+            self.full_files[path] = file_stat
+            return False
+        self.delta_files[path] = (file_stat, entry)
+        return True
+
+    def write_deltas(self, archive_path: Path) -> int:
+        """
+        Write deltas and new signatures, before saving the archive.
+
+        Everything is kept in temporary locations until publish().
+
+        :param archive_path: final archive file or folder path
+        :return: total delta bytes
+        """
+        self.archive_path = archive_path
+        self.partial_folder = (get_metadata_folder(self.archive_folder, DELTAS_FOLDER_NAME)
+                               / f'.{archive_path.name}.partial')
+        shutil.rmtree(self.partial_folder, ignore_errors=True)
+        self.partial_folder.mkdir(parents=True)
+        self.signatures_folder.mkdir(parents=True, exist_ok=True)
+        manifest = self.manifest
+        delta_bytes = 0
+        for path, (file_stat, entry) in self.delta_files.items():
+            if entry['size'] == file_stat.st_size and entry['mtime_ns'] == file_stat.st_mtime_ns:
+                # Unchanged since the base archive, which still holds the newest version.
+                manifest[path] = _get_manifest_entry(entry['archive'], None, file_stat)
+                continue
+            delta_name = f'{_get_path_key(path)}{DELTA_SUFFIX}'
+            _run_delta_program('delta',
+                               str(self.signatures_folder / entry['signature']),
+                               path,
+                               str(self.partial_folder / delta_name))
+            delta_bytes += (self.partial_folder / delta_name).stat().st_size
+            manifest[path] = _get_manifest_entry(entry['archive'], delta_name, file_stat)
+            self._write_signature(path, file_stat, entry['chain'] + 1)
+        for path, file_stat in self.full_files.items():
+            self._write_signature(path, file_stat, 0)
+        _write_json(self.partial_folder / DELTA_MANIFEST_NAME,
+                    {'version': DELTA_VERSION, 'files': manifest})
+        return delta_bytes
+
+    def publish(self):
+        """Move deltas into place and record new signatures, once the archive is saved."""
+        for path, file_stat in self.full_files.items():
+            # Files saved in full are read by the archive command after their
+            # signatures were created.
+            if path in self.new_state and not _is_unchanged(path, file_stat):
+                log_warning('File changed while saving, it will be saved in full next time.', path)
+                self._discard_signature(self.new_state.pop(path))
+        delete_delta_sidecar(self.archive_path)
+        if self.manifest:
+            os.rename(self.partial_folder, get_delta_sidecar_path(self.archive_path))
+        else:
+            # Archives without deltas have no sidecar.
+            shutil.rmtree(self.partial_folder, ignore_errors=True)
+        for path, entry in self.new_state.items():
+            entry['archive'] = self.archive_path.name
+            os.replace(self.signatures_folder / f'{entry["signature"]}.tmp',
+                       self.signatures_folder / entry['signature'])
+            self.state[path] = entry
+        _write_json(self.signatures_folder / DELTA_STATE_NAME,
+                    {'version': DELTA_VERSION, 'files': self.state})
+
+    def discard(self):
+        """Delete deltas and new signatures after a failed save."""
+        if self.partial_folder is not None:
+            shutil.rmtree(self.partial_folder, ignore_errors=True)
+        for entry in self.new_state.values():
+            self._discard_signature(entry)
+        self.new_state.clear()
+
+    def _write_signature(self, path: str, file_stat: os.stat_result, chain: int):
+        signature_name = f'{_get_path_key(path)}{SIGNATURE_SUFFIX}'
+        _run_delta_program('signature', path, str(self.signatures_folder / f'{signature_name}.tmp'))
+        entry = {
+            'archive': None,
+            'chain': chain,
+            'size': file_stat.st_size,
+            'mtime_ns': file_stat.st_mtime_ns,
+            'signature': signature_name,
+        }
+        self.new_state[path] = entry
+        if not _is_unchanged(path, file_stat):
+            log_warning('File changed while saving, it will be saved in full next time.', path)
+            self._discard_signature(self.new_state.pop(path))
+
+    def _discard_signature(self, entry: dict):
+        try:
+            os.unlink(self.signatures_folder / f'{entry["signature"]}.tmp')
+        except FileNotFoundError:
+            pass
+
+
+def _get_manifest_entry(base_name: str,
+                        delta_name: str | None,
+                        file_stat: os.stat_result,
+                        ) -> dict:
+    # Size and time allow listing files that are not in the archive itself.
+    return {
+        'base': base_name,
+        'delta': delta_name,
+        'size': file_stat.st_size,
+        'mtime': file_stat.st_mtime,
+    }
+
+
+def _get_path_key(path: str) -> str:
+    return hashlib.sha1(path.encode()).hexdigest()
+
+
+def _is_unchanged(path: str, file_stat: os.stat_result) -> bool:
+    try:
+        new_stat = os.stat(path)
+    except OSError:
+        return False
+    return (new_stat.st_size == file_stat.st_size
+            and new_stat.st_mtime_ns == file_stat.st_mtime_ns)
+
+
+def _run_delta_program(*args: str):
+    process = subprocess.run(get_delta_program() + list(args),
+                             stderr=subprocess.PIPE,
+                             encoding='utf-8')
+    if process.returncode != 0:
+        raise OSError(f'Delta command failed: rdiff {args[0]}: {process.stderr.strip()}')
+
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        with open(path, encoding='utf-8') as json_file:
+            data = json.load(json_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != DELTA_VERSION:
+        return None
+    return data
+
+
+def _write_json(path: Path, data: dict):
+    with NamedTemporaryFile(prefix='.tzar_',
+                            suffix='.tmp',
+                            dir=path.parent,
+                            mode='w',
+                            encoding='utf-8',
+                            delete=False) as temp_file:
+        json.dump(data, temp_file, indent=1)
+    os.replace(temp_file.name, path)
@@ -0,0 +1,227 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive-to-archive comparison.
+
+Member listings of both archives are sorted by path and merged, without
+extracting anything. Listings that are too large to sort in memory are sorted
+in chunks that are spilled to temporary files and merged as streams, so that
+memory use stays bounded. Member list sidecars are used when available.
+
+Members are compared by size and modification time, or by checksum when both
+archives store member checksums, e.g. zip files.
+"""
+
+import heapq
+import json
+import tarfile
+import zipfile
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import TemporaryFile
+from typing import (
+    IO,
+    Iterable,
+    Iterator,
+    Type,
+)
+
+from jiig import Runtime
+from jiig.util.log import abort
+
+from .archive import (
+    DiscoveredArchive,
+    get_timestamp_matcher,
+)
+from .delta import read_delta_manifest
+from .methods.base import ArchiveMethodBase
+from .methods.members import normalize_member_path
+
+DIFF_SORT_CHUNK_SIZE = 100000
+
+# (path, size or None for folders, integer time, checksum or None)
+DiffMember = tuple[str, int | None, int, str | None]
+
+
+@dataclass(slots=True)
+class ArchiveDiffItem:
+    """Difference between two archives for one member path."""
+    path: str
+    # 'added', 'removed', or 'changed'.
+    change: str
+    old_size: int | None = None
+    new_size: int | None = None
+
+    @property
+    def size_delta(self) -> int:
+        return (self.new_size or 0) - (self.old_size or 0)
+
+
+def iterate_sorted_members(members: Iterable[DiffMember],
+                           chunk_size: int = None,
+                           ) -> Iterator[DiffMember]:
+    """
+    Sort members by path with bounded memory use.
+
+    Only the last member is kept for paths that appear more than once, e.g.
+    files appended to a tarball.
+
+    :param members: unsorted members
+    :param chunk_size: maximum members to sort in memory (default: DIFF_SORT_CHUNK_SIZE)
+    :return: sorted member iterator
+    """
+    chunk_size = chunk_size or DIFF_SORT_CHUNK_SIZE
+    with ExitStack() as exit_stack:
+        chunk_files: list[IO[str]] = []
+        chunk: list[tuple[str, int, DiffMember]] = []
+        # The sequence number keeps duplicate paths in listing order.
+        for sequence_number, member in enumerate(members):
+            chunk.append((member[0], sequence_number, member))
+            if len(chunk) >= chunk_size:
+                chunk_files.append(exit_stack.enter_context(_write_sorted_chunk(chunk)))
+                chunk = []
+        chunk.sort()
+        if chunk_files:
+            if chunk:
+                chunk_files.append(exit_stack.enter_context(_write_sorted_chunk(chunk)))
+            sorted_entries = heapq.merge(*(_read_sorted_chunk(chunk_file)
+                                           for chunk_file in chunk_files))
+        else:
+            sorted_entries = iter(chunk)
+        previous_member: DiffMember | None = None
+        for _path, _sequence_number, member in sorted_entries:
+            if previous_member is not None and previous_member[0] != member[0]:
+                yield previous_member
+            previous_member = member
+        if previous_member is not None:
+            yield previous_member
+
+
+def compare_sorted_members(old_members: Iterator[DiffMember],
+                           new_members: Iterator[DiffMember],
+                           ) -> Iterator[ArchiveDiffItem]:
+    """
+    Merge sorted member streams and produce differences.
+
+    :param old_members: old archive members sorted by path
+    :param new_members: new archive members sorted by path
+    :return: difference iterator, sorted by path
+    """
+    old_member = next(old_members, None)
+    new_member = next(new_members, None)
+    while old_member is not None or new_member is not None:
+        if new_member is None or (old_member is not None and old_member[0] < new_member[0]):
+            yield ArchiveDiffItem(old_member[0], 'removed', old_size=old_member[1])
+            old_member = next(old_members, None)
+        elif old_member is None or new_member[0] < old_member[0]:
+            yield ArchiveDiffItem(new_member[0], 'added', new_size=new_member[1])
+            new_member = next(new_members, None)
+        else:
+            if _is_changed(old_member, new_member):
+                yield ArchiveDiffItem(new_member[0],
+                                      'changed',
+                                      old_size=old_member[1],
+                                      new_size=new_member[1])
+            old_member = next(old_members, None)
+            new_member = next(new_members, None)
+
+
+def diff_archives(runtime: Runtime,
+                  old_archive_path: Path,
+                  new_archive_path: Path,
+                  ) -> Iterator[ArchiveDiffItem]:
+    """
+    Compare the member listings of two archives.
+
+    Checksums are only compared when both archives provide them.
+
+    :param runtime: Jiig runtime API.
+    :param old_archive_path: old archive file or folder path
+    :param new_archive_path: new archive file or folder path
+    :return: difference iterator, sorted by path
+    """
+    old_method_cls = _get_method_class(runtime, old_archive_path)
+    new_method_cls = _get_method_class(runtime, new_archive_path)
+    old_checksums = old_method_cls.handle_list_checksums(old_archive_path)
+    new_checksums = new_method_cls.handle_list_checksums(new_archive_path)
+    # Files saved as deltas have no checksums, and are only in member listings.
+    if (old_checksums is not None
+            and new_checksums is not None
+            and read_delta_manifest(old_archive_path) is None
+            and read_delta_manifest(new_archive_path) is None):
+        old_members = _iterate_checksum_members(old_checksums)
+        new_members = _iterate_checksum_members(new_checksums)
+    else:
+        old_members = _iterate_members(old_method_cls, old_archive_path)
+        new_members = _iterate_members(new_method_cls, new_archive_path)
+    try:
+        yield from compare_sorted_members(iterate_sorted_members(old_members),
+                                          iterate_sorted_members(new_members))
+    except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as exc:
+        abort('Failed to list archive.', exc)
+
+
+def _get_method_class(runtime: Runtime, archive_path: Path) -> Type[ArchiveMethodBase]:
+    timestamp_matcher = get_timestamp_matcher(str(runtime.get_param('timestamp_format')))
+    discovered_archive = DiscoveredArchive.get(archive_path, timestamp_matcher)
+    if discovered_archive is None:
+        abort(f'Unsupported archive: {archive_path}')
+    return discovered_archive.method_cls
+
+
+def _iterate_members(method_cls: Type[ArchiveMethodBase],
+                     archive_path: Path,
+                     ) -> Iterator[DiffMember]:
+    for item in method_cls().handle_list(archive_path):
+        path = normalize_member_path(item.path)
+        if path != '.':
+            yield path, item.size, int(item.time), None
+
+
+def _iterate_checksum_members(items: Iterable[tuple]) -> Iterator[DiffMember]:
+    for item, checksum in items:
+        path = normalize_member_path(item.path)
+        if path != '.':
+            yield path, item.size, int(item.time), checksum
+
+
+def _is_changed(old_member: DiffMember, new_member: DiffMember) -> bool:
+    if (old_member[1] is None) != (new_member[1] is None):
+        return True
+    if old_member[1] is None:
+        return False
+    if old_member[3] is not None and new_member[3] is not None:
+        return old_member[1] != new_member[1] or old_member[3] != new_member[3]
+    return old_member[1] != new_member[1] or old_member[2] != new_member[2]
+
+
+def _write_sorted_chunk(chunk: list[tuple[str, int, DiffMember]]) -> IO[str]:
+    chunk.sort()
+    chunk_file = TemporaryFile(mode='w+', encoding='utf-8')
+    for entry in chunk:
+        chunk_file.write(json.dumps(entry))
+        chunk_file.write('\n')
+    chunk_file.seek(0)
+    return chunk_file
+
+
+def _read_sorted_chunk(chunk_file: IO[str]) -> Iterator[tuple[str, int, DiffMember]]:
+    for line in chunk_file:
+        path, sequence_number, member = json.loads(line)
+        yield path, sequence_number, tuple(member)
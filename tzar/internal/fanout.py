@@ -0,0 +1,149 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Fan-out tar streams.
+
+One tar process reads the source files once. Its output is fed to one
+compression process per distinct compression command, and each compressed
+stream is written to every destination that uses it. Compression processes
+and destination writers run concurrently.
+"""
+
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Sequence,
+)
+
+from jiig.util.log import log_error
+
+from .methods import MethodStreamResult
+
+FANOUT_CHUNK_SIZE = 1024 * 1024
+
+
+class _CompressorOutput:
+
+    def __init__(self, compressor_arguments: list[str], archive_paths: list[Path]):
+        self.archive_paths = archive_paths
+        self.failed_paths: set[Path] = set()
+        self.process = subprocess.Popen(compressor_arguments,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self.thread = threading.Thread(target=self._write_archives, daemon=True)
+        self.thread.start()
+
+    def _write_archives(self):
+        archive_files: dict[Path, BinaryIO] = {}
+        for archive_path in self.archive_paths:
+            try:
+                archive_files[archive_path] = open(archive_path, 'wb')
+            except OSError as exc:
+                log_error('Failed to create archive.', archive_path, exc)
+                self.failed_paths.add(archive_path)
+        # Keep reading after write failures, so that the compressor does not block.
+        while chunk := self.process.stdout.read(FANOUT_CHUNK_SIZE):
+            for archive_path, archive_file in list(archive_files.items()):
+                try:
+                    archive_file.write(chunk)
+                except OSError as exc:
+                    log_error('Failed to write archive.', archive_path, exc)
+                    self.failed_paths.add(archive_path)
+                    archive_file.close()
+                    del archive_files[archive_path]
+        for archive_path, archive_file in archive_files.items():
+            try:
+                archive_file.close()
+            except OSError as exc:
+                log_error('Failed to write archive.', archive_path, exc)
+                self.failed_paths.add(archive_path)
+
+    def write(self, chunk: bytes) -> bool:
+        try:
+            self.process.stdin.write(chunk)
+            return True
+        except BrokenPipeError:
+            return False
+
+    def finish(self) -> bool:
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return_code = self.process.wait()
+        self.thread.join()
+        return return_code == 0
+
+
+def save_tar_fanout(source_list_path: Path,
+                    stream_results: Sequence[MethodStreamResult],
+                    verbose: bool = False,
+                    ) -> set[Path]:
+    """
+    Save multiple compressed tarballs from a single tar stream.
+
+    Runs in the source folder, since the source list paths are relative.
+    Incomplete archives are deleted.
+
+    :param source_list_path: source file list path
+    :param stream_results: compression commands and archive paths
+    :param verbose: list archived files if True
+    :return: paths of archives that were saved successfully
+    """
+    archive_paths_by_compressor: dict[tuple[str, ...], list[Path]] = {}
+    for stream_result in stream_results:
+        archive_paths_by_compressor.setdefault(
+            tuple(stream_result.compressor_arguments), []).append(stream_result.archive_path)
+    tar_arguments = ['tar', 'cf', '-', '-T', str(source_list_path)]
+    if verbose:
+        tar_arguments.append('-v')
+    tar_process = subprocess.Popen(tar_arguments, stdout=subprocess.PIPE)
+    outputs = [
+        _CompressorOutput(list(compressor_arguments), archive_paths)
+        for compressor_arguments, archive_paths in archive_paths_by_compressor.items()
+    ]
+    active_outputs = list(outputs)
+    failed_outputs: list[_CompressorOutput] = []
+    while chunk := tar_process.stdout.read(FANOUT_CHUNK_SIZE):
+        for output in list(active_outputs):
+            if not output.write(chunk):
+                active_outputs.remove(output)
+                failed_outputs.append(output)
+        if not active_outputs:
+            break
+    tar_process.stdout.close()
+    tar_ok = tar_process.wait() == 0
+    if not tar_ok:
+        log_error('Tar command failed.', ' '.join(tar_arguments))
+    saved_paths: set[Path] = set()
+    for output in outputs:
+        output_ok = output.finish() and output not in failed_outputs
+        if not output_ok:
+            log_error('Compression command failed.', ' '.join(output.process.args))
+        for archive_path in output.archive_paths:
+            if tar_ok and output_ok and archive_path not in output.failed_paths:
+                saved_paths.add(archive_path)
+            else:
+                try:
+                    os.unlink(archive_path)
+                except FileNotFoundError:
+                    pass
+    return saved_paths
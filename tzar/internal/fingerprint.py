@@ -0,0 +1,333 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Source tree fingerprints.
+
+A fingerprint is a Merkle-style hash of the files a save selects, combining
+per-folder digests of file names, sizes and modification times. The selected
+file lists are cached per folder, along with folder modification times. Adding,
+removing or renaming entries changes a folder's modification time, so when no
+folder time changed, the cached lists are reused, and only files are checked.
+
+Saved archives record the fingerprint of their source in a sidecar, so that a
+save can be skipped when nothing changed since the newest archive.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from jiig import Runtime
+from jiig.util.filesystem import (
+    iterate_filtered_files,
+    temporary_working_folder,
+)
+
+from .metadata import get_metadata_folder
+
+FINGERPRINTS_FOLDER_NAME = 'fingerprints'
+FINGERPRINT_SIDECAR_SUFFIX = '.txt'
+FINGERPRINT_CACHE_VERSION = 1
+GITIGNORE_NAME = '.gitignore'
+
+
+@dataclass
+class TreeFingerprint:
+    """Source tree fingerprint."""
+    digest: str
+    # Scanned folders, including ones without selected files.
+    folders: list[Path]
+    file_count: int
+
+
+class _StaleListing(Exception):
+    pass
+
+
+def get_source_fingerprint(runtime: Runtime,
+                           source_folder: Path,
+                           gitignore: bool = False,
+                           excludes: list[str] = None,
+                           ) -> TreeFingerprint:
+    """
+    Get source tree fingerprint, using the configured cache folder.
+
+    :param runtime: Jiig runtime API.
+    :param source_folder: source folder path
+    :param gitignore: obey .gitignore exclusions if True
+    :param excludes: file exclusion patterns
+    :return: fingerprint
+    """
+    cache_folder = runtime.get_param('fingerprint_cache')
+    return get_tree_fingerprint(source_folder,
+                                cache_folder=Path(str(cache_folder)).expanduser()
+                                if cache_folder else None,
+                                gitignore=gitignore,
+                                excludes=excludes)
+
+
+def get_tree_fingerprint(source_folder: Path,
+                         cache_folder: Path = None,
+                         gitignore: bool = False,
+                         excludes: list[str] = None,
+                         ) -> TreeFingerprint:
+    """
+    Get source tree fingerprint.
+
+    :param source_folder: source folder path
+    :param cache_folder: optional folder for cached file lists
+    :param gitignore: obey .gitignore exclusions if True
+    :param excludes: file exclusion patterns
+    :return: fingerprint
+    """
+    cache_path: Path | None = None
+    folder_records: dict[str, dict] | None = None
+    if cache_folder is not None:
+        cache_key = json.dumps([str(source_folder), gitignore, sorted(excludes or [])])
+        cache_path = cache_folder / f'{hashlib.sha1(cache_key.encode()).hexdigest()}.json'
+        folder_records = _read_cache(cache_path)
+        if folder_records is not None and not _is_listing_current(source_folder,
+                                                                   folder_records,
+                                                                   gitignore):
+            folder_records = None
+    if folder_records is not None:
+        try:
+            return _hash_tree(source_folder, folder_records, strict=True)
+        except _StaleListing:
+            pass
+    folder_records = _list_tree(source_folder, gitignore, excludes)
+    if cache_path is not None:
+        _write_cache(cache_path, folder_records)
+    return _hash_tree(source_folder, folder_records, strict=False)
+
+
+def get_fingerprint_sidecar_path(archive_path: Path) -> Path:
+    """
+    Get archive source fingerprint sidecar path.
+
+    :param archive_path: archive file or folder path
+    :return: sidecar path
+    """
+    return (get_metadata_folder(archive_path.parent, FINGERPRINTS_FOLDER_NAME)
+            / f'{archive_path.name}{FINGERPRINT_SIDECAR_SUFFIX}')
+
+
+def record_archive_fingerprint(archive_path: Path, digest: str):
+    """
+    Record archive source fingerprint in a sidecar.
+
+    Failures are ignored, since the next save simply is not skipped.
+
+    :param archive_path: archive file or folder path
+    :param digest: source fingerprint digest
+    """
+    sidecar_path = get_fingerprint_sidecar_path(archive_path)
+    try:
+        sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(prefix='.tzar_',
+                                suffix='.tmp',
+                                dir=sidecar_path.parent,
+                                mode='w',
+                                encoding='utf-8',
+                                delete=False) as temp_file:
+            temp_file.write(f'{digest}\n')
+        os.replace(temp_file.name, sidecar_path)
+    except OSError:
+        pass
+
+
+def read_archive_fingerprint(archive_path: Path) -> str | None:
+    """
+    Read archive source fingerprint sidecar.
+
+    :param archive_path: archive file or folder path
+    :return: source fingerprint digest or None if unavailable
+    """
+    try:
+        return get_fingerprint_sidecar_path(archive_path).read_text(encoding='utf-8').strip() or None
+    except OSError:
+        return None
+
+
+def delete_fingerprint_sidecar(archive_path: Path):
+    """
+    Delete archive source fingerprint sidecar, if present.
+
+    :param archive_path: archive file or folder path
+    """
+    try:
+        os.unlink(get_fingerprint_sidecar_path(archive_path))
+    except FileNotFoundError:
+        pass
+
+
+def _get_mtime_ns(path: str) -> int | None:
+    try:
+        return os.stat(path, follow_symlinks=False).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _is_listing_current(source_folder: Path,
+                        folder_records: dict[str, dict],
+                        gitignore: bool,
+                        ) -> bool:
+    for relative_folder, folder_record in folder_records.items():
+        folder = os.path.join(source_folder, relative_folder)
+        if _get_mtime_ns(folder) != folder_record['mtime_ns']:
+            return False
+        # Edited .gitignore files change selections without changing folder times.
+        if gitignore and (_get_mtime_ns(os.path.join(folder, GITIGNORE_NAME))
+                          != folder_record['gitignore_ns']):
+            return False
+    return True
+
+
+def _list_tree(source_folder: Path,
+               gitignore: bool,
+               excludes: list[str] | None,
+               ) -> dict[str, dict]:
+    # Folder times are read before listing files, so that changes made during
+    # the listing make the cached listing out of date.
+    folder_times: dict[str, tuple[int, int | None]] = {}
+    walk_folders: list[str] = []
+    for walk_folder, sub_folder_names, _file_names in os.walk(source_folder):
+        walk_folders.append(walk_folder)
+        relative_folder = os.path.relpath(walk_folder, source_folder)
+        folder_times[relative_folder] = (
+            _get_mtime_ns(walk_folder),
+            _get_mtime_ns(os.path.join(walk_folder, GITIGNORE_NAME)) if gitignore else None,
+        )
+    files_by_folder: dict[str, list[str]] = {}
+    selected_folders: set[str] = {'.'}
+    with temporary_working_folder(source_folder):
+        for file_path in iterate_filtered_files(source_folder,
+                                                gitignore=gitignore,
+                                                excludes=excludes):
+            relative_folder = os.path.normpath(file_path.parent)
+            files_by_folder.setdefault(relative_folder, []).append(file_path.name)
+            while relative_folder not in selected_folders:
+                selected_folders.add(relative_folder)
+                relative_folder = os.path.dirname(relative_folder) or '.'
+    # Excluded folders without selected files are not tracked, since nothing
+    # added inside them can be selected. Their parents are still tracked.
+    prune_patterns = [pattern for pattern in (excludes or [])
+                      if '/' not in pattern and not pattern.startswith('!')]
+    if gitignore:
+        prune_patterns.append('.git')
+    folder_records: dict[str, dict] = {}
+    for relative_folder, (mtime_ns, gitignore_ns) in folder_times.items():
+        if mtime_ns is None or _is_pruned(relative_folder, selected_folders, prune_patterns):
+            continue
+        folder_records[relative_folder] = {
+            'mtime_ns': mtime_ns,
+            'gitignore_ns': gitignore_ns,
+            'files': sorted(files_by_folder.get(relative_folder, [])),
+        }
+    return folder_records
+
+
+def _is_pruned(relative_folder: str,
+               selected_folders: set[str],
+               prune_patterns: list[str],
+               ) -> bool:
+    while relative_folder != '.':
+        if relative_folder in selected_folders:
+            return False
+        if any(fnmatch(os.path.basename(relative_folder), pattern)
+               for pattern in prune_patterns):
+            return True
+        relative_folder = os.path.dirname(relative_folder) or '.'
+    return False
+
+
+def _hash_tree(source_folder: Path,
+               folder_records: dict[str, dict],
+               strict: bool,
+               ) -> TreeFingerprint:
+    child_folders: dict[str, list[str]] = {}
+    for relative_folder in folder_records.keys():
+        if relative_folder != '.':
+            parent_folder = os.path.dirname(relative_folder) or '.'
+            child_folders.setdefault(parent_folder, []).append(relative_folder)
+    # Digests are computed bottom-up. Folders without selected files, directly
+    # or below, have no digest, since saves do not include empty folders.
+    folder_digests: dict[str, str | None] = {}
+    file_count = 0
+    for relative_folder in sorted(folder_records.keys(),
+                                  key=lambda name: name.count(os.sep) + (name != '.'),
+                                  reverse=True):
+        folder = os.path.join(source_folder, relative_folder)
+        folder_hash = hashlib.sha1()
+        has_content = False
+        for file_name in folder_records[relative_folder]['files']:
+            try:
+                file_stat = os.stat(os.path.join(folder, file_name), follow_symlinks=False)
+            except FileNotFoundError:
+                # Files removed since a fresh listing changed their folder
+                # times, so that the cached listing is not reused.
+                if strict:
+                    raise _StaleListing()
+                continue
+            folder_hash.update(f'f {file_name}\0{file_stat.st_size}'
+                               f'\0{file_stat.st_mtime_ns}\n'.encode())
+            file_count += 1
+            has_content = True
+        for child_folder in sorted(child_folders.get(relative_folder, [])):
+            child_digest = folder_digests[child_folder]
+            if child_digest is not None:
+                folder_hash.update(f'd {os.path.basename(child_folder)}'
+                                   f'\0{child_digest}\n'.encode())
+                has_content = True
+        folder_digests[relative_folder] = folder_hash.hexdigest() if has_content else None
+    return TreeFingerprint(digest=folder_digests.get('.') or hashlib.sha1().hexdigest(),
+                           folders=[source_folder / relative_folder
+                                    if relative_folder != '.' else source_folder
+                                    for relative_folder in folder_records.keys()],
+                           file_count=file_count)
+
+
+def _read_cache(cache_path: Path) -> dict[str, dict] | None:
+    try:
+        with open(cache_path, encoding='utf-8') as cache_file:
+            cache_data = json.load(cache_file)
+        if cache_data.get('version') != FINGERPRINT_CACHE_VERSION:
+            return None
+        return cache_data['folders']
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+
+def _write_cache(cache_path: Path, folder_records: dict[str, dict]):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(prefix='.tzar_',
+                                suffix='.tmp',
+                                dir=cache_path.parent,
+                                mode='w',
+                                encoding='utf-8',
+                                delete=False) as temp_file:
+            json.dump({'version': FINGERPRINT_CACHE_VERSION, 'folders': folder_records},
+                      temp_file)
+        os.replace(temp_file.name, cache_path)
+    except OSError:
+        pass
@@ -0,0 +1,209 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Persistent archive folder catalog index.
+
+The index records discovered archive data so that catalog queries need not
+rescan and re-parse the archive folder. It is valid as long as the archive
+folder modification time matches the one recorded when it was written, and
+archive names were parsed with the same timestamp format.
+
+Commands that change the archive folder update the index incrementally. Each
+change is checked against the folder modification time immediately before
+it is made, so that concurrent changes by other commands invalidate the index,
+rather than being recorded as current.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Iterator, Self
+
+from .metadata import get_metadata_folder
+
+CATALOG_INDEX_FILE_NAME = 'catalog.json'
+CATALOG_INDEX_VERSION = 2
+
+
+@dataclass
+class CatalogIndexEntry:
+    """Index data for one archive."""
+    name: str
+    method_name: str
+    # None if a folder archive size was not needed yet.
+    size: int | None
+    file_time: float
+    source_name: str
+    # Time stamp parsed from the name or None if the name has none.
+    time_stamp: float | None
+    tags: list[str]
+
+
+class CatalogIndex:
+    """Archive folder catalog index."""
+
+    def __init__(self,
+                 archive_folder: Path,
+                 timestamp_format: str,
+                 folder_mtime_ns: int = 0,
+                 entries: dict[str, CatalogIndexEntry] = None,
+                 ):
+        """
+        Catalog index constructor.
+
+        :param archive_folder: archive folder path
+        :param timestamp_format: timestamp format used to parse archive names
+        :param folder_mtime_ns: archive folder modification time when indexed
+        :param entries: index entries by archive name
+        """
+        self.archive_folder = archive_folder
+        self.timestamp_format = timestamp_format
+        self.folder_mtime_ns = folder_mtime_ns
+        self.entries = entries if entries is not None else {}
+        # Set when something else changed the archive folder during an update.
+        self.invalidated = False
+
+    @property
+    def path(self) -> Path:
+        return get_metadata_folder(self.archive_folder) / CATALOG_INDEX_FILE_NAME
+
+    def is_current(self) -> bool:
+        """
+        Check if the index matches the archive folder.
+
+        :return: True if the archive folder has not changed since indexing
+        """
+        try:
+            return self.archive_folder.stat().st_mtime_ns == self.folder_mtime_ns
+        except OSError:
+            return False
+
+    def mark_current(self):
+        """Record the current archive folder modification time."""
+        self.folder_mtime_ns = self.archive_folder.stat().st_mtime_ns
+
+    @classmethod
+    def load(cls,
+             archive_folder: Path,
+             timestamp_format: str,
+             ) -> Self | None:
+        """
+        Load archive folder index.
+
+        :param archive_folder: archive folder path
+        :param timestamp_format: timestamp format used to parse archive names
+        :return: index or None if it is missing, unreadable, or incompatible
+        """
+        index = cls(archive_folder, timestamp_format)
+        try:
+            with open(index.path, encoding='utf-8') as index_file:
+                data = json.load(index_file)
+            if (data['version'] != CATALOG_INDEX_VERSION
+                    or data['timestamp_format'] != timestamp_format):
+                return None
+            index.folder_mtime_ns = data['folder_mtime_ns']
+            for row in data['archives']:
+                entry = CatalogIndexEntry(*row)
+                index.entries[entry.name] = entry
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return index
+
+    def save(self):
+        """
+        Save index, replacing any existing one atomically.
+
+        Failures, e.g. due to a read-only archive folder, are ignored, since the
+        index is only an optimization.
+        """
+        data = {
+            'version': CATALOG_INDEX_VERSION,
+            'timestamp_format': self.timestamp_format,
+            'folder_mtime_ns': self.folder_mtime_ns,
+            'archives': [
+                [
+                    entry.name,
+                    entry.method_name,
+                    entry.size,
+                    entry.file_time,
+                    entry.source_name,
+                    entry.time_stamp,
+                    entry.tags,
+                ]
+                for entry in self.entries.values()
+            ],
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with NamedTemporaryFile(prefix='.tzar_',
+                                    suffix='.tmp',
+                                    dir=self.path.parent,
+                                    mode='w',
+                                    encoding='utf-8',
+                                    delete=False) as temp_file:
+                json.dump(data, temp_file, separators=(',', ':'))
+            os.replace(temp_file.name, self.path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def updating_catalog_index(archive_folder: Path,
+                           timestamp_format: str,
+                           ) -> Iterator[CatalogIndex | None]:
+    """
+    Context manager for incrementally updating a current index.
+
+    Yields None if there is no current index, e.g. because something else
+    changed the archive folder. The next catalog query rescans in that case.
+    The index is only saved if the block exits normally, and nothing else
+    changed the archive folder. Changes to the archive folder must be made in
+    changing_archive_folder() blocks. Keep the block short, e.g. by making
+    archives elsewhere and only publishing them in the block.
+
+    :param archive_folder: archive folder path
+    :param timestamp_format: timestamp format used to parse archive names
+    :return: current index or None
+    """
+    index = CatalogIndex.load(archive_folder, timestamp_format)
+    if index is not None and not index.is_current():
+        index = None
+    yield index
+    if index is not None and not index.invalidated:
+        index.save()
+
+
+@contextmanager
+def changing_archive_folder(catalog_index: CatalogIndex | None) -> Iterator[None]:
+    """
+    Context manager for changing the archive folder of an index being updated.
+
+    The index is invalidated if the archive folder changed since the index was
+    loaded or since the previous change made through here. Otherwise it is
+    marked current after the change.
+
+    :param catalog_index: index from updating_catalog_index() or None
+    """
+    if catalog_index is not None and not catalog_index.is_current():
+        catalog_index.invalidated = True
+    yield
+    if catalog_index is not None and not catalog_index.invalidated:
+        catalog_index.mark_current()
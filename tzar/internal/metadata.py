@@ -0,0 +1,54 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive folder metadata support.
+
+Metadata, e.g. archive member lists, is kept in a hidden sub-folder of the
+archive folder. Archive names never start with '.', so catalog discovery
+ignores hidden entries.
+"""
+
+from pathlib import Path
+
+METADATA_FOLDER_NAME = '.tzar'
+
+
+def get_metadata_folder(archive_folder: Path,
+                        sub_folder: str = None,
+                        ) -> Path:
+    """
+    Get archive folder metadata folder path.
+
+    :param archive_folder: archive folder path
+    :param sub_folder: optional metadata sub-folder name
+    :return: metadata folder path
+    """
+    metadata_folder = archive_folder / METADATA_FOLDER_NAME
+    if sub_folder:
+        metadata_folder = metadata_folder / sub_folder
+    return metadata_folder
+
+
+def is_metadata_name(name: str) -> bool:
+    """
+    Check if an archive folder entry name is hidden metadata.
+
+    :param name: archive folder entry name
+    :return: True if the entry should be ignored by catalog discovery
+    """
+    return name.startswith('.')
@@ -22,8 +22,13 @@ from .base import (
     MethodListItem,
     MethodSaveData,
     MethodSaveResult,
+    MethodStreamResult,
 )
 from .files import ArchiveMethodSync
 from .gz import ArchiveMethodGZ
+from .shards import (
+    ArchiveMethodShardsGZ,
+    ArchiveMethodShardsXZ,
+)
 from .xz import ArchiveMethodXZ
 from .zip import ArchiveMethodZip
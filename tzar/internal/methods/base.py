@@ -15,9 +15,14 @@
 # You should have received a copy of the GNU General Public License
 # along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
 
+import tarfile
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Sequence
+from typing import (
+    BinaryIO,
+    Iterator,
+    Sequence,
+)
 
 from jiig.util.filesystem import find_system_program
 from jiig.util.log import log_warning
@@ -39,6 +44,11 @@ class MethodSaveData:
     total_bytes: int
     total_files: int
     total_folders: int
+    # Requested number of shards for sharded methods, or 0 for the default.
+    shard_count: int = 0
+    # Existing archive with the same final name, if any, whose unchanged
+    # content may be linked into the new archive by resumable methods.
+    link_path: Path | None = None
 
     @property
     def pv_progress(self) -> bool:
@@ -64,9 +74,22 @@ class MethodSaveResult:
     """Output data received after saving archive."""
     archive_path: Path
     command_arguments: list[str]
+    # Commands to run concurrently instead, e.g. one per shard.
+    parallel_command_arguments: list[list[str]] | None = None
+    # (temporary output path, checkpoint path) per parallel command. Outputs of
+    # successful commands are renamed, so that an interrupted save can skip them.
+    checkpoint_paths: list[tuple[Path, Path]] | None = None
 
 
 @dataclass
+class MethodStreamResult:
+    """Output data for saving an archive from a shared tar stream."""
+    archive_path: Path
+    # Compression program command arguments, reading the tar stream from stdin.
+    compressor_arguments: list[str]
+
+
+@dataclass(slots=True)
 class MethodListItem:
     """Data received for an archive file when listing archive contents."""
     path: Path
@@ -78,6 +101,24 @@ class MethodListItem:
 class ArchiveMethodBase:
     """Base archive method class."""
 
+    # Archive file name extension, including the leading '.', used to
+    # recognize archives by name. None for methods that produce folders.
+    extension: str | None = None
+    # True for methods that produce folders instead of files. Folder methods
+    # with an extension are recognized by name, like file methods.
+    folder = False
+    # True for folder methods that hold copies of the source files.
+    source_copy = False
+    # Write a member list sidecar at save time for fast listing if True.
+    member_sidecar = False
+    # True for methods that can continue an interrupted save, keeping the
+    # partial archive for the next save.
+    resumable = False
+    # Compression and decompression program alternatives for tarball methods,
+    # with optional arguments when an alternative is a sequence.
+    compressors: list[str | list[str]] | None = None
+    decompressors: list[str | list[str]] | None = None
+
     @classmethod
     def handle_get_name(cls,
                         archive_name: str,
@@ -102,9 +143,24 @@ class ArchiveMethodBase:
         """
         raise NotImplementedError
 
+    @classmethod
+    def handle_stream(cls,
+                      save_data: MethodSaveData,
+                      ) -> MethodStreamResult | None:
+        """
+        Optional override for saving an archive from a tar stream.
+
+        Allows sharing one source read between multiple destinations.
+
+        :param save_data: input parameters for save operation
+        :return: stream result data or None if tar streams are not supported
+        """
+        return None
+
     @classmethod
     def handle_list(cls,
                     archive_path: Path,
+                    prefix: str = None,
                     ) -> Sequence[MethodListItem]:
         """
         Required override for listing archive contents.
@@ -112,20 +168,37 @@ class ArchiveMethodBase:
         Returned sequence may be unsorted, since it will be sorted later.
 
         :param archive_path: path of archive file or folder
+        :param prefix: optional member path prefix filter
         :return: sequence of item data objects, one per archived file
         """
         raise NotImplementedError
 
     @classmethod
-    def check_supported(cls,
-                        archive_path: Path,
-                        assumed_type: int = None,
-                        ) -> Path | None:
+    def handle_list_checksums(cls,
+                              archive_path: Path,
+                              ) -> Iterator[tuple[MethodListItem, str | None]] | None:
+        """
+        Optional override for listing archive contents with member checksums.
+
+        Only archive formats that store checksums, e.g. zip CRC-32 values,
+        should support this, since computing them requires reading everything.
+
+        :param archive_path: path of archive file or folder
+        :return: (item, checksum or None if it is a folder) iterator or None if
+                 checksums are not available
+        """
+        return None
+
+    @classmethod
+    def handle_read(cls,
+                    archive_path: Path,
+                    ) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
         """
-        Required override for testing if an archive is handled by a particular method.
+        Optional override for reading archive members and their data as a stream.
+
+        Each member's data stream is only valid until the next member is read.
 
         :param archive_path: path of archive file or folder
-        :param assumed_type: For testing, 1=file, 2=folder, None=check physical object
-        :return: base filename or path if it is handled or None if it is not
+        :return: (member information, data stream or None if not a file) iterator
         """
         raise NotImplementedError
@@ -19,8 +19,15 @@
 Archive support for file-based cloning using rsync.
 """
 
+import os
+import stat
+import tarfile
 from pathlib import Path
-from typing import Sequence
+from typing import (
+    BinaryIO,
+    Iterator,
+    Sequence,
+)
 
 from jiig.util.filesystem import create_folder
 
@@ -30,10 +37,16 @@ from .base import (
     MethodSaveData,
     MethodSaveResult,
 )
+from .members import iterate_cached_members
 
 
 class ArchiveMethodSync(ArchiveMethodBase):
 
+    folder = True
+    source_copy = True
+    # Rsync only copies what is missing or changed in the partial folder.
+    resumable = True
+
     @classmethod
     def handle_get_name(cls,
                         archive_name: str,
@@ -60,33 +73,96 @@ class ArchiveMethodSync(ArchiveMethodBase):
         cmd_args = ['rsync', '-a', f'--include-from={save_data.source_list_path}']
         if save_data.verbose:
             cmd_args.append('-v')
+        if save_data.link_path is not None:
+            # Unchanged files are hard links to the existing archive's copies.
+            cmd_args.append(f'--link-dest={save_data.link_path.absolute()}')
+        if save_data.archive_path.is_dir():
+            # Resuming an interrupted save must drop files that are no longer saved.
+            cmd_args.extend(['--delete', '--delete-excluded'])
         cmd_args.extend([f'{save_data.source_path}/', f'{save_data.archive_path}/'])
         return MethodSaveResult(archive_path=save_data.archive_path, command_arguments=cmd_args)
 
     @classmethod
     def handle_list(cls,
                     archive_path: Path,
+                    prefix: str = None,
                     ) -> Sequence[MethodListItem]:
         """
         Required override for listing archive contents.
 
         :param archive_path: path of archive file or folder
+        :param prefix: optional member path prefix filter
         :return: sequence of item data objects, one per archived file
         """
-        raise NotImplementedError
+        return iterate_cached_members(
+            archive_path,
+            lambda list_prefix: _list_folder(archive_path, list_prefix),
+            prefix=prefix)
 
     @classmethod
-    def check_supported(cls,
-                        archive_path: Path,
-                        assumed_type: int = None,
-                        ) -> Path | None:
+    def handle_read(cls,
+                    archive_path: Path,
+                    ) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
         """
-        Required override for testing if an archive is handled by a particular method.
+        Optional override for reading archive members and their data as a stream.
 
         :param archive_path: path of archive file or folder
-        :param assumed_type: For testing, 1=file, 2=folder, None=check physical object
-        :return: base filename or path if it is handled or None if it is not
+        :return: (member information, data stream or None if not a file) iterator
         """
-        if assumed_type == 2 or (assumed_type is None and archive_path.is_dir()):
-            return archive_path
-        return None
+        return _read_folder(archive_path)
+
+
+def _list_folder(archive_path: Path, prefix: str | None) -> Iterator[MethodListItem]:
+    for folder, sub_folder_names, file_names in os.walk(archive_path):
+        relative_folder = Path(folder).relative_to(archive_path)
+        if prefix:
+            # Prune sub-folders that can not hold matching paths.
+            sub_folder_names[:] = [
+                sub_folder_name
+                for sub_folder_name in sub_folder_names
+                if _could_match(str(relative_folder / sub_folder_name), prefix)
+            ]
+        for sub_folder_name in sub_folder_names:
+            relative_path = relative_folder / sub_folder_name
+            if prefix and not str(relative_path).startswith(prefix):
+                continue
+            sub_folder_path = Path(folder, sub_folder_name)
+            yield MethodListItem(path=relative_path,
+                                 time=sub_folder_path.stat(follow_symlinks=False).st_mtime,
+                                 size=None)
+        for file_name in file_names:
+            relative_path = relative_folder / file_name
+            if prefix and not str(relative_path).startswith(prefix):
+                continue
+            file_stat = os.stat(os.path.join(folder, file_name), follow_symlinks=False)
+            yield MethodListItem(path=relative_path,
+                                 time=file_stat.st_mtime,
+                                 size=file_stat.st_size)
+
+
+def _read_folder(archive_path: Path) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
+    for folder, sub_folder_names, file_names in os.walk(archive_path):
+        sub_folder_names.sort()
+        relative_folder = Path(folder).relative_to(archive_path)
+        # Symbolic links to folders are read as links.
+        for name in sorted(sub_folder_names + file_names):
+            path = os.path.join(folder, name)
+            path_stat = os.lstat(path)
+            tar_info = tarfile.TarInfo(str(relative_folder / name))
+            tar_info.mtime = int(path_stat.st_mtime)
+            tar_info.mode = stat.S_IMODE(path_stat.st_mode)
+            if stat.S_ISLNK(path_stat.st_mode):
+                tar_info.type = tarfile.SYMTYPE
+                tar_info.linkname = os.readlink(path)
+                yield tar_info, None
+            elif stat.S_ISDIR(path_stat.st_mode):
+                tar_info.type = tarfile.DIRTYPE
+                yield tar_info, None
+            elif stat.S_ISREG(path_stat.st_mode):
+                tar_info.size = path_stat.st_size
+                with open(path, 'rb') as member_file:
+                    yield tar_info, member_file
+
+
+def _could_match(relative_path: str, prefix: str) -> bool:
+    return relative_path.startswith(prefix) or prefix.startswith(f'{relative_path}/')
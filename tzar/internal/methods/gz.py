@@ -19,21 +19,39 @@
 Support for GZ archives.
 """
 
+import tarfile
 from pathlib import Path
-from typing import Sequence
+from typing import (
+    BinaryIO,
+    Iterator,
+    Sequence,
+)
 
 from .base import (
     ArchiveMethodBase,
     MethodListItem,
     MethodSaveData,
     MethodSaveResult,
+    MethodStreamResult,
 )
 
-from .tarball import handle_tarball_save, handle_tarball_list, handle_tarball_get_name
+from .members import iterate_cached_members
+from .tarball import (
+    handle_tarball_get_name,
+    handle_tarball_list,
+    handle_tarball_read,
+    handle_tarball_save,
+    handle_tarball_stream,
+)
 
 
 class ArchiveMethodGZ(ArchiveMethodBase):
 
+    extension = '.tar.gz'
+    member_sidecar = True
+    compressors = ['pigz', 'gzip']
+    decompressors = [['pigz', '-dc'], ['gzip', '-dc']]
+
     @classmethod
     def handle_get_name(cls,
                         archive_name: str,
@@ -56,37 +74,47 @@ class ArchiveMethodGZ(ArchiveMethodBase):
         :param save_data: input parameters for save operation
         :return: save result data
         """
-        return handle_tarball_save(save_data, compressors=['pigz', 'gzip'], extension='gz')
+        return handle_tarball_save(save_data, compressors=cls.compressors, extension='gz')
+
+    @classmethod
+    def handle_stream(cls,
+                      save_data: MethodSaveData,
+                      ) -> MethodStreamResult:
+        """
+        Optional override for saving an archive from a tar stream.
+
+        :param save_data: input parameters for save operation
+        :return: stream result data
+        """
+        return handle_tarball_stream(save_data, compressors=cls.compressors, extension='gz')
 
     @classmethod
     def handle_list(cls,
                     archive_path: Path,
+                    prefix: str = None,
                     ) -> Sequence[MethodListItem]:
         """
         Required override for listing archive contents.
 
         :param archive_path: path of archive file or folder
+        :param prefix: optional member path prefix filter
         :return: sequence of item data objects, one per archived file
         """
-        return handle_tarball_list(archive_path, compression='gz')
+        return iterate_cached_members(
+            archive_path,
+            lambda list_prefix: handle_tarball_list(archive_path,
+                                                    compression='gz',
+                                                    prefix=list_prefix),
+            prefix=prefix)
 
     @classmethod
-    def check_supported(cls,
-                        archive_path: Path,
-                        assumed_type: int = None,
-                        ) -> Path | None:
+    def handle_read(cls,
+                    archive_path: Path,
+                    ) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
         """
-        Required override for testing if an archive is handled by a particular method.
+        Optional override for reading archive members and their data as a stream.
 
         :param archive_path: path of archive file or folder
-        :param assumed_type: For testing, 1=file, 2=folder, None=check physical object
-        :return: base filename or path if it is handled or None if it is not
+        :return: (member information, data stream or None if not a file) iterator
         """
-        if assumed_type is None:
-            if not archive_path.is_file():
-                return None
-        elif assumed_type != 1:
-            return None
-        if not str(archive_path).endswith('.tar.gz'):
-            return None
-        return Path(str(archive_path)[:-7])
+        return handle_tarball_read(archive_path, compression='gz')
@@ -0,0 +1,323 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive member list sidecar support.
+
+A sidecar member list allows listing an archive without reading it. It is a
+text file with a header line followed by one tab-separated
+"time<TAB>size<TAB>path" line per member. Folders have a "-" size.
+
+The header records the archive size, modification time, and inode. A sidecar
+whose key no longer matches its archive is stale, and is rebuilt the next time
+the archive is listed.
+"""
+
+import os
+import time
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    TextIO,
+)
+
+from ..delta import read_delta_manifest
+from ..metadata import get_metadata_folder
+from .base import MethodListItem
+
+MEMBERS_FOLDER_NAME = 'members'
+MEMBERS_HEADER_PREFIX = '# tzar members 2'
+# Fixed-width key fields allow the header to be rewritten in place.
+MEMBERS_KEY_FORMAT = '{:020d} {:020d} {:020d}'
+MEMBERS_UNKNOWN_KEY = (0, 0, 0)
+SIDECAR_SUFFIX = '.txt'
+TEMPORARY_SUFFIX = '.tmp'
+# Abandoned temporary files older than this are deleted by cleanup.
+TEMPORARY_MAX_AGE = 86400
+
+
+def normalize_member_path(path: str | Path) -> str:
+    """
+    Normalize member path for comparison across archive methods.
+
+    Tarballs, zip files, and synced folders differ, e.g. with "./" prefixes.
+
+    :param path: member path, e.g. "./a/b"
+    :return: normalized path, e.g. "a/b"
+    """
+    return os.path.normpath(str(path)).lstrip('/')
+
+
+def get_member_sidecar_path(archive_path: Path) -> Path:
+    """
+    Get member list sidecar path for archive.
+
+    :param archive_path: archive file or folder path
+    :return: sidecar file path
+    """
+    return (get_metadata_folder(archive_path.parent, MEMBERS_FOLDER_NAME)
+            / f'{archive_path.name}{SIDECAR_SUFFIX}')
+
+
+def get_archive_key(archive_path: Path) -> tuple[int, int, int]:
+    """
+    Get key for detecting archive changes.
+
+    :param archive_path: archive file or folder path
+    :return: (size, modification time in nanoseconds, inode) tuple
+    """
+    archive_stat = archive_path.stat()
+    return archive_stat.st_size, archive_stat.st_mtime_ns, archive_stat.st_ino
+
+
+def delete_member_sidecar(archive_path: Path):
+    """
+    Delete member list sidecar for archive, if it exists.
+
+    :param archive_path: archive file or folder path
+    """
+    get_member_sidecar_path(archive_path).unlink(missing_ok=True)
+
+
+def open_member_sidecar(archive_folder: Path) -> TextIO:
+    """
+    Open temporary member list sidecar for writing.
+
+    The header key is filled in by publish_member_sidecar().
+
+    :param archive_folder: archive folder path
+    :return: output text stream
+    """
+    members_folder = get_metadata_folder(archive_folder, MEMBERS_FOLDER_NAME)
+    members_folder.mkdir(parents=True, exist_ok=True)
+    stream = NamedTemporaryFile(prefix='.tzar_',
+                                suffix=TEMPORARY_SUFFIX,
+                                dir=members_folder,
+                                mode='w',
+                                encoding='utf-8',
+                                newline='\n',
+                                delete=False)
+    _write_header(stream, MEMBERS_UNKNOWN_KEY)
+    return stream
+
+
+def write_member(stream: TextIO,
+                 path: str | Path,
+                 time: float,
+                 size: int | None,
+                 ):
+    """
+    Write sidecar member line.
+
+    :param stream: output text stream
+    :param path: member path
+    :param time: member modification time
+    :param size: member size or None if it is a folder
+    """
+    size_string = str(size) if size is not None else '-'
+    stream.write(f'{int(time)}\t{size_string}\t{path}\n')
+
+
+def publish_member_sidecar(stream: TextIO,
+                           archive_path: Path,
+                           archive_key: tuple[int, int, int] = None,
+                           ):
+    """
+    Finish writing a temporary sidecar and move it into place.
+
+    :param stream: output text stream from open_member_sidecar()
+    :param archive_path: archive file or folder path
+    :param archive_key: archive key (default: current archive key)
+    """
+    if archive_key is None:
+        archive_key = get_archive_key(archive_path)
+    stream.seek(0)
+    _write_header(stream, archive_key)
+    stream.close()
+    os.replace(stream.name, get_member_sidecar_path(archive_path))
+
+
+def discard_member_sidecar(stream: TextIO):
+    """
+    Close and delete an unfinished temporary sidecar.
+
+    :param stream: output text stream from open_member_sidecar()
+    """
+    stream.close()
+    Path(stream.name).unlink(missing_ok=True)
+
+
+def read_member_sidecar(archive_path: Path,
+                        prefix: str = None,
+                        ) -> Iterator[MethodListItem] | None:
+    """
+    Read member list sidecar, if available and current.
+
+    :param archive_path: archive file or folder path
+    :param prefix: optional member path prefix filter
+    :return: item iterator or None if the sidecar is missing or stale
+    """
+    sidecar_path = get_member_sidecar_path(archive_path)
+    try:
+        archive_key = get_archive_key(archive_path)
+        stream = open(sidecar_path, encoding='utf-8', newline='\n')
+    except OSError:
+        return None
+    if stream.readline().rstrip('\n') != _format_header(archive_key):
+        stream.close()
+        return None
+    # Refresh the modification time so that cleanup evicts the least
+    # recently used sidecars first.
+    try:
+        os.utime(sidecar_path)
+    except OSError:
+        pass
+    return _iterate_members(stream, prefix)
+
+
+def iterate_cached_members(archive_path: Path,
+                           list_function: Callable[[str | None], Iterable[MethodListItem]],
+                           prefix: str = None,
+                           ) -> Iterator[MethodListItem]:
+    """
+    List archive members from the sidecar, or build the sidecar while listing.
+
+    A sidecar is only published when the listing runs to completion and the
+    archive did not change while it was being read. Filtered listings are not
+    cached, so that the list function can skip non-matching members cheaply.
+
+    Files saved as deltas, which are not in the archive itself, follow the
+    archive members.
+
+    :param archive_path: archive file or folder path
+    :param list_function: called with the prefix to list archive members when
+                          there is no sidecar
+    :param prefix: optional member path prefix filter
+    :return: item iterator
+    """
+    yield from _iterate_archive_members(archive_path, list_function, prefix)
+    yield from _iterate_delta_members(archive_path, prefix)
+
+
+def _iterate_archive_members(archive_path: Path,
+                             list_function: Callable[[str | None], Iterable[MethodListItem]],
+                             prefix: str | None,
+                             ) -> Iterator[MethodListItem]:
+    sidecar_items = read_member_sidecar(archive_path, prefix=prefix)
+    if sidecar_items is not None:
+        yield from sidecar_items
+        return
+    if prefix:
+        yield from list_function(prefix)
+        return
+    archive_key = get_archive_key(archive_path)
+    try:
+        stream = open_member_sidecar(archive_path.parent)
+    except OSError:
+        # E.g. a read-only archive folder. List without caching.
+        yield from list_function(None)
+        return
+    try:
+        for item in list_function(None):
+            write_member(stream, item.path, item.time, item.size)
+            yield item
+    except BaseException:
+        discard_member_sidecar(stream)
+        raise
+    if get_archive_key(archive_path) == archive_key:
+        publish_member_sidecar(stream, archive_path, archive_key=archive_key)
+    else:
+        discard_member_sidecar(stream)
+
+
+def _iterate_delta_members(archive_path: Path, prefix: str | None) -> Iterator[MethodListItem]:
+    manifest = read_delta_manifest(archive_path)
+    for path, entry in (manifest or {}).items():
+        if not prefix or path.startswith(prefix):
+            yield MethodListItem(path=Path(path),
+                                 time=entry.get('mtime', 0.0),
+                                 size=entry.get('size', 0))
+
+
+def clean_member_sidecars(archive_folder: Path,
+                          max_bytes: int = None,
+                          ):
+    """
+    Apply member list sidecar cleanup policy to an archive folder.
+
+    Deletes sidecars for archives that no longer exist and abandoned temporary
+    files. When max_bytes is specified, also deletes the least recently used
+    sidecars until the total size fits.
+
+    :param archive_folder: archive folder path
+    :param max_bytes: optional maximum total sidecar bytes
+    """
+    members_folder = get_metadata_folder(archive_folder, MEMBERS_FOLDER_NAME)
+    try:
+        entries = list(os.scandir(members_folder))
+    except FileNotFoundError:
+        return
+    oldest_temporary_time = time.time() - TEMPORARY_MAX_AGE
+    kept: list[tuple[float, int, str]] = []
+    total_bytes = 0
+    for entry in entries:
+        try:
+            entry_stat = entry.stat()
+            if entry.name.endswith(TEMPORARY_SUFFIX):
+                if entry_stat.st_mtime < oldest_temporary_time:
+                    os.remove(entry.path)
+            elif entry.name.endswith(SIDECAR_SUFFIX):
+                archive_name = entry.name[:-len(SIDECAR_SUFFIX)]
+                if not os.path.lexists(archive_folder / archive_name):
+                    os.remove(entry.path)
+                else:
+                    kept.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+                    total_bytes += entry_stat.st_size
+        except FileNotFoundError:
+            pass
+    if max_bytes is not None and total_bytes > max_bytes:
+        kept.sort()
+        for _mtime, size, path in kept:
+            if total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+def _format_header(archive_key: tuple[int, int, int]) -> str:
+    return f'{MEMBERS_HEADER_PREFIX} {MEMBERS_KEY_FORMAT.format(*archive_key)}'
+
+
+def _write_header(stream: TextIO, archive_key: tuple[int, int, int]):
+    stream.write(_format_header(archive_key))
+    stream.write('\n')
+
+
+def _iterate_members(stream: TextIO, prefix: str | None) -> Iterator[MethodListItem]:
+    with stream:
+        for line in stream:
+            time_string, size_string, path_string = line.rstrip('\n').split('\t', 2)
+            if prefix and not path_string.startswith(prefix):
+                continue
+            size = int(size_string) if size_string != '-' else None
+            yield MethodListItem(path=Path(path_string), time=float(time_string), size=size)
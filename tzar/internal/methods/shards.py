@@ -0,0 +1,351 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Support for sharded tarball archives.
+
+A shard set is a folder of independent compressed tarballs, one per shard,
+that is treated as one logical archive. Shards are created concurrently, each
+by its own tar and compression processes, from contiguous runs of the source
+file list with balanced byte totals. Shards can also be read concurrently.
+
+Shard names are keyed on their files, and completed shards are kept when a
+save is interrupted, so that the next save only creates the missing ones.
+"""
+
+import hashlib
+import os
+import queue
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Iterator,
+    Sequence,
+)
+
+from jiig.util.filesystem import (
+    choose_program_alternative,
+    create_folder,
+)
+
+from .base import (
+    ArchiveMethodBase,
+    MethodListItem,
+    MethodSaveData,
+    MethodSaveResult,
+)
+from .members import iterate_cached_members
+from .tarball import (
+    handle_tarball_list,
+    handle_tarball_read,
+)
+
+SHARDS_SUFFIX = '.shards'
+# Maximum listed items held per shard while reading shards concurrently.
+LIST_QUEUE_SIZE = 1000
+# Seconds between checks for a stopped listing while a shard's queue is full.
+LIST_QUEUE_TIMEOUT = 0.1
+
+
+def split_shard_ranges(file_sizes: Sequence[int], shard_count: int) -> list[tuple[int, int]]:
+    """
+    Split a file list into contiguous runs with balanced byte totals.
+
+    :param file_sizes: file sizes in list order
+    :param shard_count: maximum number of shards
+    :return: (start index, end index) tuples, with exclusive end indexes
+    """
+    shard_count = max(1, min(shard_count, len(file_sizes)))
+    total_bytes = sum(file_sizes)
+    ranges: list[tuple[int, int]] = []
+    start_index = 0
+    running_bytes = 0
+    for file_index, file_size in enumerate(file_sizes):
+        running_bytes += file_size
+        # Close the shard once it reaches its share of the bytes, leaving
+        # enough files for the remaining shards.
+        shard_end_bytes = total_bytes * (len(ranges) + 1) / shard_count
+        remaining_shards = shard_count - len(ranges) - 1
+        if (remaining_shards > 0
+                and (running_bytes >= shard_end_bytes
+                     or len(file_sizes) - file_index - 1 == remaining_shards)):
+            ranges.append((start_index, file_index + 1))
+            start_index = file_index + 1
+    if start_index < len(file_sizes) or not ranges:
+        ranges.append((start_index, len(file_sizes)))
+    return ranges
+
+
+class _ArchiveMethodShardsBase(ArchiveMethodBase):
+
+    folder = True
+    member_sidecar = True
+    # Completed shards are kept by interrupted saves.
+    resumable = True
+    # Tarball extension without leading '.', e.g. 'gz', set by subclasses.
+    compression: str = None
+
+    @classmethod
+    def get_compressors(cls, threads: int) -> list[str | list[str]]:
+        raise NotImplementedError
+
+    @classmethod
+    def handle_get_name(cls,
+                        archive_name: str,
+                        ) -> str:
+        """
+        Required override to isolate base archive name and strip any extension as needed.
+
+        :param archive_name: archive file name
+        :return: stripped name suitable for further parsing
+        """
+        if archive_name.endswith(cls.extension):
+            return archive_name[:-len(cls.extension)]
+        return archive_name
+
+    @classmethod
+    def handle_save(cls,
+                    save_data: MethodSaveData,
+                    ) -> MethodSaveResult:
+        """
+        Required override for saving an archive.
+
+        Produces one command per shard, to run concurrently.
+
+        :param save_data: input parameters for save operation
+        :return: save result data
+        """
+        archive_path = Path(f'{save_data.archive_path}{cls.extension}')
+        create_folder(archive_path)
+        # Relative source paths are resolved in the source folder.
+        file_sizes: list[int] = []
+        file_times: list[int] = []
+        with open(save_data.source_list_path, encoding='utf-8') as source_list_file:
+            for line in source_list_file:
+                try:
+                    file_stat = os.stat(line.rstrip('\n'), follow_symlinks=False)
+                    file_sizes.append(file_stat.st_size)
+                    file_times.append(file_stat.st_mtime_ns)
+                except OSError:
+                    file_sizes.append(0)
+                    file_times.append(0)
+        shard_count = save_data.shard_count or os.cpu_count() or 1
+        shard_ranges = split_shard_ranges(file_sizes, shard_count)
+        shard_names = get_shard_names(save_data.source_list_path,
+                                      shard_ranges,
+                                      file_sizes,
+                                      file_times,
+                                      cls.compression)
+        # Shards completed by an interrupted save are kept, and unchanged
+        # shards of an existing archive with the same name are linked.
+        shard_name_set = set(shard_names)
+        with os.scandir(archive_path) as dir_entries:
+            for dir_entry in dir_entries:
+                if dir_entry.name not in shard_name_set and dir_entry.is_file(follow_symlinks=False):
+                    os.unlink(dir_entry.path)
+        if save_data.link_path is not None:
+            for shard_name in shard_names:
+                if not (archive_path / shard_name).exists():
+                    try:
+                        os.link(save_data.link_path / shard_name, archive_path / shard_name)
+                    except OSError:
+                        pass
+        # Compression threads are divided between the concurrent shards.
+        threads = max(1, (os.cpu_count() or 1) // len(shard_ranges))
+        compression_program = choose_program_alternative(*cls.get_compressors(threads),
+                                                         required=True)
+        shard_commands: list[list[str]] = []
+        checkpoint_paths: list[tuple[Path, Path]] = []
+        for (start_index, end_index), shard_name in zip(shard_ranges, shard_names):
+            shard_path = archive_path / shard_name
+            if shard_path.exists():
+                continue
+            cmd_args = ['sed', '-n', f'{start_index + 1},{end_index}p',
+                        str(save_data.source_list_path),
+                        '|', 'tar', 'cf', '-', '-T', '-']
+            if save_data.verbose:
+                cmd_args.append('-v')
+            cmd_args.extend(['|'] + compression_program)
+            # Shards are renamed when complete, so that partial ones are not kept.
+            temporary_path = archive_path / f'.{shard_name}.tmp'
+            cmd_args.extend(['>', str(temporary_path)])
+            shard_commands.append(cmd_args)
+            checkpoint_paths.append((temporary_path, shard_path))
+        if not shard_commands:
+            # Every shard was saved by an earlier, interrupted save.
+            return MethodSaveResult(archive_path=archive_path, command_arguments=['true'])
+        return MethodSaveResult(archive_path=archive_path,
+                                command_arguments=shard_commands[0],
+                                parallel_command_arguments=shard_commands,
+                                checkpoint_paths=checkpoint_paths)
+
+    @classmethod
+    def handle_list(cls,
+                    archive_path: Path,
+                    prefix: str = None,
+                    ) -> Sequence[MethodListItem]:
+        """
+        Required override for listing archive contents.
+
+        Uses the member list sidecar, when available, or reads the shards
+        concurrently.
+
+        :param archive_path: path of archive file or folder
+        :param prefix: optional member path prefix filter
+        :return: sequence of item data objects, one per archived file
+        """
+        return iterate_cached_members(
+            archive_path,
+            lambda list_prefix: _list_shards(archive_path, cls.compression, list_prefix),
+            prefix=prefix)
+
+    @classmethod
+    def handle_read(cls,
+                    archive_path: Path,
+                    ) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
+        """
+        Optional override for reading archive members and their data as a stream.
+
+        Shards are read in shard order.
+
+        :param archive_path: path of archive file or folder
+        :return: (member information, data stream or None if not a file) iterator
+        """
+        for shard_path in get_shard_paths(archive_path, cls.compression):
+            yield from handle_tarball_read(shard_path, compression=cls.compression)
+
+
+class ArchiveMethodShardsGZ(_ArchiveMethodShardsBase):
+
+    extension = f'.tar.gz{SHARDS_SUFFIX}'
+    compression = 'gz'
+
+    @classmethod
+    def get_compressors(cls, threads: int) -> list[str | list[str]]:
+        return [['pigz', '-p', str(threads)], 'gzip']
+
+
+class ArchiveMethodShardsXZ(_ArchiveMethodShardsBase):
+
+    extension = f'.tar.xz{SHARDS_SUFFIX}'
+    compression = 'xz'
+
+    @classmethod
+    def get_compressors(cls, threads: int) -> list[str | list[str]]:
+        return [['xz', f'-T{threads}']]
+
+
+def get_shard_names(source_list_path: Path,
+                    shard_ranges: list[tuple[int, int]],
+                    file_sizes: Sequence[int],
+                    file_times: Sequence[int],
+                    compression: str,
+                    ) -> list[str]:
+    """
+    Get shard file names, keyed on the shard's files, sizes, and modification times.
+
+    A shard with the same name as an existing one holds the same files.
+
+    :param source_list_path: source file list path
+    :param shard_ranges: (start index, end index) tuples from split_shard_ranges()
+    :param file_sizes: file sizes in list order
+    :param file_times: file modification times in nanoseconds, in list order
+    :param compression: tarball compression, e.g. 'gz'
+    :return: shard file names, in shard order
+    """
+    shard_names: list[str] = []
+    with open(source_list_path, encoding='utf-8') as source_list_file:
+        for shard_index, (start_index, end_index) in enumerate(shard_ranges):
+            digest = hashlib.sha1()
+            for file_index in range(start_index, end_index):
+                path = source_list_file.readline().rstrip('\n')
+                digest.update(f'{path}\t{file_sizes[file_index]}'
+                              f'\t{file_times[file_index]}\n'.encode())
+            shard_names.append(f'{shard_index:03d}-{digest.hexdigest()[:16]}.tar.{compression}')
+    return shard_names
+
+
+def get_shard_paths(archive_path: Path, compression: str) -> list[Path]:
+    """
+    Get shard paths of a shard set, in shard order.
+
+    :param archive_path: shard set folder path
+    :param compression: tarball compression, e.g. 'gz'
+    :return: shard paths
+    """
+    return sorted(archive_path.glob(f'*.tar.{compression}'))
+
+
+def _list_shards(archive_path: Path,
+                 compression: str,
+                 prefix: str | None,
+                 ) -> Iterator[MethodListItem]:
+    shard_paths = get_shard_paths(archive_path, compression)
+    if not shard_paths:
+        return
+    # Shards are read concurrently, and yielded in shard order. Bounded queues
+    # keep memory use from growing with the number of members in a shard.
+    item_queues = [queue.Queue(maxsize=LIST_QUEUE_SIZE) for _shard_path in shard_paths]
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(shard_paths)) as executor:
+        futures = [executor.submit(_queue_shard_items,
+                                   shard_path,
+                                   compression,
+                                   prefix,
+                                   item_queue,
+                                   stop_event)
+                   for shard_path, item_queue in zip(shard_paths, item_queues)]
+        try:
+            for future, item_queue in zip(futures, item_queues):
+                while (item := item_queue.get()) is not None:
+                    yield item
+                # Raises the shard's read error, if any.
+                future.result()
+        finally:
+            # Releases workers when the listing fails or is not read to the end.
+            stop_event.set()
+
+
+def _queue_shard_items(shard_path: Path,
+                       compression: str,
+                       prefix: str | None,
+                       item_queue: queue.Queue,
+                       stop_event: threading.Event,
+                       ):
+    try:
+        for item in handle_tarball_list(shard_path, compression=compression, prefix=prefix):
+            if not _put_queue_item(item_queue, item, stop_event):
+                return
+    finally:
+        # None marks the end of the shard's items.
+        _put_queue_item(item_queue, None, stop_event)
+
+
+def _put_queue_item(item_queue: queue.Queue,
+                    item: MethodListItem | None,
+                    stop_event: threading.Event,
+                    ) -> bool:
+    while not stop_event.is_set():
+        try:
+            item_queue.put(item, timeout=LIST_QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
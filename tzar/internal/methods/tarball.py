@@ -21,20 +21,23 @@ Tarball archive general support.
 
 import tarfile
 from pathlib import Path
-from typing import Sequence
+from typing import (
+    BinaryIO,
+    Iterator,
+)
 
 from jiig.util.filesystem import choose_program_alternative
-from jiig.util.collections import make_list
 
 from .base import (
     MethodListItem,
     MethodSaveData,
     MethodSaveResult,
+    MethodStreamResult,
 )
 
 
 def handle_tarball_save(save_data: MethodSaveData,
-                        compressors: list[str] | str = None,
+                        compressors: list[str | list[str]] = None,
                         extension: str = None,
                         ) -> MethodSaveResult:
     """
@@ -48,11 +51,10 @@ def handle_tarball_save(save_data: MethodSaveData,
     cmd_args = ['tar', f'cf', '-', '-T', str(save_data.source_list_path)]
     if save_data.verbose:
         cmd_args.append('-v')
-    # choose_program_alternative() returns a command argument list.
+    # choose_program_alternative() returns a command argument list. Alternatives
+    # with arguments are lists, and must not be converted to strings.
     if compressors:
-        compression_program = choose_program_alternative(
-            *make_list(compressors, strings=True),
-            required=True)
+        compression_program = choose_program_alternative(*compressors, required=True)
         cmd_args.extend(['|'] + compression_program)
     if save_data.pv_progress:
         # Create a pipeline with "pv" for progress reporting.
@@ -65,23 +67,67 @@ def handle_tarball_save(save_data: MethodSaveData,
     return MethodSaveResult(archive_path=Path(archive_path), command_arguments=cmd_args)
 
 
+def handle_tarball_stream(save_data: MethodSaveData,
+                          compressors: list[str | list[str]],
+                          extension: str,
+                          ) -> MethodStreamResult:
+    """
+    Build compression command arguments for saving a tarball from a tar stream.
+
+    :param save_data: specification data for saving tarball archive
+    :param compressors: compression programs, with optional arguments when it's a sequence
+    :param extension: extension without leading '.' appended to ".tar"
+    :return: stream result data
+    """
+    compression_program = choose_program_alternative(*compressors, required=True)
+    return MethodStreamResult(archive_path=Path(f'{save_data.archive_path}.tar.{extension}'),
+                              compressor_arguments=compression_program)
+
+
 def handle_tarball_list(archive_path: Path,
-                        compression: str = None
-                        ) -> Sequence[MethodListItem]:
+                        compression: str = None,
+                        prefix: str = None,
+                        ) -> Iterator[MethodListItem]:
     """
     Implementation to list tarball contents.
 
+    Reads the tarball as a stream, one member at a time, and discards each
+    member after it is yielded, so that memory use does not grow with the
+    number of members.
+
     :param archive_path: archive tarball file path
     :param compression: optional compression specification, e.g. 'gz'
-    :return: sequence of archive items
+    :param prefix: optional member path prefix filter
+    :return: archive item iterator
     """
-    mode = f'r:{compression}' if compression else 'r'
+    mode = f'r|{compression}' if compression else 'r|'
     with tarfile.open(archive_path, mode=mode) as tar_file:
-        for info in tar_file.getmembers():
+        while (info := tar_file.next()) is not None:
+            # TarFile keeps every member it reads unless they are discarded.
+            tar_file.members.clear()
+            if prefix and not info.name.startswith(prefix):
+                continue
             file_size = info.size if not info.isdir() else None
             yield MethodListItem(path=Path(info.name), time=info.mtime, size=file_size)
 
 
+def handle_tarball_read(archive_path: Path,
+                        compression: str = None,
+                        ) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
+    """
+    Implementation to read tarball members and their data as a stream.
+
+    :param archive_path: archive tarball file path
+    :param compression: optional compression specification, e.g. 'gz'
+    :return: (member information, data stream or None if not a file) iterator
+    """
+    mode = f'r|{compression}' if compression else 'r|'
+    with tarfile.open(archive_path, mode=mode) as tar_file:
+        while (info := tar_file.next()) is not None:
+            tar_file.members.clear()
+            yield info, tar_file.extractfile(info) if info.isfile() else None
+
+
 def handle_tarball_get_name(archive_name: str,
                             extension: str = None,
                             ) -> str:
@@ -19,10 +19,15 @@
 Support for Zip archives.
 """
 
+import tarfile
 import zipfile
 from pathlib import Path
 from time import mktime
-from typing import Sequence
+from typing import (
+    BinaryIO,
+    Iterator,
+    Sequence,
+)
 
 from .base import (
     ArchiveMethodBase,
@@ -30,10 +35,14 @@ from .base import (
     MethodSaveData,
     MethodSaveResult,
 )
+from .members import iterate_cached_members
 
 
 class ArchiveMethodZip(ArchiveMethodBase):
 
+    extension = '.zip'
+    member_sidecar = True
+
     @classmethod
     def handle_get_name(cls,
                         archive_name: str,
@@ -70,36 +79,78 @@ class ArchiveMethodZip(ArchiveMethodBase):
     @classmethod
     def handle_list(cls,
                     archive_path: Path,
+                    prefix: str = None,
                     ) -> Sequence[MethodListItem]:
         """
         Required override for listing archive contents.
 
         :param archive_path: path of archive file or folder
+        :param prefix: optional member path prefix filter
         :return: sequence of archive items
         """
-        with zipfile.ZipFile(archive_path, compression=zipfile.ZIP_DEFLATED) as zip_file:
-            for info in zip_file.infolist():
-                file_size = info.file_size if not info.is_dir() else None
-                file_time = mktime(info.date_time + (0, 0, -1))
-                yield MethodListItem(path=Path(info.filename), time=file_time, size=file_size)
+        return iterate_cached_members(
+            archive_path,
+            lambda list_prefix: _list_zip(archive_path, list_prefix),
+            prefix=prefix)
 
     @classmethod
-    def check_supported(cls,
-                        archive_path: Path,
-                        assumed_type: int = None,
-                        ) -> Path | None:
+    def handle_list_checksums(cls,
+                              archive_path: Path,
+                              ) -> Iterator[tuple[MethodListItem, str | None]] | None:
+        """
+        Optional override for listing archive contents with member checksums.
+
+        :param archive_path: path of archive file or folder
+        :return: (item, CRC-32 checksum or None if it is a folder) iterator
+        """
+        return _list_zip_checksums(archive_path)
+
+    @classmethod
+    def handle_read(cls,
+                    archive_path: Path,
+                    ) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
         """
-        Required override for testing if an archive is handled by a particular method.
+        Optional override for reading archive members and their data as a stream.
 
         :param archive_path: path of archive file or folder
-        :param assumed_type: For testing, 1=file, 2=folder, None=check physical object
-        :return: base filename or path if it is handled or None if it is not
+        :return: (member information, data stream or None if not a file) iterator
         """
-        if assumed_type is None:
-            if not archive_path.is_file():
-                return None
-        elif assumed_type != 1:
-            return None
-        if not str(archive_path).endswith('.zip'):
-            return None
-        return Path(str(archive_path)[:-4])
+        return _read_zip(archive_path)
+
+
+def _list_zip(archive_path: Path, prefix: str | None) -> Iterator[MethodListItem]:
+    with zipfile.ZipFile(archive_path, compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for info in zip_file.infolist():
+            if prefix and not info.filename.startswith(prefix):
+                continue
+            yield _get_list_item(info)
+
+
+def _list_zip_checksums(archive_path: Path) -> Iterator[tuple[MethodListItem, str | None]]:
+    with zipfile.ZipFile(archive_path) as zip_file:
+        for info in zip_file.infolist():
+            yield _get_list_item(info), f'{info.CRC:08x}' if not info.is_dir() else None
+
+
+def _get_list_item(info: zipfile.ZipInfo) -> MethodListItem:
+    file_size = info.file_size if not info.is_dir() else None
+    file_time = mktime(info.date_time + (0, 0, -1))
+    return MethodListItem(path=Path(info.filename), time=file_time, size=file_size)
+
+
+def _read_zip(archive_path: Path) -> Iterator[tuple[tarfile.TarInfo, BinaryIO | None]]:
+    with zipfile.ZipFile(archive_path) as zip_file:
+        for info in zip_file.infolist():
+            tar_info = tarfile.TarInfo(info.filename.rstrip('/'))
+            tar_info.mtime = int(mktime(info.date_time + (0, 0, -1)))
+            # Unix permissions are in the high bits, when present.
+            mode = (info.external_attr >> 16) & 0o7777
+            if info.is_dir():
+                tar_info.type = tarfile.DIRTYPE
+                tar_info.mode = mode or 0o755
+                yield tar_info, None
+            else:
+                tar_info.size = info.file_size
+                tar_info.mode = mode or 0o644
+                with zip_file.open(info) as member_file:
+                    yield tar_info, member_file
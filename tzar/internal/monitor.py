@@ -0,0 +1,248 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Live archive folder catalogs.
+
+A live catalog is loaded once, and then kept current in memory from folder
+change events, rather than by rescanning. Queries are answered from memory,
+and the persistent catalog index can be rewritten after each change, so that
+other tzar commands need not rescan either.
+"""
+
+from pathlib import Path
+from typing import (
+    Callable,
+    Iterable,
+)
+
+from jiig import Runtime
+
+from .archive import (
+    DiscoveredArchive,
+    get_timestamp_matcher,
+)
+from .catalog import (
+    CatalogQueryIndex,
+    discover_archives,
+    find_archive_folders,
+)
+from .database import record_archive_changes
+from .index import CatalogIndex
+from .metadata import is_metadata_name
+from .watch import (
+    FolderWatcher,
+    WatchEvent,
+    read_settled_events,
+)
+
+
+class LiveCatalog:
+    """Archive folder catalog kept current from folder change events."""
+
+    def __init__(self, archive_folder: Path, timestamp_format: str):
+        """
+        Live catalog constructor.
+
+        :param archive_folder: archive folder path
+        :param timestamp_format: timestamp format used to parse archive names
+        """
+        self.archive_folder = archive_folder
+        self.timestamp_format = timestamp_format
+        self.timestamp_matcher = get_timestamp_matcher(timestamp_format)
+        self.archives: dict[str, DiscoveredArchive] = {}
+        self._query_indexes: dict[str, CatalogQueryIndex] = {}
+        self.rescan()
+
+    def rescan(self):
+        """Reload all archives, using the persistent index when current."""
+        self.archives = {
+            archive.path.name: archive
+            for archive in discover_archives(self.archive_folder, self.timestamp_format)
+        }
+        self._query_indexes.clear()
+
+    def apply_events(self, events: Iterable[WatchEvent]) -> tuple[list[str], list[str]]:
+        """
+        Update archives from folder change events.
+
+        :param events: folder change events for the archive folder
+        :return: (updated archive names, removed archive names)
+        """
+        names: set[str] = set()
+        for event in events:
+            if event.name is None:
+                old_archives = self.archives
+                self.rescan()
+                return ([name for name in self.archives.keys()],
+                        [name for name in old_archives.keys() if name not in self.archives])
+            if not is_metadata_name(event.name):
+                names.add(event.name)
+        updated_names: list[str] = []
+        removed_names: list[str] = []
+        for name in names:
+            try:
+                archive = DiscoveredArchive.get(self.archive_folder / name,
+                                                self.timestamp_matcher)
+            except (OSError, ValueError):
+                archive = None
+            if archive is not None:
+                self.archives[name] = archive
+                updated_names.append(name)
+            elif self.archives.pop(name, None) is not None:
+                removed_names.append(name)
+        if updated_names or removed_names:
+            self._query_indexes.clear()
+        return updated_names, removed_names
+
+    def get_query_index(self, source_name: str) -> CatalogQueryIndex:
+        """
+        Get query index for a source, building it as needed.
+
+        :param source_name: source name
+        :return: query index
+        """
+        query_index = self._query_indexes.get(source_name)
+        if query_index is None:
+            query_index = CatalogQueryIndex.from_archives(list(self.archives.values()),
+                                                          source_name)
+            self._query_indexes[source_name] = query_index
+        return query_index
+
+    def save_index(self, folder_mtime_ns: int):
+        """
+        Save the persistent catalog index.
+
+        :param folder_mtime_ns: archive folder modification time from before
+                                applying the events, so that the index is out
+                                of date if more changes followed
+        """
+        catalog_index = CatalogIndex(self.archive_folder,
+                                     self.timestamp_format,
+                                     folder_mtime_ns=folder_mtime_ns)
+        for name, archive in self.archives.items():
+            catalog_index.entries[name] = archive.get_index_entry()
+        catalog_index.save()
+
+    def record_changes(self,
+                       runtime: Runtime,
+                       updated_names: list[str],
+                       removed_names: list[str],
+                       ):
+        """
+        Record changed archives in the catalog database.
+
+        :param runtime: Jiig runtime API.
+        :param updated_names: updated archive names
+        :param removed_names: removed archive names
+        """
+        record_archive_changes(runtime,
+                               self.archive_folder,
+                               [self.archives[name].get_index_entry(with_size=True)
+                                for name in updated_names
+                                if name in self.archives],
+                               [self.archive_folder / name for name in removed_names])
+
+
+def run_live_catalogs(runtime: Runtime,
+                      live_catalogs: Iterable[LiveCatalog],
+                      watcher: FolderWatcher,
+                      on_change: Callable[[LiveCatalog], None] = None,
+                      record_database: bool = True,
+                      root_folder: Path = None,
+                      ):
+    """
+    Keep live catalogs current until interrupted.
+
+    Persistent catalog indexes are rewritten after each change, and changes are
+    optionally recorded in the catalog database.
+
+    With a root folder, it and the folders below it that are not archive
+    folders are watched too, so that archive folders created later, e.g. by the
+    first save of a new source, get live catalogs. Removed archive folders are
+    picked up again if they are created again.
+
+    :param runtime: Jiig runtime API.
+    :param live_catalogs: live catalogs to keep current
+    :param watcher: folder watcher
+    :param on_change: optional function called with each changed live catalog
+    :param record_database: record changes in the catalog database if True
+    :param root_folder: optional root folder to watch for new archive folders
+    """
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    live_catalogs_by_folder: dict[Path, LiveCatalog] = {}
+    searched_folders: set[Path] = set()
+
+    def _search_folder(folder: Path):
+        new_searched_folders: list[Path] = []
+        for archive_folder in find_archive_folders(folder, new_searched_folders):
+            if archive_folder in live_catalogs_by_folder:
+                continue
+            searched_folders.discard(archive_folder)
+            # Watch before loading, so that changes made meanwhile are not missed.
+            if not watcher.add_folder(archive_folder):
+                continue
+            live_catalog = LiveCatalog(archive_folder, timestamp_format)
+            live_catalogs_by_folder[archive_folder] = live_catalog
+            if record_database:
+                live_catalog.record_changes(runtime, list(live_catalog.archives.keys()), [])
+            if on_change is not None:
+                on_change(live_catalog)
+        for searched_folder in new_searched_folders:
+            if searched_folder not in searched_folders and watcher.add_folder(searched_folder):
+                searched_folders.add(searched_folder)
+
+    for live_catalog in live_catalogs:
+        if watcher.add_folder(live_catalog.archive_folder):
+            live_catalogs_by_folder[live_catalog.archive_folder] = live_catalog
+    if root_folder is not None and watcher.add_folder(root_folder):
+        searched_folders.add(root_folder)
+        _search_folder(root_folder)
+    while live_catalogs_by_folder or searched_folders:
+        events_by_folder: dict[Path, list[WatchEvent]] = {}
+        for event in read_settled_events(watcher):
+            events_by_folder.setdefault(event.folder, []).append(event)
+        for folder, events in events_by_folder.items():
+            folder_removed = any(event.name is None and event.removed for event in events)
+            if folder in searched_folders:
+                if folder_removed:
+                    watcher.remove_folder(folder)
+                    searched_folders.discard(folder)
+                else:
+                    _search_folder(folder)
+                continue
+            live_catalog = live_catalogs_by_folder.get(folder)
+            if live_catalog is None:
+                continue
+            if folder_removed:
+                watcher.remove_folder(folder)
+                del live_catalogs_by_folder[folder]
+                if record_database:
+                    live_catalog.record_changes(runtime, [], list(live_catalog.archives.keys()))
+                continue
+            try:
+                folder_mtime_ns = folder.stat().st_mtime_ns
+            except OSError:
+                continue
+            updated_names, removed_names = live_catalog.apply_events(events)
+            if not updated_names and not removed_names:
+                continue
+            live_catalog.save_index(folder_mtime_ns)
+            if record_database:
+                live_catalog.record_changes(runtime, updated_names, removed_names)
+            if on_change is not None:
+                on_change(live_catalog)
@@ -0,0 +1,284 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive name parsing.
+
+Archive names are "SOURCE_TIMESTAMP_TAGS", where the timestamp and tags are
+optional. Parsers are meant to be used for a batch of names, e.g. a catalog
+listing. Each name is split by one compiled expression per timestamp format,
+and local time is only converted once per distinct date, apart from days with
+time zone or daylight savings changes, which are converted once per hour.
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable
+
+DEFAULT_TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S'
+
+
+@dataclass(slots=True)
+class ArchiveNameData:
+    source_name: str
+    time_stamp: float | None
+    tags: list[str]
+
+
+@lru_cache(maxsize=None)
+def get_timestamp_matcher(timestamp_format: str) -> re.Pattern:
+    """Produce compiled regular expression for parsing timestamp strings.
+
+    Compiled expressions are cached per format.
+
+    :param timestamp_format: timestamp format string
+    :return: compiled regular expression for parsing timestamps
+    """
+    return re.compile(
+        timestamp_format.replace(
+            '%Y', r'(?P<year>\d\d\d\d)').replace(
+            '%y', r'(?P<year>\d\d)').replace(
+            '%m', r'(?P<month>\d\d)').replace(
+            '%d', r'(?P<day>\d\d)').replace(
+            '%H', r'(?P<hours>\d\d)').replace(
+            '%M', r'(?P<minutes>\d\d)').replace(
+            '%S', r'(?P<seconds>\d\d)')
+    )
+
+
+# Timestamp groups, as produced by get_timestamp_matcher().
+_DATE_GROUPS = ('year', 'month', 'day')
+_CLOCK_GROUPS = ('hours', 'minutes', 'seconds')
+# Conversion of a date or clock time that does not match the default format.
+_INVALID = (None, 0, 0, 0)
+
+
+@lru_cache(maxsize=None)
+def _get_name_matcher(timestamp_pattern: str) -> re.Pattern:
+    # The timestamp is a prefix of the text between the first two underscores,
+    # and otherwise that text is part of the tags.
+    if '_' in timestamp_pattern:
+        # Never matches, since the timestamp text has no underscores.
+        timestamp_pattern = '(?!)'
+    return re.compile(rf'(?P<source>[^_]*)'
+                      rf'(?:_(?:(?P<timestamp>{timestamp_pattern})[^_]*'
+                      rf'(?:_(?P<timestamp_tags>.*))?'
+                      rf'|(?P<tags>.*)))?\Z',
+                      re.DOTALL)
+
+
+class ArchiveNameParser:
+    """Archive name parser for a batch of names."""
+
+    def __init__(self, timestamp_matcher: re.Pattern):
+        """
+        Archive name parser constructor.
+
+        :param timestamp_matcher: regular expression for parsing name timestamps
+        """
+        self.timestamp_matcher = timestamp_matcher
+        self.name_matcher = _get_name_matcher(timestamp_matcher.pattern)
+        self.current_time = time.localtime()
+        # Missing groups are filled in from the current time.
+        self._date_groups = [group for group in _DATE_GROUPS
+                             if group in timestamp_matcher.groupindex]
+        self._clock_groups = [group for group in _CLOCK_GROUPS
+                              if group in timestamp_matcher.groupindex]
+        self.fast_path = (timestamp_matcher.pattern
+                          == get_timestamp_matcher(DEFAULT_TIMESTAMP_FORMAT).pattern)
+        # Dates and clock times, keyed by their text, are converted once.
+        self._days: dict[str | tuple[str, ...], tuple[float | None, int, int, int]] = {}
+        self._clocks: dict[str | tuple[str, ...], tuple[int | None, int, int, int]] = {}
+        self._hour_time_stamps: dict[tuple[int, int, int, int], float] = {}
+        self._tags: dict[str, list[str]] = {'': []}
+
+    def parse(self, archive_name: str) -> ArchiveNameData:
+        """
+        Parse archive name, without extension.
+
+        :param archive_name: archive name
+        :return: parsed name data
+        """
+        return self.parse_names([archive_name])[0]
+
+    def parse_names(self, archive_names: Iterable[str]) -> list[ArchiveNameData]:
+        """
+        Parse a batch of archive names, without extensions.
+
+        :param archive_names: archive names
+        :return: parsed name data, in name order
+        """
+        if self.fast_path:
+            return self._parse_default_names(archive_names)
+        return [self._parse_matched_name(archive_name) for archive_name in archive_names]
+
+    def _parse_default_names(self, archive_names: Iterable[str]) -> list[ArchiveNameData]:
+        # Equivalent to matching the default format regular expression, but
+        # with slicing, and inline, since it is the common case.
+        get_day = self._days.get
+        get_clock = self._clocks.get
+        get_tags = self._tags.get
+        results: list[ArchiveNameData] = []
+        for archive_name in archive_names:
+            source_name, separator, timestamped_text = archive_name.partition('_')
+            if not separator:
+                results.append(ArchiveNameData(archive_name, None, []))
+                continue
+            timestamp_text, separator, raw_tags = timestamped_text.partition('_')
+            # Short or malformed dates and clock times are converted to _INVALID.
+            day = get_day(timestamp_text[:9])
+            if day is None:
+                day = self._make_default_day(timestamp_text[:9])
+            clock = get_clock(timestamp_text[9:15])
+            if clock is None:
+                clock = self._make_default_clock(timestamp_text[9:15])
+            if day[0] is not None and clock[0] is not None:
+                time_stamp = day[0] + clock[0]
+            elif day is _INVALID or clock is _INVALID:
+                time_stamp = None
+                raw_tags = timestamped_text
+            else:
+                time_stamp = self._get_time_stamp(day, clock)
+            tags = get_tags(raw_tags)
+            if tags is None:
+                tags = self._parse_tags(raw_tags)
+            results.append(ArchiveNameData(source_name, time_stamp, tags))
+        return results
+
+    def _parse_matched_name(self, archive_name: str) -> ArchiveNameData:
+        name_matched = self.name_matcher.match(archive_name)
+        source_name, timestamp_text, timestamp_tags, raw_tags = name_matched.group(
+            'source', 'timestamp', 'timestamp_tags', 'tags')
+        if timestamp_text is None:
+            return ArchiveNameData(source_name, None, self._parse_tags(raw_tags or ''))
+        date_key = name_matched.group(*self._date_groups) if self._date_groups else ''
+        day = self._days.get(date_key)
+        if day is None:
+            day = self._make_day(date_key, name_matched)
+        clock_key = name_matched.group(*self._clock_groups) if self._clock_groups else ''
+        clock = self._clocks.get(clock_key)
+        if clock is None:
+            clock = self._make_clock(clock_key, name_matched)
+        return ArchiveNameData(source_name,
+                               self._get_time_stamp(day, clock),
+                               self._parse_tags(timestamp_tags or ''))
+
+    def _get_time_stamp(self,
+                        day: tuple[float | None, int, int, int],
+                        clock: tuple[int | None, int, int, int],
+                        ) -> float:
+        day_time_stamp, year, month, day_of_month = day
+        day_seconds, hours, minutes, seconds = clock
+        if day_time_stamp is not None and day_seconds is not None:
+            return day_time_stamp + day_seconds
+        hour_key = (year, month, day_of_month, hours)
+        hour_time_stamp = self._hour_time_stamps.get(hour_key)
+        if hour_time_stamp is None:
+            # Time zone and daylight savings changes happen on hour boundaries.
+            hour_time_stamp = time.mktime((year, month, day_of_month, hours, 0, 0, 0, 0, -1))
+            self._hour_time_stamps[hour_key] = hour_time_stamp
+        return hour_time_stamp + minutes * 60 + seconds
+
+    def _make_default_day(self, date_key: str) -> tuple[float | None, int, int, int]:
+        # The key is the date and the following separator, e.g. "20230101-".
+        if len(date_key) != 9 or date_key[8] != '-' or not date_key[:8].isdecimal():
+            self._days[date_key] = _INVALID
+            return _INVALID
+        return self._convert_day(date_key,
+                                 int(date_key[:4]),
+                                 int(date_key[4:6]),
+                                 int(date_key[6:8]))
+
+    def _make_default_clock(self, clock_key: str) -> tuple[int | None, int, int, int]:
+        if len(clock_key) != 6 or not clock_key.isdecimal():
+            self._clocks[clock_key] = _INVALID
+            return _INVALID
+        return self._convert_clock(clock_key,
+                                   int(clock_key[:2]),
+                                   int(clock_key[2:4]),
+                                   int(clock_key[4:]))
+
+    def _make_day(self,
+                  date_key: str | tuple[str, ...],
+                  name_matched: re.Match,
+                  ) -> tuple[float | None, int, int, int]:
+        current_time = self.current_time
+        year = int(name_matched.group('year')) if 'year' in self._date_groups \
+            else current_time.tm_year
+        if year < 100:
+            year += (current_time.tm_year % 100) * 100
+        month = int(name_matched.group('month')) if 'month' in self._date_groups \
+            else current_time.tm_mon
+        day_of_month = int(name_matched.group('day')) if 'day' in self._date_groups \
+            else current_time.tm_mday
+        return self._convert_day(date_key, year, month, day_of_month)
+
+    def _convert_day(self,
+                     date_key: str | tuple[str, ...],
+                     year: int,
+                     month: int,
+                     day_of_month: int,
+                     ) -> tuple[float | None, int, int, int]:
+        # Times in a day with a constant offset from UTC are offsets from midnight.
+        # Other days, e.g. with daylight savings changes, are converted per hour.
+        start_time_stamp = time.mktime((year, month, day_of_month, 0, 0, 0, 0, 0, -1))
+        end_time_stamp = time.mktime((year, month, day_of_month + 1, 0, 0, 0, 0, 0, -1))
+        start_time = time.localtime(start_time_stamp)
+        day_time_stamp: float | None = None
+        if (end_time_stamp - start_time_stamp == 86400
+                and start_time.tm_hour == 0
+                and start_time.tm_gmtoff == time.localtime(end_time_stamp - 1).tm_gmtoff):
+            day_time_stamp = start_time_stamp
+        day = (day_time_stamp, year, month, day_of_month)
+        self._days[date_key] = day
+        return day
+
+    def _make_clock(self,
+                    clock_key: str | tuple[str, ...],
+                    name_matched: re.Match,
+                    ) -> tuple[int | None, int, int, int]:
+        current_time = self.current_time
+        hours = int(name_matched.group('hours')) if 'hours' in self._clock_groups \
+            else current_time.tm_hour
+        minutes = int(name_matched.group('minutes')) if 'minutes' in self._clock_groups \
+            else current_time.tm_min
+        seconds = int(name_matched.group('seconds')) if 'seconds' in self._clock_groups \
+            else current_time.tm_sec
+        return self._convert_clock(clock_key, hours, minutes, seconds)
+
+    def _convert_clock(self,
+                       clock_key: str | tuple[str, ...],
+                       hours: int,
+                       minutes: int,
+                       seconds: int,
+                       ) -> tuple[int | None, int, int, int]:
+        # Out of range hours fall into another day, and are converted per hour.
+        day_seconds = hours * 3600 + minutes * 60 + seconds if hours < 24 else None
+        clock = (day_seconds, hours, minutes, seconds)
+        self._clocks[clock_key] = clock
+        return clock
+
+    def _parse_tags(self, raw_tags: str) -> list[str]:
+        tags = self._tags.get(raw_tags)
+        if tags is None:
+            # Handles both comma and underscore-separated tags.
+            tags = sorted(set(tag for tag in raw_tags.replace('_', ',').split(',')
+                              if tag.isalnum()))
+            self._tags[raw_tags] = tags
+        return tags
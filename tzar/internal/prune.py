@@ -0,0 +1,324 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Prune planning.
+
+A prune plan records which catalog archives are kept and which are deleted.
+Plans are built from a single catalog scan, using either the interval filter or
+a retention policy, optionally followed by size budgets. They can be displayed,
+saved as JSON for review, and applied later.
+"""
+
+import json
+import os
+from dataclasses import (
+    dataclass,
+    field,
+)
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import (
+    Collection,
+    Iterator,
+    Self,
+)
+
+from jiig import Runtime
+from jiig.util.log import (
+    abort,
+    log_warning,
+)
+from jiig.util.text.human_units import format_human_byte_count
+
+from .archive import (
+    CatalogSpec,
+    get_delta_base_names,
+)
+from .catalog import (
+    CatalogItem,
+    filter_catalog_intervals,
+    format_catalog_table,
+    list_catalog,
+)
+from .database import record_deleted_archives
+from .delta import list_delta_archive_names
+from .index import (
+    changing_archive_folder,
+    updating_catalog_index,
+)
+from .retention import (
+    RetentionPolicy,
+    apply_retention_policy,
+    apply_size_budget,
+)
+from .trash import move_to_trash
+
+PRUNE_PLAN_VERSION = 1
+
+
+@dataclass
+class PrunePlan:
+    """Archives to keep and delete for one archive folder."""
+    archive_folder: Path
+    source_name: str
+    # All candidate items, sorted by descending time.
+    items: list[CatalogItem]
+    delete_names: set[str]
+    # Reasons for keeping archives, e.g. the retention rules, by archive name.
+    keep_reasons: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def deleted_items(self) -> list[CatalogItem]:
+        return [item for item in self.items if item.path.name in self.delete_names]
+
+    @property
+    def kept_items(self) -> list[CatalogItem]:
+        return [item for item in self.items if item.path.name not in self.delete_names]
+
+    def format_lines(self, unit_format: str = 'b') -> Iterator[str]:
+        """
+        Format plan as a catalog table with flagged deletions and keep reasons.
+
+        :param unit_format: 'b' for KiB/MiB/... or 'd' for KB/MB/... (default: 'b')
+        :return: text line iterator
+        """
+        flag_texts: dict[str, str] = {}
+        for item in self.items:
+            if item.path.name in self.delete_names:
+                flag_texts[item.display_name] = '*purge*'
+            else:
+                reason = self.keep_reasons.get(item.path.name)
+                if reason:
+                    flag_texts[item.display_name] = f'(keep: {reason})'
+        return format_catalog_table(self.items, unit_format=unit_format, flag_texts=flag_texts)
+
+    def get_data(self) -> dict:
+        """
+        Produce plan data for saving.
+
+        :return: plan data dictionary
+        """
+        archives: list[dict] = []
+        for item in self.items:
+            item_data = item.get_data()
+            if item.path.name in self.delete_names:
+                item_data['action'] = 'delete'
+            else:
+                item_data['action'] = 'keep'
+                item_data['reason'] = self.keep_reasons.get(item.path.name)
+            archives.append(item_data)
+        return {
+            'version': PRUNE_PLAN_VERSION,
+            'archive_folder': str(self.archive_folder),
+            'source_name': self.source_name,
+            'archives': archives,
+        }
+
+    def save(self, plan_path: Path):
+        """
+        Save plan as JSON, replacing any existing file atomically.
+
+        :param plan_path: plan file path
+        """
+        try:
+            with NamedTemporaryFile(prefix='.tzar_',
+                                    suffix='.tmp',
+                                    dir=plan_path.parent,
+                                    mode='w',
+                                    encoding='utf-8',
+                                    delete=False) as temp_file:
+                json.dump(self.get_data(), temp_file, indent=2)
+            os.replace(temp_file.name, plan_path)
+        except OSError as exc:
+            abort('Failed to save prune plan.', plan_path, exc)
+
+    @classmethod
+    def load(cls, plan_path: Path) -> Self:
+        """
+        Load plan saved as JSON.
+
+        Archive paths are rebuilt from the archive folder and names, so that a
+        plan can not delete anything outside of its archive folder.
+
+        :param plan_path: plan file path
+        :return: plan
+        """
+        try:
+            with open(plan_path, encoding='utf-8') as plan_file:
+                data = json.load(plan_file)
+            if data['version'] != PRUNE_PLAN_VERSION:
+                abort('Unsupported prune plan version.', plan_path)
+            archive_folder = Path(data['archive_folder'])
+            items: list[CatalogItem] = []
+            delete_names: set[str] = set()
+            keep_reasons: dict[str, str] = {}
+            for item_data in data['archives']:
+                name = item_data['name']
+                if not name or os.sep in name or name in ('.', '..'):
+                    abort('Bad archive name in prune plan.', plan_path, name)
+                items.append(CatalogItem(path=archive_folder / name,
+                                         method_name=item_data['method'],
+                                         tags=list(item_data['tags']),
+                                         size=int(item_data['size']),
+                                         time=float(item_data['time'])))
+                if item_data['action'] == 'delete':
+                    delete_names.add(name)
+                elif item_data.get('reason'):
+                    keep_reasons[name] = item_data['reason']
+            items.sort(key=lambda x: x.time, reverse=True)
+            return cls(archive_folder, data['source_name'], items, delete_names, keep_reasons)
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            abort('Failed to load prune plan.', plan_path, exc)
+
+
+def plan_prune(runtime: Runtime,
+               catalog_spec: CatalogSpec,
+               date_min: float = None,
+               date_max: float = None,
+               age_min: float = None,
+               age_max: float = None,
+               interval_min: float = None,
+               interval_max: float = None,
+               tags: Collection[str] = None,
+               retention_policy: RetentionPolicy = None,
+               max_total_size: int = None,
+               max_tag_sizes: dict[str, int] = None,
+               ) -> PrunePlan:
+    """
+    Plan pruning based on a single catalog scan.
+
+    Archives selected by the date, age, and tag filters are candidates. If an
+    active retention policy is provided, the ones it does not keep are deleted.
+    Otherwise, the ones removed by the interval filter are deleted.
+
+    Archives that kept archives' deltas are based on are always kept, with a
+    "delta base" reason.
+
+    Size budgets are then applied to the remaining archives, first to the ones
+    with each budgeted tag, and then to all of them. Delta bases and archives
+    with deltas are never deleted to fit a budget, but their sizes count. A
+    warning reports by how much a budget can not be met.
+
+    :param runtime: Jiig runtime API.
+    :param catalog_spec: source folder, archive folder, and source name
+    :param date_min: timestamp based on minimum date
+    :param date_max: timestamp based on maximum date
+    :param age_min: timestamp based on minimum age
+    :param age_max: timestamp based on maximum age
+    :param interval_min: minimum seconds between archive saves (ignored if smaller)
+    :param interval_max: maximum seconds between archive saves (ignored if larger)
+    :param tags: optional tags for filtering catalog archives (all are required)
+    :param retention_policy: optional retention policy, replaces the interval filter
+    :param max_total_size: optional maximum total bytes for kept archives
+    :param max_tag_sizes: optional maximum total bytes for kept archives by tag
+    :return: prune plan
+    """
+    items = list_catalog(runtime,
+                         catalog_spec,
+                         date_min=date_min,
+                         date_max=date_max,
+                         age_min=age_min,
+                         age_max=age_max,
+                         tags=tags)
+    if retention_policy is not None and retention_policy.is_active:
+        keep_reasons = apply_retention_policy(items, retention_policy)
+    else:
+        kept_items = filter_catalog_intervals(items,
+                                              interval_min=interval_min,
+                                              interval_max=interval_max)
+        keep_reasons = {item.path.name: 'interval' for item in kept_items}
+        if items:
+            keep_reasons[items[0].path.name] = 'newest'
+    delete_names = set(item.path.name for item in items if item.path.name not in keep_reasons)
+    # Deleting an archive that kept archives' deltas are based on would make
+    # their files impossible to restore.
+    delta_base_names = get_delta_base_names(catalog_spec.archive_folder, delete_names)
+    for name in delta_base_names & delete_names:
+        delete_names.remove(name)
+        keep_reasons[name] = 'delta base'
+    if max_total_size is not None or max_tag_sizes:
+        # Delta bases and archives with deltas count towards budgets, but are
+        # not deleted to fit them.
+        fixed_names = delta_base_names.union(list_delta_archive_names(catalog_spec.archive_folder))
+        budgets: list[tuple[str | None, int]] = list((max_tag_sizes or {}).items())
+        if max_total_size is not None:
+            budgets.append((None, max_total_size))
+        for budget_tag, budget_size in budgets:
+            budget_items: list[CatalogItem] = []
+            fixed_size = 0
+            for item in items:
+                if (item.path.name not in delete_names
+                        and (budget_tag is None or budget_tag in item.tags)):
+                    if item.path.name in fixed_names:
+                        fixed_size += item.get_size()
+                    else:
+                        budget_items.append(item)
+            kept_size = fixed_size + sum(item.get_size() for item in budget_items)
+            for item in apply_size_budget(budget_items, max(budget_size - fixed_size, 0)):
+                delete_names.add(item.path.name)
+                keep_reasons.pop(item.path.name, None)
+                kept_size -= item.get_size()
+            if kept_size > budget_size:
+                budget_label = f'"{budget_tag}" tag' if budget_tag is not None else 'total'
+                log_warning(f'The {budget_label} size budget can not be met. Kept archives'
+                            f' exceed it by {format_human_byte_count(kept_size - budget_size)}.')
+    return PrunePlan(catalog_spec.archive_folder,
+                     catalog_spec.source_name,
+                     items,
+                     delete_names,
+                     keep_reasons)
+
+
+def apply_prune_plan(runtime: Runtime,
+                     plan: PrunePlan,
+                     ) -> list[CatalogItem]:
+    """
+    Delete the archives a plan marks for deletion.
+
+    Archives are moved to the archive folder trash, which is quick, and left
+    there for empty_trash() to remove, e.g. at the start of the next prune, so
+    that this returns without waiting for their files to be unlinked. Archives that no longer exist, e.g. when
+    applying an old saved plan, and archives that kept archives' deltas are
+    based on, are skipped with a warning.
+
+    :param runtime: Jiig runtime API.
+    :param plan: prune plan
+    :return: deleted catalog items
+    """
+    deleted_items: list[CatalogItem] = []
+    # Saved plans may predate deltas that are based on their deleted archives.
+    delta_base_names = get_delta_base_names(plan.archive_folder, plan.delete_names)
+    with updating_catalog_index(plan.archive_folder,
+                                str(runtime.get_param('timestamp_format')),
+                                ) as catalog_index:
+        for item in plan.deleted_items:
+            if not os.path.lexists(item.path):
+                log_warning('Planned archive deletion is missing.', item.path)
+                continue
+            if item.path.name in delta_base_names:
+                log_warning('Planned archive deletion is skipped, since kept archives'
+                            ' have deltas based on it.', item.path)
+                continue
+            runtime.message(f'Deleting: {item.display_name}')
+            with changing_archive_folder(catalog_index):
+                move_to_trash(item.path)
+            deleted_items.append(item)
+            if catalog_index is not None:
+                catalog_index.entries.pop(item.path.name, None)
+    record_deleted_archives(runtime, [item.path for item in deleted_items])
+    return deleted_items
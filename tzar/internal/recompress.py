@@ -0,0 +1,307 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive recompression.
+
+Tarball archives are transcoded to another compression method as a stream,
+piping a decompression process into a compression process, without extracting
+any files. Multiple archives are transcoded concurrently, with an optional
+shared limit on the stream rate, so that recompression can run alongside other
+work. Archive names keep their source name, timestamp, and tags, and only the
+extension changes, so that archives keep their place in the catalog.
+"""
+
+import os
+import subprocess
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from jiig import Runtime
+from jiig.util.filesystem import (
+    choose_program_alternative,
+    short_path,
+)
+from jiig.util.log import (
+    log_error,
+    log_message,
+)
+
+from .archive import (
+    METHOD_MAP,
+    PARTIAL_FOLDER_NAME,
+    DiscoveredArchive,
+    delete_archive,
+    get_timestamp_matcher,
+)
+from .catalog import CatalogItem
+from .database import record_archive_changes
+from .delta import rename_delta_sidecar
+from .fingerprint import (
+    read_archive_fingerprint,
+    record_archive_fingerprint,
+)
+from .index import (
+    CatalogIndexEntry,
+    changing_archive_folder,
+    updating_catalog_index,
+)
+from .metadata import get_metadata_folder
+from .methods.members import (
+    open_member_sidecar,
+    publish_member_sidecar,
+    read_member_sidecar,
+    write_member,
+)
+from .throttle import Throttle
+
+DEFAULT_RECOMPRESS_WORKERS = 2
+RECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
+
+def can_recompress(method_name: str, target_method_name: str) -> bool:
+    """
+    Check if archives can be recompressed from one method to another.
+
+    :param method_name: current archive method name
+    :param target_method_name: new archive method name
+    :return: True if both are different single-file tarball methods
+    """
+    method_cls = METHOD_MAP.get(method_name)
+    target_method_cls = METHOD_MAP.get(target_method_name)
+    return (method_cls is not None
+            and target_method_cls is not None
+            and method_name != target_method_name
+            and not method_cls.folder
+            and not target_method_cls.folder
+            and bool(method_cls.decompressors)
+            and bool(target_method_cls.compressors))
+
+
+def get_recompressed_path(archive_path: Path,
+                          method_name: str,
+                          target_method_name: str,
+                          ) -> Path:
+    """
+    Get archive path after recompression.
+
+    :param archive_path: archive file path
+    :param method_name: current archive method name
+    :param target_method_name: new archive method name
+    :return: new archive file path, with the same name and a new extension
+    """
+    archive_name = METHOD_MAP[method_name].handle_get_name(archive_path.name)
+    return archive_path.parent / f'{archive_name}{METHOD_MAP[target_method_name].extension}'
+
+
+def recompress_archive(archive_path: Path,
+                       new_path: Path,
+                       decompressor_arguments: list[str],
+                       compressor_arguments: list[str],
+                       throttle: Throttle = None,
+                       ) -> Path:
+    """
+    Transcode an archive to a new path, and delete the original.
+
+    The new archive is written to a hidden temporary file in the metadata
+    folder, and only linked to its final name once both programs succeed. It
+    keeps the original file time, along with the member list, fingerprint, and
+    deltas sidecars.
+
+    :param archive_path: archive file path
+    :param new_path: new archive file path
+    :param decompressor_arguments: decompression program command arguments
+    :param compressor_arguments: compression program command arguments
+    :param throttle: optional limit on uncompressed bytes per second
+    :return: new archive file path
+    :raise OSError: if recompression fails
+    """
+    temp_path = transcode_archive(archive_path,
+                                  decompressor_arguments,
+                                  compressor_arguments,
+                                  throttle=throttle)
+    publish_recompressed_archive(archive_path, temp_path, new_path)
+    return new_path
+
+
+def transcode_archive(archive_path: Path,
+                      decompressor_arguments: list[str],
+                      compressor_arguments: list[str],
+                      throttle: Throttle = None,
+                      ) -> Path:
+    """
+    Transcode an archive to a temporary file in the metadata folder.
+
+    Leaves the archive folder unchanged, so that it can run concurrently with
+    other recompressions, and its catalog index is only updated when the
+    result is published.
+
+    :param archive_path: archive file path
+    :param decompressor_arguments: decompression program command arguments
+    :param compressor_arguments: compression program command arguments
+    :param throttle: optional limit on uncompressed bytes per second
+    :return: temporary file path, with the original file time
+    :raise OSError: if transcoding fails
+    """
+    archive_stat = archive_path.stat()
+    partial_folder = get_metadata_folder(archive_path.parent, PARTIAL_FOLDER_NAME)
+    partial_folder.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(prefix='.tzar_',
+                            suffix='.tmp',
+                            dir=partial_folder,
+                            delete=False) as temp_file:
+        try:
+            with open(archive_path, 'rb') as archive_file:
+                decompress_process = subprocess.Popen(decompressor_arguments,
+                                                      stdin=archive_file,
+                                                      stdout=subprocess.PIPE)
+                compress_process = subprocess.Popen(compressor_arguments,
+                                                    stdin=subprocess.PIPE,
+                                                    stdout=temp_file)
+                try:
+                    while chunk := decompress_process.stdout.read(RECOMPRESS_CHUNK_SIZE):
+                        if throttle is not None:
+                            throttle.acquire(len(chunk))
+                        compress_process.stdin.write(chunk)
+                except BrokenPipeError:
+                    pass
+                finally:
+                    decompress_process.stdout.close()
+                    try:
+                        compress_process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                decompress_code = decompress_process.wait()
+                compress_code = compress_process.wait()
+            if decompress_code != 0:
+                raise OSError(f'Decompression failed with exit code {decompress_code}.')
+            if compress_code != 0:
+                raise OSError(f'Compression failed with exit code {compress_code}.')
+            os.fsync(temp_file.fileno())
+            os.utime(temp_file.name, ns=(archive_stat.st_atime_ns, archive_stat.st_mtime_ns))
+        except OSError:
+            os.unlink(temp_file.name)
+            raise
+    return Path(temp_file.name)
+
+
+def publish_recompressed_archive(archive_path: Path, temp_path: Path, new_path: Path):
+    """
+    Replace an archive with its transcoded version, along with its sidecars.
+
+    The temporary file is removed, whether or not publishing succeeds.
+
+    :param archive_path: archive file path
+    :param temp_path: transcoded temporary file path
+    :param new_path: new archive file path
+    :raise OSError: if the new archive can't be published
+    """
+    try:
+        # Linking fails, rather than replacing, if the new name is taken.
+        os.link(temp_path, new_path)
+    finally:
+        os.unlink(temp_path)
+    members = read_member_sidecar(archive_path)
+    if members is not None:
+        members_file = open_member_sidecar(new_path.parent)
+        for member in members:
+            write_member(members_file, member.path, member.time, member.size)
+        publish_member_sidecar(members_file, new_path)
+    fingerprint = read_archive_fingerprint(archive_path)
+    if fingerprint is not None:
+        record_archive_fingerprint(new_path, fingerprint)
+    rename_delta_sidecar(archive_path, new_path)
+    delete_archive(archive_path)
+
+
+def recompress_archives(runtime: Runtime,
+                        archive_folder: Path,
+                        items: list[CatalogItem],
+                        target_method_name: str,
+                        max_workers: int = None,
+                        rate_limit: float = None,
+                        ) -> int:
+    """
+    Recompress catalog archives concurrently.
+
+    Updates the catalog index and database as archives are replaced. Failures
+    are reported, and leave the original archives in place.
+
+    :param runtime: Jiig runtime API.
+    :param archive_folder: archive folder path
+    :param items: catalog items for archives to recompress
+    :param target_method_name: new archive method name
+    :param max_workers: maximum number of concurrent recompressions
+                        (default: DEFAULT_RECOMPRESS_WORKERS)
+    :param rate_limit: optional maximum uncompressed bytes per second, shared
+                       by all recompressions
+    :return: number of recompressed archives
+    """
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    timestamp_matcher = get_timestamp_matcher(timestamp_format)
+    # Alternatives with arguments are lists, and must not be converted to strings.
+    compressor_arguments = choose_program_alternative(
+        *METHOD_MAP[target_method_name].compressors,
+        required=True)
+    decompressor_arguments_by_method: dict[str, list[str]] = {}
+    for item in items:
+        if item.method_name not in decompressor_arguments_by_method:
+            decompressor_arguments_by_method[item.method_name] = choose_program_alternative(
+                *METHOD_MAP[item.method_name].decompressors,
+                required=True)
+    throttle = Throttle(rate_limit) if rate_limit else None
+    saved_entries: list[CatalogIndexEntry] = []
+    removed_paths: list[Path] = []
+    with ThreadPoolExecutor(max_workers=max_workers or DEFAULT_RECOMPRESS_WORKERS) as executor:
+        futures: dict[Future, CatalogItem] = {
+            executor.submit(transcode_archive,
+                            item.path,
+                            decompressor_arguments_by_method[item.method_name],
+                            compressor_arguments,
+                            throttle): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            new_path = get_recompressed_path(item.path, item.method_name, target_method_name)
+            try:
+                temp_path = future.result()
+                # The catalog index is updated per replacement, since other
+                # commands may change the archive folder during recompression.
+                with updating_catalog_index(archive_folder, timestamp_format) as catalog_index:
+                    with changing_archive_folder(catalog_index):
+                        publish_recompressed_archive(item.path, temp_path, new_path)
+                    new_archive = DiscoveredArchive.get(new_path, timestamp_matcher)
+                    if new_archive is not None:
+                        new_entry = new_archive.get_index_entry(with_size=True)
+                        saved_entries.append(new_entry)
+                        if catalog_index is not None:
+                            catalog_index.entries.pop(item.path.name, None)
+                            catalog_index.entries[new_entry.name] = new_entry
+            except OSError as exc:
+                log_error('Failed to recompress archive.', item.path, exc)
+                continue
+            log_message(f'Recompressed: {short_path(item.path)} -> {new_path.name}'
+                        f' ({item.get_size()} -> {new_path.stat().st_size} bytes)')
+            removed_paths.append(item.path)
+    record_archive_changes(runtime, archive_folder, saved_entries, removed_paths)
+    return len(removed_paths)
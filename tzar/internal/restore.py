@@ -0,0 +1,117 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Single file restore.
+
+Restores one file from an archive as a stream, without extracting anything
+else. Files saved as deltas are rebuilt from the chain of archives holding
+their earlier versions.
+"""
+
+import os
+import shutil
+from pathlib import Path
+from re import Pattern
+from tempfile import TemporaryDirectory
+
+from jiig import Runtime
+from jiig.util.log import abort
+
+from .archive import (
+    DiscoveredArchive,
+    find_delta_base_archive,
+    get_timestamp_matcher,
+)
+from .delta import (
+    apply_delta,
+    get_delta_sidecar_path,
+    read_delta_manifest,
+)
+from .methods.members import normalize_member_path
+
+
+def restore_file(runtime: Runtime,
+                 archive_path: Path,
+                 member_path: str,
+                 output_path: Path,
+                 ):
+    """
+    Restore one file from an archive.
+
+    :param runtime: Jiig runtime API.
+    :param archive_path: archive file or folder path
+    :param member_path: file path in the archive, relative to the source folder
+    :param output_path: output file path, which must not exist
+    """
+    if os.path.lexists(output_path):
+        abort('Output file already exists.', output_path)
+    timestamp_matcher = get_timestamp_matcher(str(runtime.get_param('timestamp_format')))
+    member_name = normalize_member_path(member_path)
+    try:
+        _restore(archive_path, member_name, output_path, timestamp_matcher, set())
+    except OSError as exc:
+        output_path.unlink(missing_ok=True)
+        abort('Failed to restore file.', exc)
+
+
+def _restore(archive_path: Path,
+             member_name: str,
+             output_path: Path,
+             timestamp_matcher: Pattern,
+             visited_paths: set[Path],
+             ):
+    if archive_path in visited_paths:
+        raise OSError(f'Delta chain loops back to: {archive_path}')
+    visited_paths.add(archive_path)
+    manifest = read_delta_manifest(archive_path)
+    entry = manifest.get(member_name) if manifest is not None else None
+    if entry is None:
+        _extract_member(archive_path, member_name, output_path, timestamp_matcher)
+        return
+    base_path = find_delta_base_archive(archive_path.parent, entry['base'])
+    if base_path is None:
+        raise OSError(f'Base archive is missing: {archive_path.parent / entry["base"]}')
+    if entry['delta'] is None:
+        # Unchanged since the base archive.
+        _restore(base_path, member_name, output_path, timestamp_matcher, visited_paths)
+        return
+    with TemporaryDirectory(prefix='.tzar_', dir=output_path.parent) as temp_folder:
+        base_file_path = Path(temp_folder) / 'base'
+        _restore(base_path, member_name, base_file_path, timestamp_matcher, visited_paths)
+        apply_delta(base_file_path,
+                    get_delta_sidecar_path(archive_path) / entry['delta'],
+                    output_path)
+
+
+def _extract_member(archive_path: Path,
+                    member_name: str,
+                    output_path: Path,
+                    timestamp_matcher: Pattern,
+                    ):
+    archive = DiscoveredArchive.get(archive_path, timestamp_matcher)
+    if archive is None:
+        raise OSError(f'Unsupported archive: {archive_path}')
+    for info, member_file in archive.method_cls.handle_read(archive_path):
+        if normalize_member_path(info.name) == member_name:
+            if member_file is None:
+                raise OSError(f'Archive member is not a file: {member_name}')
+            with open(output_path, 'xb') as output_file:
+                shutil.copyfileobj(member_file, output_file)
+            os.utime(output_path, (info.mtime, info.mtime))
+            return
+    raise OSError(f'File not found in archive: {archive_path}: {member_name}')
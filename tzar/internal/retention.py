@@ -0,0 +1,191 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Retention policies.
+
+Grandfather-father-son policy rules keep the newest archive of each of the most
+recent N periods (hours, days, ...) that have archives. The "last" rule keeps
+the N newest archives. Archives that no rule keeps are deleted.
+
+Size budgets delete archives until the total size fits, preferring to delete
+large archives that are close in time to their neighbours, in order to keep a
+spread of archives over time.
+"""
+
+import heapq
+import re
+from dataclasses import (
+    dataclass,
+    fields,
+)
+from datetime import datetime
+from typing import (
+    Callable,
+    Hashable,
+    Sequence,
+)
+
+from .catalog import CatalogItem
+
+# Period key functions for periodic rules, in the order reasons are listed.
+RETENTION_PERIOD_KEYS: dict[str, Callable[[datetime], Hashable]] = {
+    'hourly': lambda dt: (dt.year, dt.month, dt.day, dt.hour),
+    'daily': lambda dt: (dt.year, dt.month, dt.day),
+    'weekly': lambda dt: dt.isocalendar()[:2],
+    'monthly': lambda dt: (dt.year, dt.month),
+    'yearly': lambda dt: dt.year,
+}
+
+SIZE_MULTIPLIERS = {
+    '': 1,
+    'K': 1024,
+    'M': 1024 ** 2,
+    'G': 1024 ** 3,
+    'T': 1024 ** 4,
+    'P': 1024 ** 5,
+}
+SIZE_REGEX = re.compile(r'^\s*(\d+(?:\.\d*)?)\s*([KMGTP]?)(iB|B)?\s*$', re.IGNORECASE)
+
+
+@dataclass
+class RetentionPolicy:
+    """Number of archives or periods to keep for each rule."""
+    last: int | None = None
+    hourly: int | None = None
+    daily: int | None = None
+    weekly: int | None = None
+    monthly: int | None = None
+    yearly: int | None = None
+
+    @property
+    def is_active(self) -> bool:
+        return any(getattr(self, field.name) for field in fields(self))
+
+
+def apply_retention_policy(items: Sequence[CatalogItem],
+                           policy: RetentionPolicy,
+                           ) -> dict[str, str]:
+    """
+    Determine which catalog items a retention policy keeps.
+
+    Runs in O(n) over items that are already sorted, plus one local time
+    conversion per item.
+
+    :param items: catalog items, sorted by descending time
+    :param policy: retention policy
+    :return: comma-separated names of the keeping rules by kept archive name
+    """
+    kept_rules: dict[str, list[str]] = {}
+
+    def _keep(item_to_keep: CatalogItem, rule_name: str):
+        kept_rules.setdefault(item_to_keep.path.name, []).append(rule_name)
+
+    if policy.last:
+        for item in items[:policy.last]:
+            _keep(item, 'last')
+    item_times = [datetime.fromtimestamp(item.time) for item in items]
+    for rule_name, period_key_function in RETENTION_PERIOD_KEYS.items():
+        period_count = getattr(policy, rule_name)
+        if not period_count:
+            continue
+        previous_period_key: Hashable | None = None
+        kept_count = 0
+        for item, item_time in zip(items, item_times):
+            period_key = period_key_function(item_time)
+            # Items are newest first, so the first item of a period is its newest.
+            if period_key != previous_period_key:
+                previous_period_key = period_key
+                _keep(item, rule_name)
+                kept_count += 1
+                if kept_count >= period_count:
+                    break
+    return {name: ','.join(rule_names) for name, rule_names in kept_rules.items()}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse human-readable byte size.
+
+    Single letter units, e.g. "500G", and "iB" units, e.g. "500GiB", are binary
+    (1024-based). "B" units, e.g. "500GB", are decimal (1000-based).
+
+    :param text: size text
+    :return: size in bytes
+    :raise ValueError: if the size is not valid
+    """
+    matched = SIZE_REGEX.match(text)
+    if not matched:
+        raise ValueError(f'Bad size "{text}".')
+    number_text, unit_text, suffix_text = matched.groups()
+    multiplier = SIZE_MULTIPLIERS[unit_text.upper()]
+    if unit_text and suffix_text and suffix_text.upper() == 'B':
+        multiplier = 1000 ** list(SIZE_MULTIPLIERS.keys()).index(unit_text.upper())
+    return int(float(number_text) * multiplier)
+
+
+def apply_size_budget(items: Sequence[CatalogItem],
+                      max_size: int,
+                      ) -> list[CatalogItem]:
+    """
+    Choose catalog items to delete in order to fit a size budget.
+
+    The newest item is always kept, even if it alone exceeds the budget.
+    Deleting an item merges the time gaps on either side of it. Items are
+    deleted in order of the merged gap divided by the item size, so that
+    large items in densely-saved periods go first. Runs in O(n log n), using
+    a heap with lazily-invalidated entries.
+
+    :param items: catalog items, sorted by descending time
+    :param max_size: maximum total size in bytes
+    :return: items to delete, sorted by descending time
+    """
+    total_size = sum(item.get_size() for item in items)
+    if total_size <= max_size or len(items) < 2:
+        return []
+    # Doubly-linked list of kept items, with None marking the list ends.
+    newer_idx: list[int | None] = [None] + list(range(len(items) - 1))
+    older_idx: list[int | None] = list(range(1, len(items))) + [None]
+    versions = [0] * len(items)
+
+    def _get_cost(item_idx: int) -> float:
+        older = older_idx[item_idx]
+        oldest_time = items[older].time if older is not None else items[item_idx].time
+        return (items[newer_idx[item_idx]].time - oldest_time) / max(items[item_idx].get_size(), 1)
+
+    heap = [(_get_cost(item_idx), 0, item_idx) for item_idx in range(1, len(items))]
+    heapq.heapify(heap)
+    deleted_indexes: list[int] = []
+    while total_size > max_size and heap:
+        _cost, version, item_idx = heapq.heappop(heap)
+        if version != versions[item_idx]:
+            continue
+        deleted_indexes.append(item_idx)
+        total_size -= items[item_idx].get_size()
+        newer, older = newer_idx[item_idx], older_idx[item_idx]
+        older_idx[newer] = older
+        if older is not None:
+            newer_idx[older] = newer
+        # Deleted items are invalidated, and neighbour costs change.
+        versions[item_idx] = -1
+        for neighbour_idx in (newer, older):
+            if neighbour_idx is not None and neighbour_idx != 0:
+                versions[neighbour_idx] += 1
+                heapq.heappush(heap, (_get_cost(neighbour_idx),
+                                      versions[neighbour_idx],
+                                      neighbour_idx))
+    return [items[item_idx] for item_idx in sorted(deleted_indexes)]
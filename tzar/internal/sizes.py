@@ -0,0 +1,200 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Folder archive size sidecars.
+
+A folder's own size is only its directory inode size, so folder archive sizes
+are totals of the archived file sizes. Totals are recorded in a sidecar when
+the archive is saved, or computed by a parallel walk when missing or out of
+date. Sidecars are keyed on the archive folder modification time.
+
+Files with multiple hard links, e.g. ones shared with other snapshots, are
+counted separately, since deleting the archive does not free their space.
+"""
+
+import os
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from .metadata import get_metadata_folder
+
+SIZES_FOLDER_NAME = 'sizes'
+SIZE_SIDECAR_SUFFIX = '.txt'
+SIZE_SIDECAR_VERSION = 1
+SIZE_WALK_WORKERS = 8
+
+
+@dataclass(slots=True)
+class FolderSize:
+    """Folder archive size totals."""
+    # Total bytes and files, including linked ones.
+    total_bytes: int = 0
+    total_files: int = 0
+    # Bytes and files with multiple hard links, counted once each.
+    linked_bytes: int = 0
+    linked_files: int = 0
+
+
+def get_size_sidecar_path(archive_path: Path) -> Path:
+    """
+    Get folder archive size sidecar path.
+
+    :param archive_path: archive folder path
+    :return: sidecar path
+    """
+    return (get_metadata_folder(archive_path.parent, SIZES_FOLDER_NAME)
+            / f'{archive_path.name}{SIZE_SIDECAR_SUFFIX}')
+
+
+def delete_size_sidecar(archive_path: Path):
+    """
+    Delete folder archive size sidecar, if present.
+
+    :param archive_path: archive folder path
+    """
+    try:
+        os.unlink(get_size_sidecar_path(archive_path))
+    except FileNotFoundError:
+        pass
+
+
+def record_folder_size(archive_path: Path,
+                       folder_size: FolderSize,
+                       folder_mtime_ns: int = None,
+                       ):
+    """
+    Record folder archive size in a sidecar.
+
+    Failures are ignored, since the size can be recomputed.
+
+    :param archive_path: archive folder path
+    :param folder_size: size totals
+    :param folder_mtime_ns: archive folder modification time (default: current)
+    """
+    sidecar_path = get_size_sidecar_path(archive_path)
+    try:
+        if folder_mtime_ns is None:
+            folder_mtime_ns = archive_path.stat().st_mtime_ns
+        sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(prefix='.tzar_',
+                                suffix='.tmp',
+                                dir=sidecar_path.parent,
+                                mode='w',
+                                encoding='utf-8',
+                                delete=False) as temp_file:
+            temp_file.write(f'# tzar size {SIZE_SIDECAR_VERSION} {folder_mtime_ns}\n')
+            temp_file.write(f'{folder_size.total_bytes} {folder_size.total_files}'
+                            f' {folder_size.linked_bytes} {folder_size.linked_files}\n')
+        os.replace(temp_file.name, sidecar_path)
+    except OSError:
+        pass
+
+
+def read_folder_size(archive_path: Path, folder_mtime_ns: int) -> FolderSize | None:
+    """
+    Read folder archive size sidecar.
+
+    :param archive_path: archive folder path
+    :param folder_mtime_ns: current archive folder modification time
+    :return: size totals or None if the sidecar is missing or out of date
+    """
+    try:
+        with open(get_size_sidecar_path(archive_path), encoding='utf-8') as sidecar_file:
+            header_fields = sidecar_file.readline().split()
+            if (header_fields[:3] != ['#', 'tzar', 'size']
+                    or int(header_fields[3]) != SIZE_SIDECAR_VERSION
+                    or int(header_fields[4]) != folder_mtime_ns):
+                return None
+            return FolderSize(*(int(field) for field in sidecar_file.readline().split()))
+    except (OSError, ValueError, IndexError, TypeError):
+        return None
+
+
+def get_folder_size(archive_path: Path, folder_mtime_ns: int) -> FolderSize:
+    """
+    Get folder archive size, using the sidecar when current.
+
+    Walks the folder and records a new sidecar otherwise.
+
+    :param archive_path: archive folder path
+    :param folder_mtime_ns: current archive folder modification time
+    :return: size totals
+    """
+    folder_size = read_folder_size(archive_path, folder_mtime_ns)
+    if folder_size is None:
+        folder_size = walk_folder_size(archive_path)
+        record_folder_size(archive_path, folder_size, folder_mtime_ns=folder_mtime_ns)
+    return folder_size
+
+
+def walk_folder_size(folder: Path, max_workers: int = None) -> FolderSize:
+    """
+    Compute folder size totals by scanning sub-folders in parallel.
+
+    :param folder: folder path
+    :param max_workers: maximum number of threads (default: SIZE_WALK_WORKERS)
+    :return: size totals
+    """
+    folder_size = FolderSize()
+    linked_inodes: set[tuple[int, int]] = set()
+    with ThreadPoolExecutor(max_workers=max_workers or SIZE_WALK_WORKERS) as executor:
+        pending: set[Future] = {executor.submit(_scan_folder, str(folder))}
+        while pending:
+            done, pending = wait(pending, return_when='FIRST_COMPLETED')
+            for future in done:
+                sub_folders, file_stats = future.result()
+                for sub_folder in sub_folders:
+                    pending.add(executor.submit(_scan_folder, sub_folder))
+                for file_stat in file_stats:
+                    folder_size.total_bytes += file_stat.st_size
+                    folder_size.total_files += 1
+                    if file_stat.st_nlink > 1:
+                        inode_key = (file_stat.st_dev, file_stat.st_ino)
+                        if inode_key in linked_inodes:
+                            # Repeated links within the folder are only counted once.
+                            folder_size.total_bytes -= file_stat.st_size
+                            folder_size.total_files -= 1
+                        else:
+                            linked_inodes.add(inode_key)
+                            folder_size.linked_bytes += file_stat.st_size
+                            folder_size.linked_files += 1
+    return folder_size
+
+
+def _scan_folder(folder: str) -> tuple[list[str], list[os.stat_result]]:
+    sub_folders: list[str] = []
+    file_stats: list[os.stat_result] = []
+    try:
+        with os.scandir(folder) as dir_entries:
+            for dir_entry in dir_entries:
+                try:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        sub_folders.append(dir_entry.path)
+                    else:
+                        file_stats.append(dir_entry.stat(follow_symlinks=False))
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return sub_folders, file_stats
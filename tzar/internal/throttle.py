@@ -0,0 +1,49 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Rate limiting shared by worker threads."""
+
+import threading
+import time
+
+
+class Throttle:
+    """Limits the rate of work units, e.g. files or bytes, across threads."""
+
+    def __init__(self, rate_limit: float):
+        """
+        Throttle constructor.
+
+        :param rate_limit: maximum number of units per second
+        """
+        self.interval = 1.0 / rate_limit
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count: int):
+        """
+        Wait until a number of units may be processed.
+
+        :param count: number of units
+        """
+        # Reserve a time slot for the units, and sleep until it starts.
+        with self.lock:
+            start_time = max(self.next_time, time.monotonic())
+            self.next_time = start_time + count * self.interval
+        delay = start_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
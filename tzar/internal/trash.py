@@ -0,0 +1,180 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive folder trash for bulk deletion.
+
+Archives are deleted by first renaming them into a hidden trash folder, which
+is atomic and instant, since it is on the same file system. Trash contents are
+then removed by a pool of worker threads. Trash left behind by an interrupted
+deletion is removed the next time the trash is emptied.
+"""
+
+import os
+import time
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+
+from jiig.util.log import log_warning
+
+from .delta import delete_delta_sidecar
+from .fingerprint import delete_fingerprint_sidecar
+from .metadata import get_metadata_folder
+from .methods.members import delete_member_sidecar
+from .sizes import delete_size_sidecar
+from .throttle import Throttle
+
+TRASH_FOLDER_NAME = 'trash'
+DEFAULT_DELETE_WORKERS = 8
+# Files per unlink task, and pending tasks per worker before waiting.
+UNLINK_BATCH_SIZE = 256
+UNLINK_QUEUE_DEPTH = 4
+
+
+def move_to_trash(archive_path: Path) -> Path:
+    """
+    Move archive file or folder to the archive folder trash.
+
+    Also deletes the archive member list, size, fingerprint, and deltas sidecars.
+
+    :param archive_path: archive file or folder path
+    :return: trash path
+    """
+    trash_folder = get_metadata_folder(archive_path.parent, TRASH_FOLDER_NAME)
+    trash_folder.mkdir(parents=True, exist_ok=True)
+    # Names are made unique, in case an archive with the same name was trashed before.
+    trash_path = trash_folder / f'{archive_path.name}.{time.time_ns()}'
+    os.rename(archive_path, trash_path)
+    delete_member_sidecar(archive_path)
+    delete_size_sidecar(archive_path)
+    delete_fingerprint_sidecar(archive_path)
+    delete_delta_sidecar(archive_path)
+    return trash_path
+
+
+def has_trash(archive_folder: Path) -> bool:
+    """
+    Check if an archive folder has trash to remove.
+
+    :param archive_folder: archive folder path
+    :return: True if the trash folder is not empty
+    """
+    try:
+        with os.scandir(get_metadata_folder(archive_folder, TRASH_FOLDER_NAME)) as dir_entries:
+            return next(dir_entries, None) is not None
+    except OSError:
+        return False
+
+
+def empty_trash(archive_folder: Path,
+                max_workers: int = None,
+                rate_limit: float = None,
+                ) -> int:
+    """
+    Remove everything in the archive folder trash.
+
+    :param archive_folder: archive folder path
+    :param max_workers: maximum number of worker threads (default: DEFAULT_DELETE_WORKERS)
+    :param rate_limit: optional maximum number of files to unlink per second
+    :return: number of trash entries removed
+    """
+    trash_folder = get_metadata_folder(archive_folder, TRASH_FOLDER_NAME)
+    try:
+        with os.scandir(trash_folder) as dir_entries:
+            trash_paths = [(dir_entry.path, dir_entry.is_dir(follow_symlinks=False))
+                           for dir_entry in dir_entries]
+    except FileNotFoundError:
+        return 0
+    unlinker = _Unlinker(max_workers or DEFAULT_DELETE_WORKERS, rate_limit)
+    removed_count = 0
+    try:
+        for trash_path, is_folder in trash_paths:
+            try:
+                if is_folder:
+                    unlinker.delete_folder(trash_path)
+                else:
+                    unlinker.unlink([trash_path])
+                removed_count += 1
+            except OSError as exc:
+                log_warning('Failed to remove trash.', trash_path, exc)
+    finally:
+        unlinker.shutdown()
+    return removed_count
+
+
+class _Unlinker:
+
+    def __init__(self, max_workers: int, rate_limit: float | None):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.throttle = Throttle(rate_limit) if rate_limit else None
+        self.pending: set[Future] = set()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def delete_folder(self, folder: str):
+        # Unlink files in parallel, then remove folders bottom-up, once all
+        # their files are gone.
+        folders: list[str] = []
+        batch: list[str] = []
+        for walk_folder, sub_folder_names, file_names in os.walk(folder):
+            folders.append(walk_folder)
+            # Symbolic links to folders are unlinked, not followed.
+            for name in sub_folder_names:
+                if os.path.islink(os.path.join(walk_folder, name)):
+                    file_names.append(name)
+            for name in file_names:
+                batch.append(os.path.join(walk_folder, name))
+                if len(batch) >= UNLINK_BATCH_SIZE:
+                    self.submit(batch)
+                    batch = []
+        if batch:
+            self.submit(batch)
+        self.finish()
+        for walk_folder in reversed(folders):
+            os.rmdir(walk_folder)
+
+    def submit(self, paths: list[str]):
+        # Bound the number of queued batches, and therefore memory use.
+        if len(self.pending) >= self.max_workers * UNLINK_QUEUE_DEPTH:
+            done, self.pending = wait(self.pending, return_when='FIRST_COMPLETED')
+            self._check(done)
+        self.pending.add(self.executor.submit(self.unlink, paths))
+
+    def finish(self):
+        done, _not_done = wait(self.pending)
+        self.pending = set()
+        self._check(done)
+
+    def unlink(self, paths: list[str]):
+        if self.throttle is not None:
+            self.throttle.acquire(len(paths))
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _check(done: set[Future]):
+        for future in done:
+            future.result()
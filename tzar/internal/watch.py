@@ -0,0 +1,318 @@
+# Copyright (C) 2021-2023, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Folder change notification.
+
+Uses Linux inotify through ctypes, without additional dependencies. Falls back
+to polling folder modification times where inotify is unavailable. Watches are
+not recursive, i.e. they report changes to the folder's own entries.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Protocol
+
+# inotify event masks, from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+INOTIFY_READ_SIZE = 65536
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+@dataclass(slots=True)
+class WatchEvent:
+    """Change to a watched folder."""
+    folder: Path
+    # Changed entry name, or None if the whole folder must be rescanned.
+    name: str | None
+    is_folder: bool = False
+    # True if the entry, or the folder itself if name is None, was removed.
+    removed: bool = False
+
+
+class FolderWatcher(Protocol):
+    """Folder watcher interface."""
+
+    def add_folder(self, folder: Path) -> bool:
+        """
+        Start watching a folder.
+
+        :param folder: folder path
+        :return: True if the folder is watched
+        """
+        ...
+
+    def remove_folder(self, folder: Path):
+        """
+        Stop watching a folder.
+
+        :param folder: folder path
+        """
+        ...
+
+    def read_events(self, timeout: float = None) -> list[WatchEvent]:
+        """
+        Wait for and read events.
+
+        :param timeout: optional maximum seconds to wait
+        :return: events, empty if the timeout expired
+        """
+        ...
+
+    def close(self):
+        """Release watcher resources."""
+        ...
+
+
+class InotifyWatcher:
+    """Folder watcher based on Linux inotify."""
+
+    def __init__(self):
+        """
+        Inotify watcher constructor.
+
+        :raise OSError: if inotify is not available
+        """
+        library_name = ctypes.util.find_library('c')
+        try:
+            self._libc = ctypes.CDLL(library_name, use_errno=True)
+            self._inotify_add_watch = self._libc.inotify_add_watch
+            self._inotify_rm_watch = self._libc.inotify_rm_watch
+            inotify_init1 = self._libc.inotify_init1
+        except (OSError, AttributeError) as exc:
+            raise OSError('Inotify is not available.') from exc
+        self._inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._folders_by_descriptor: dict[int, Path] = {}
+        self._descriptors_by_folder: dict[Path, int] = {}
+
+    def add_folder(self, folder: Path) -> bool:
+        """
+        Start watching a folder.
+
+        :param folder: folder path
+        :return: True if the folder is watched
+        """
+        descriptor = self._inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if descriptor < 0:
+            return False
+        self._folders_by_descriptor[descriptor] = folder
+        self._descriptors_by_folder[folder] = descriptor
+        return True
+
+    def remove_folder(self, folder: Path):
+        """
+        Stop watching a folder.
+
+        :param folder: folder path
+        """
+        descriptor = self._descriptors_by_folder.pop(folder, None)
+        if descriptor is not None:
+            self._folders_by_descriptor.pop(descriptor, None)
+            self._inotify_rm_watch(self.fd, descriptor)
+
+    def read_events(self, timeout: float = None) -> list[WatchEvent]:
+        """
+        Wait for and read events.
+
+        :param timeout: optional maximum seconds to wait
+        :return: events, empty if the timeout expired
+        """
+        readable, _writable, _errors = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, INOTIFY_READ_SIZE)
+        except BlockingIOError:
+            return []
+        events: list[WatchEvent] = []
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+            descriptor, mask, _cookie, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0')) or None
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so everything needs to be rescanned.
+                events.extend(WatchEvent(folder, None)
+                              for folder in self._descriptors_by_folder.keys())
+                continue
+            folder = self._folders_by_descriptor.get(descriptor)
+            if folder is None:
+                continue
+            if mask & IN_IGNORED:
+                self._folders_by_descriptor.pop(descriptor, None)
+                self._descriptors_by_folder.pop(folder, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                events.append(WatchEvent(folder, None, is_folder=True, removed=True))
+                continue
+            events.append(WatchEvent(folder,
+                                     name,
+                                     is_folder=bool(mask & IN_ISDIR),
+                                     removed=bool(mask & (IN_DELETE | IN_MOVED_FROM))))
+        return events
+
+    def close(self):
+        """Release watcher resources."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """Folder watcher that polls folder modification times."""
+
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        Polling watcher constructor.
+
+        :param poll_interval: seconds between polls
+        """
+        self.poll_interval = poll_interval
+        self._folder_times: dict[Path, int | None] = {}
+
+    def add_folder(self, folder: Path) -> bool:
+        """
+        Start watching a folder.
+
+        :param folder: folder path
+        :return: True if the folder is watched
+        """
+        folder_time = self._get_folder_time(folder)
+        if folder_time is None:
+            return False
+        self._folder_times[folder] = folder_time
+        return True
+
+    def remove_folder(self, folder: Path):
+        """
+        Stop watching a folder.
+
+        :param folder: folder path
+        """
+        self._folder_times.pop(folder, None)
+
+    def read_events(self, timeout: float = None) -> list[WatchEvent]:
+        """
+        Wait for and read events.
+
+        Changed folders are reported as needing a rescan.
+
+        :param timeout: optional maximum seconds to wait
+        :return: events, empty if the timeout expired
+        """
+        end_time = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            events: list[WatchEvent] = []
+            for folder, previous_time in list(self._folder_times.items()):
+                folder_time = self._get_folder_time(folder)
+                if folder_time != previous_time:
+                    if folder_time is None:
+                        del self._folder_times[folder]
+                        events.append(WatchEvent(folder, None, is_folder=True, removed=True))
+                    else:
+                        self._folder_times[folder] = folder_time
+                        events.append(WatchEvent(folder, None))
+            if events:
+                return events
+            delay = self.poll_interval
+            if end_time is not None:
+                delay = min(delay, end_time - time.monotonic())
+                if delay <= 0:
+                    return []
+            time.sleep(delay)
+
+    def close(self):
+        """Release watcher resources."""
+        self._folder_times.clear()
+
+    @staticmethod
+    def _get_folder_time(folder: Path) -> int | None:
+        try:
+            return folder.stat().st_mtime_ns
+        except OSError:
+            return None
+
+
+def create_folder_watcher(poll_interval: float = DEFAULT_POLL_INTERVAL) -> FolderWatcher:
+    """
+    Create inotify watcher, or polling watcher if inotify is unavailable.
+
+    :param poll_interval: seconds between polls for the polling watcher
+    :return: folder watcher
+    """
+    try:
+        return InotifyWatcher()
+    except OSError:
+        return PollingWatcher(poll_interval=poll_interval)
+
+
+def read_settled_events(watcher: FolderWatcher,
+                        timeout: float = None,
+                        settle_time: float = 0.5,
+                        max_settle_time: float = 5.0,
+                        ) -> list[WatchEvent]:
+    """
+    Wait for events, and keep reading until they stop arriving.
+
+    Bursts of events, e.g. while an archive is written, are combined.
+
+    :param watcher: folder watcher
+    :param timeout: optional maximum seconds to wait for the first events
+    :param settle_time: seconds without events that end a burst
+    :param max_settle_time: maximum seconds to keep reading a continuous burst
+    :return: events, empty if the timeout expired
+    """
+    events = watcher.read_events(timeout=timeout)
+    if events:
+        end_time = time.monotonic() + max_settle_time
+        while time.monotonic() < end_time:
+            more_events = watcher.read_events(
+                timeout=max(0.0, min(settle_time, end_time - time.monotonic())))
+            if not more_events:
+                break
+            events.extend(more_events)
+    return events
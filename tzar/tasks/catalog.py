@@ -18,15 +18,29 @@
 """Tzar catalog command."""
 
 import os
+from contextlib import closing
 
 import jiig
+from jiig.util.log import abort
 
 from tzar.internal import (
-    format_catalog_table,
+    CATALOG_FORMATS,
+    CATALOG_SORT_KEYS,
+    CatalogItem,
+    LiveCatalog,
+    create_folder_watcher,
+    format_catalog,
     get_catalog_spec,
+    get_catalog_timestamp_range,
     list_catalog,
+    paginate_catalog_items,
+    run_live_catalogs,
+    sort_catalog_items,
 )
 
+# ANSI sequence to home the cursor and clear the screen.
+CLEAR_SCREEN = '\x1b[H\x1b[2J'
+
 
 @jiig.task
 def catalog(
@@ -38,6 +52,12 @@ def catalog(
     interval_max: jiig.f.interval(),
     interval_min: jiig.f.interval(),
     tags: jiig.f.comma_list(),
+    ascending: jiig.f.boolean(),
+    watch: jiig.f.boolean(),
+    limit: jiig.f.integer() = None,
+    offset: jiig.f.integer() = None,
+    sort: jiig.f.text(choices=tuple(CATALOG_SORT_KEYS.keys())) = 'time',
+    output_format: jiig.f.text(choices=CATALOG_FORMATS) = 'table',
     unit_format: jiig.f.text(choices=('b', 'd')) = 'b',
     archive_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
     source_name: jiig.f.text() = os.path.basename(os.getcwd()),
@@ -54,6 +74,12 @@ def catalog(
     :param interval_max: Maximum interval (n[HMS]) between saves to consider.
     :param interval_min: Minimum interval (n[HMS]) between saves to consider.
     :param tags: Comma-separated archive tags.
+    :param ascending: Sort in ascending order.
+    :param watch: Keep listing the catalog as archives are saved or pruned.
+    :param limit: Maximum number of archives to list.
+    :param offset: Number of archives to skip.
+    :param sort: Sort key: time, size, name, or method (default: 'time').
+    :param output_format: Output format: table, json, ndjson, or csv (default: 'table').
     :param unit_format: 'b' for KiB/MiB/... or 'd' for KB/MB/... (default: 'b')
     :param archive_folder: Archive folder.
     :param source_name: Source name.
@@ -61,22 +87,62 @@ def catalog(
     """
     # Get full catalog spec based on user-provided one or default folder hierarchy.
     catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
-    with runtime.context(source_name=catalog_spec.source_name,
-                         archive_folder=catalog_spec.archive_folder,
-                         ) as context:
-        context.heading(1, '{source_name} archive catalog from "{archive_folder}"')
-        for line in format_catalog_table(
-            list_catalog(
-                runtime,
-                catalog_spec,
-                date_min=date_min,
-                date_max=date_max,
-                age_min=age_min,
-                age_max=age_max,
-                interval_min=interval_min,
-                interval_max=interval_max,
-                tags=tags,
-            ),
-            unit_format=unit_format,
-        ):
+
+    def _display(items: list[CatalogItem]):
+        items = paginate_catalog_items(sort_catalog_items(items, sort=sort, ascending=ascending),
+                                       offset=offset,
+                                       limit=limit)
+        if output_format == 'table':
+            with runtime.context(source_name=catalog_spec.source_name,
+                                 archive_folder=catalog_spec.archive_folder,
+                                 ) as context:
+                context.heading(1, '{source_name} archive catalog from "{archive_folder}"')
+        # Machine-readable output has no heading, so that it can be parsed as is.
+        for line in format_catalog(items, output_format=output_format, unit_format=unit_format):
             print(line)
+
+    if not watch:
+        _display(list_catalog(
+            runtime,
+            catalog_spec,
+            date_min=date_min,
+            date_max=date_max,
+            age_min=age_min,
+            age_max=age_max,
+            interval_min=interval_min,
+            interval_max=interval_max,
+            tags=tags,
+        ))
+        return
+
+    # Watch mode queries a live catalog that is updated by folder change events.
+    if not catalog_spec.archive_folder.is_dir():
+        abort('Catalog archive folder does not exist.', catalog_spec.archive_folder)
+    timestamp_min, timestamp_max = get_catalog_timestamp_range(date_min=date_min,
+                                                               date_max=date_max,
+                                                               age_min=age_min,
+                                                               age_max=age_max)
+
+    def _refresh(live_catalog: LiveCatalog):
+        if output_format == 'table':
+            print(CLEAR_SCREEN, end='')
+        _display(live_catalog.get_query_index(catalog_spec.source_name).query(
+            timestamp_min=timestamp_min,
+            timestamp_max=timestamp_max,
+            interval_min=interval_min,
+            interval_max=interval_max,
+            filter_tag_set=set(tags) if tags else None,
+        ))
+
+    live_catalog = LiveCatalog(catalog_spec.archive_folder,
+                               str(runtime.get_param('timestamp_format')))
+    _refresh(live_catalog)
+    try:
+        with closing(create_folder_watcher()) as watcher:
+            run_live_catalogs(runtime,
+                              [live_catalog],
+                              watcher,
+                              on_change=_refresh,
+                              record_database=False)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,95 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Tzar consolidate command.
+
+Merges a chain of archives, e.g. a full save and later saves of pending
+changes, into one new full archive, without extracting files.
+"""
+
+import jiig
+from jiig.util.log import abort
+
+from tzar.internal import (
+    METHOD_NAMES,
+    can_consolidate_to,
+    consolidate_archives,
+    get_catalog_spec,
+    get_consolidated_path,
+    list_catalog,
+)
+
+
+@jiig.task
+def consolidate(
+    runtime: jiig.Runtime,
+    age_max: jiig.f.age(),
+    age_min: jiig.f.age(),
+    date_max: jiig.f.timestamp(),
+    date_min: jiig.f.timestamp(),
+    tags: jiig.f.comma_list(),
+    new_tags: jiig.f.comma_list(),
+    replace: jiig.f.boolean(),
+    archive_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
+    source_name: jiig.f.text() = None,
+    source_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
+    target_method: jiig.f.text(choices=METHOD_NAMES) = 'xz',
+):
+    """
+    Merge archives into a new full archive.
+
+    Newer archives take precedence over older ones for the same file.
+
+    :param runtime: Jiig runtime API.
+    :param age_max: Maximum archive age [^age_option].
+    :param age_min: Minimum archive age [^age_option].
+    :param date_max: Maximum (latest) archive date.
+    :param date_min: Minimum (earliest) archive date.
+    :param tags: Comma-separated archive tags.
+    :param new_tags: Comma-separated tags for the new archive (default: full).
+    :param replace: Delete the merged archives.
+    :param archive_folder: Archive folder.
+    :param source_name: Source name.
+    :param source_folder: Source folder.
+    :param target_method: New archive method (default: xz).
+    """
+    if not can_consolidate_to(target_method):
+        abort(f'Can not consolidate to method: {target_method}')
+    catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
+    items = list_catalog(runtime,
+                         catalog_spec,
+                         date_min=date_min,
+                         date_max=date_max,
+                         age_min=age_min,
+                         age_max=age_max,
+                         tags=tags)
+    if len(items) < 2:
+        runtime.message('There is nothing to consolidate.')
+        return
+    if runtime.options.dry_run:
+        for item in items:
+            runtime.message(f'Merge (dry run): {item.display_name}')
+        archive_path = get_consolidated_path(runtime, catalog_spec, items, target_method, new_tags)
+        runtime.message(f'Consolidate (dry run): {archive_path.name}')
+        return
+    consolidate_archives(runtime,
+                         catalog_spec,
+                         items,
+                         target_method,
+                         tags=new_tags,
+                         replace=replace)
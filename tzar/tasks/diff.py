@@ -0,0 +1,69 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tzar diff command."""
+
+from pathlib import Path
+
+import jiig
+from jiig.util.filesystem import format_file_size
+
+from tzar.internal import diff_archives
+
+DIFF_CHANGE_FLAGS = {
+    'added': '+',
+    'removed': '-',
+    'changed': 'M',
+}
+
+
+@jiig.task
+def diff(
+    runtime: jiig.Runtime,
+    old_archive_path: jiig.f.filesystem_object(exists=True),
+    new_archive_path: jiig.f.filesystem_object(exists=True),
+    summary: jiig.f.boolean(),
+    unit_format: jiig.f.text(choices=('b', 'd')) = 'b',
+):
+    """
+    Compare the contents of two archives without extracting them.
+
+    :param runtime: Jiig runtime API.
+    :param old_archive_path: Path to old archive file or folder.
+    :param new_archive_path: Path to new archive file or folder.
+    :param summary: Only display totals.
+    :param unit_format: 'b' for KiB/MiB/... or 'd' for KB/MB/... (default: 'b')
+    """
+    counts = {change: 0 for change in DIFF_CHANGE_FLAGS.keys()}
+    size_delta = 0
+    for item in diff_archives(runtime, Path(old_archive_path), Path(new_archive_path)):
+        counts[item.change] += 1
+        size_delta += item.size_delta
+        if not summary:
+            if item.change == 'changed' and item.old_size is not None:
+                size_string = (f'{format_file_size(item.old_size, unit_format=unit_format)}'
+                               f' -> {format_file_size(item.new_size or 0, unit_format=unit_format)}')
+            elif item.change == 'removed' and item.old_size is not None:
+                size_string = format_file_size(item.old_size, unit_format=unit_format)
+            elif item.new_size is not None:
+                size_string = format_file_size(item.new_size, unit_format=unit_format)
+            else:
+                size_string = '-'
+            print(f'{DIFF_CHANGE_FLAGS[item.change]} {item.path}  ({size_string})')
+    delta_string = format_file_size(abs(size_delta), unit_format=unit_format)
+    runtime.message(f'{counts["added"]} added, {counts["removed"]} removed,'
+                    f' {counts["changed"]} changed, size {"-" if size_delta < 0 else "+"}{delta_string}')
@@ -0,0 +1,78 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tzar find command."""
+
+from time import (
+    localtime,
+    strftime,
+)
+
+import jiig
+from jiig.util.filesystem import format_file_size
+
+from tzar.internal import (
+    find_member_versions,
+    index_archive_contents,
+)
+
+
+@jiig.task
+def find(
+    runtime: jiig.Runtime,
+    pattern: jiig.f.text(),
+    changes: jiig.f.boolean(),
+    no_update: jiig.f.boolean(),
+    unit_format: jiig.f.text(choices=('b', 'd')) = 'b',
+    source_name: jiig.f.text() = None,
+):
+    """
+    Find archived files across all sources using the global catalog database.
+
+    Archive contents are indexed first, as needed.
+
+    :param runtime: Jiig runtime API.
+    :param pattern: File path, or glob pattern, relative to the source folder.
+    :param changes: Only show versions that changed since the previous archive.
+    :param no_update: Search without indexing new or changed archives.
+    :param unit_format: 'b' for KiB/MiB/... or 'd' for KB/MB/... (default: 'b')
+    :param source_name: Source name.
+    """
+    if not no_update:
+        indexed_count = index_archive_contents(runtime,
+                                               source_name=source_name,
+                                               verbose=runtime.options.verbose)
+        if indexed_count:
+            runtime.message(f'Indexed contents of {indexed_count} archives.')
+    versions = find_member_versions(runtime,
+                                    pattern,
+                                    source_name=source_name,
+                                    changes_only=changes)
+    if not versions:
+        runtime.message('No archived files found.')
+        return
+    previous_path: str | None = None
+    for version in versions:
+        if version.path != previous_path:
+            print(version.path)
+            previous_path = version.path
+        size_string = (format_file_size(version.size, unit_format=unit_format)
+                       if version.size is not None else '-')
+        print(f'  {"*" if version.changed else " "}'
+              f' {strftime("%Y-%m-%d %H:%M.%S", localtime(version.time))}'
+              f' {size_string:>10}'
+              f'  {version.archive_path}')
@@ -0,0 +1,71 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Tzar monitor command.
+
+Runs until interrupted, keeping archive folder catalog indexes and the global
+catalog database current as archives are saved and pruned. Catalog queries by
+other tzar commands then read current indexes instead of rescanning.
+"""
+
+from contextlib import closing
+from pathlib import Path
+
+import jiig
+
+from tzar.internal import (
+    LiveCatalog,
+    create_folder_watcher,
+    find_archive_folders,
+    run_live_catalogs,
+)
+
+
+@jiig.task
+def monitor(
+    runtime: jiig.Runtime,
+    root_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
+):
+    """
+    Keep catalog indexes current while archives change.
+
+    :param runtime: Jiig runtime API.
+    :param root_folder: Root folder to search for archive folders (default: base archive folder).
+    """
+    if root_folder is None:
+        root_folder = Path(str(runtime.get_param('archive_folder'))).expanduser()
+    timestamp_format = str(runtime.get_param('timestamp_format'))
+    live_catalogs = [
+        LiveCatalog(archive_folder, timestamp_format)
+        for archive_folder in find_archive_folders(Path(root_folder))
+    ]
+    runtime.message(f'Monitoring {len(live_catalogs)} archive folders.')
+
+    def _report(live_catalog: LiveCatalog):
+        if runtime.options.verbose:
+            runtime.message(f'Updated: {live_catalog.archive_folder}')
+
+    try:
+        with closing(create_folder_watcher()) as watcher:
+            run_live_catalogs(runtime,
+                              live_catalogs,
+                              watcher,
+                              on_change=_report,
+                              root_folder=Path(root_folder))
+    except KeyboardInterrupt:
+        pass
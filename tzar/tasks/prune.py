@@ -19,20 +19,33 @@
 Tzar prune command.
 
 Pruning options provide flexibility for specifying different algorithms for
-choosing which archives to purge.
+choosing which archives to purge. The --keep-* options select a
+grandfather-father-son retention policy instead of interval-based pruning.
+The --max-*-size options delete additional archives to fit size budgets.
+
+Deleted archives are moved to a hidden trash folder, so that pruning returns
+without waiting for their files to be removed. The trash is emptied in parallel
+at the start of the next prune, or by the --empty-trash option.
 
 Due to the destructive nature of these actions, an action summary is displayed,
 followed by a confirmation prompt. A NO_CONFIRMATION option can disable the
 confirmation prompt, e.g. for automation scripts.
 """
 
+from pathlib import Path
+
 import jiig
-from jiig.util.filesystem import delete_file, delete_folder
+from jiig.util.log import abort
 
 from tzar.internal import (
-    format_catalog_table,
+    PrunePlan,
+    RetentionPolicy,
+    apply_prune_plan,
+    empty_trash,
     get_catalog_spec,
-    list_catalog,
+    has_trash,
+    parse_size,
+    plan_prune,
 )
 
 
@@ -46,7 +59,20 @@ def prune(
     interval_max: jiig.f.interval(),
     interval_min: jiig.f.interval(),
     tags: jiig.f.comma_list(),
+    keep_last: jiig.f.integer(),
+    keep_hourly: jiig.f.integer(),
+    keep_daily: jiig.f.integer(),
+    keep_weekly: jiig.f.integer(),
+    keep_monthly: jiig.f.integer(),
+    keep_yearly: jiig.f.integer(),
+    max_total_size: jiig.f.text(),
+    max_tag_size: jiig.f.comma_list(),
     no_confirmation: jiig.f.boolean(),
+    delete_workers: jiig.f.integer(),
+    delete_rate: jiig.f.integer(),
+    empty_trash: jiig.f.boolean(),
+    plan_file: jiig.f.text(),
+    apply_plan: jiig.f.filesystem_object(exists=True),
     archive_folder: jiig.f.filesystem_folder(absolute_path=True),
     source_name: jiig.f.text(),
     source_folder: jiig.f.filesystem_folder(absolute_path=True),
@@ -62,26 +88,56 @@ def prune(
     :param interval_max: Maximum interval (n[HMS]) between saves to consider.
     :param interval_min: Minimum interval (n[HMS]) between saves to consider (default: 1H).
     :param tags: Comma-separated archive tags.
+    :param keep_last: Number of newest archives to keep.
+    :param keep_hourly: Number of hours to keep the newest archive for.
+    :param keep_daily: Number of days to keep the newest archive for.
+    :param keep_weekly: Number of weeks to keep the newest archive for.
+    :param keep_monthly: Number of months to keep the newest archive for.
+    :param keep_yearly: Number of years to keep the newest archive for.
+    :param max_total_size: Maximum total size of kept archives, e.g. 500G.
+    :param max_tag_size: Comma-separated maximum sizes of kept archives by tag, e.g. daily=100G.
     :param no_confirmation: Execute destructive actions without prompting for confirmation.
+    :param delete_workers: Number of parallel deletion threads (default: 8).
+    :param delete_rate: Maximum number of files to delete per second.
+    :param empty_trash: Only remove archives deleted by earlier prunes from the trash.
+    :param plan_file: Save the prune plan as JSON to this file without deleting anything.
+    :param apply_plan: Apply a prune plan previously saved as JSON.
     :param archive_folder: Archive folder.
     :param source_name: Source name.
     :param source_folder: Source folder.
     """
-    if interval_min is None:
-        interval_min = 3600
-    catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
-    all_items = list_catalog(
-        runtime,
-        catalog_spec,
-        date_min=date_min,
-        date_max=date_max,
-        age_min=age_min,
-        age_max=age_max,
-        tags=tags,
-    )
-    kept_names = [
-        item.display_name
-        for item in list_catalog(
+    if empty_trash:
+        catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
+        if not _empty_trash(runtime, catalog_spec.archive_folder, delete_workers, delete_rate):
+            runtime.message('The trash is empty.')
+        return
+    if apply_plan:
+        plan = PrunePlan.load(Path(apply_plan))
+        _empty_trash(runtime, plan.archive_folder, delete_workers, delete_rate)
+    else:
+        retention_policy = RetentionPolicy(last=keep_last,
+                                           hourly=keep_hourly,
+                                           daily=keep_daily,
+                                           weekly=keep_weekly,
+                                           monthly=keep_monthly,
+                                           yearly=keep_yearly)
+        try:
+            max_total_size_bytes = parse_size(max_total_size) if max_total_size else None
+            max_tag_sizes: dict[str, int] = {}
+            for tag_size in max_tag_size or []:
+                tag, size_text = tag_size.split('=', maxsplit=1)
+                max_tag_sizes[tag.strip()] = parse_size(size_text)
+        except ValueError as exc:
+            abort('Bad size budget.', exc)
+        if retention_policy.is_active:
+            if interval_min is not None or interval_max is not None:
+                abort('Interval options can not be combined with --keep-* options.')
+        elif interval_min is None and max_total_size_bytes is None and not max_tag_sizes:
+            # Size budgets alone do not imply interval-based pruning.
+            interval_min = 3600
+        catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
+        _empty_trash(runtime, catalog_spec.archive_folder, delete_workers, delete_rate)
+        plan = plan_prune(
             runtime,
             catalog_spec,
             date_min=date_min,
@@ -91,31 +147,39 @@ def prune(
             interval_min=interval_min,
             interval_max=interval_max,
             tags=tags,
+            retention_policy=retention_policy,
+            max_total_size=max_total_size_bytes,
+            max_tag_sizes=max_tag_sizes,
         )
-    ]
-    deleted_items = [
-        item
-        for item in all_items
-        if item.display_name not in kept_names
-    ]
-    deleted_names = [item.display_name for item in deleted_items]
-    if deleted_names:
-        with runtime.context(archive_folder=catalog_spec.archive_folder) as context:
+        if plan_file:
+            plan_path = Path(plan_file).expanduser().absolute()
+            plan.save(plan_path)
+            runtime.message(f'Saved prune plan: {plan_path}')
+            return
+    if plan.delete_names:
+        with runtime.context(archive_folder=plan.archive_folder) as context:
             context.heading(1, 'items to purge from "{archive_folder}"')
-            for line in format_catalog_table(all_items,
-                                             flagged_names=deleted_names,
-                                             flag_text='*purge*'):
+            for line in plan.format_lines():
                 print(line)
             print('')
             if no_confirmation or context.boolean_prompt('Purge above items', default=False):
                 print('')
-                for deleted_item in deleted_items:
-                    context.message(f'Deleting: {deleted_item.display_name}')
-                    if deleted_item.path.is_dir():
-                        delete_folder(deleted_item.path, quiet=True)
-                    else:
-                        delete_file(deleted_item.path, quiet=True)
+                if apply_prune_plan(runtime, plan):
+                    runtime.message('Deleted archives are removed from the trash by the'
+                                    ' next prune or by "prune --empty-trash".')
             else:
                 print('Cancelled.')
     else:
         runtime.message('There is nothing to prune.')
+
+
+def _empty_trash(runtime: jiig.Runtime,
+                 archive_folder: Path,
+                 delete_workers: int | None,
+                 delete_rate: int | None,
+                 ) -> bool:
+    if not has_trash(archive_folder):
+        return False
+    runtime.message('Removing archives deleted by an earlier prune from the trash...')
+    empty_trash(archive_folder, max_workers=delete_workers, rate_limit=delete_rate)
+    return True
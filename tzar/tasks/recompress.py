@@ -0,0 +1,102 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Tzar recompress command.
+
+Transcodes older tarball archives to a denser compression method as a stream,
+without extracting files. Archives keep their names, apart from the extension,
+so that they keep their place in the catalog.
+"""
+
+import jiig
+from jiig.util.log import abort
+
+from tzar.internal import (
+    METHOD_NAMES,
+    can_recompress,
+    get_catalog_spec,
+    list_catalog,
+    parse_size,
+    recompress_archives,
+)
+
+
+@jiig.task
+def recompress(
+    runtime: jiig.Runtime,
+    age_max: jiig.f.age(),
+    age_min: jiig.f.age(),
+    date_max: jiig.f.timestamp(),
+    date_min: jiig.f.timestamp(),
+    tags: jiig.f.comma_list(),
+    workers: jiig.f.integer(),
+    rate: jiig.f.text(),
+    archive_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
+    source_name: jiig.f.text() = None,
+    source_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
+    method: jiig.f.text(choices=METHOD_NAMES) = None,
+    target_method: jiig.f.text(choices=METHOD_NAMES) = 'xz',
+):
+    """
+    Recompress archives using a different method.
+
+    :param runtime: Jiig runtime API.
+    :param age_max: Maximum archive age [^age_option].
+    :param age_min: Minimum archive age [^age_option].
+    :param date_max: Maximum (latest) archive date.
+    :param date_min: Minimum (earliest) archive date.
+    :param tags: Comma-separated archive tags.
+    :param workers: Number of concurrent recompressions (default: 2).
+    :param rate: Maximum uncompressed bytes per second for all recompressions, e.g. 50M.
+    :param archive_folder: Archive folder.
+    :param source_name: Source name.
+    :param source_folder: Source folder.
+    :param method: Recompress only archives using this method.
+    :param target_method: New archive method (default: xz).
+    """
+    try:
+        rate_limit = parse_size(rate) if rate else None
+    except ValueError as exc:
+        abort('Bad recompression rate.', exc)
+    catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
+    items = [
+        item
+        for item in list_catalog(runtime,
+                                 catalog_spec,
+                                 date_min=date_min,
+                                 date_max=date_max,
+                                 age_min=age_min,
+                                 age_max=age_max,
+                                 tags=tags)
+        if ((method is None or item.method_name == method)
+            and can_recompress(item.method_name, target_method))
+    ]
+    if not items:
+        runtime.message('There is nothing to recompress.')
+        return
+    if runtime.options.dry_run:
+        for item in items:
+            runtime.message(f'Recompress (dry run): {item.display_name}')
+        return
+    recompressed_count = recompress_archives(runtime,
+                                             catalog_spec.archive_folder,
+                                             items,
+                                             target_method,
+                                             max_workers=workers,
+                                             rate_limit=rate_limit)
+    runtime.message(f'Recompressed {recompressed_count} of {len(items)} archives.')
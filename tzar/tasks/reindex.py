@@ -0,0 +1,41 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tzar reindex command."""
+
+from pathlib import Path
+
+import jiig
+
+from tzar.internal import reindex_catalog_database
+
+
+@jiig.task
+def reindex(
+    runtime: jiig.Runtime,
+    root_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
+):
+    """
+    Rebuild the global catalog database from archive folders.
+
+    :param runtime: Jiig runtime API.
+    :param root_folder: Root folder to search for archive folders (default: base archive folder).
+    """
+    if root_folder is None:
+        root_folder = Path(str(runtime.get_param('archive_folder'))).expanduser()
+    folder_count, archive_count = reindex_catalog_database(runtime, Path(root_folder))
+    runtime.message(f'Indexed {archive_count} archives in {folder_count} archive folders.')
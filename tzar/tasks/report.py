@@ -0,0 +1,76 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tzar report command."""
+
+import jiig
+
+from tzar.internal import (
+    METHOD_NAMES,
+    SORT_COLUMNS,
+    format_catalog_table,
+    query_catalog_database,
+)
+
+
+@jiig.task
+def report(
+    runtime: jiig.Runtime,
+    age_max: jiig.f.age(),
+    age_min: jiig.f.age(),
+    date_max: jiig.f.timestamp(),
+    date_min: jiig.f.timestamp(),
+    tags: jiig.f.comma_list(),
+    ascending: jiig.f.boolean(),
+    limit: jiig.f.integer() = None,
+    sort: jiig.f.text(choices=list(SORT_COLUMNS.keys())) = 'time',
+    unit_format: jiig.f.text(choices=('b', 'd')) = 'b',
+    method: jiig.f.text(choices=METHOD_NAMES) = None,
+    source_name: jiig.f.text() = None,
+):
+    """
+    Report archives across all sources from the global catalog database.
+
+    :param runtime: Jiig runtime API.
+    :param age_max: Maximum archive age [^age_option].
+    :param age_min: Minimum archive age [^age_option].
+    :param date_max: Maximum (latest) archive date.
+    :param date_min: Minimum (earliest) archive date.
+    :param tags: Comma-separated archive tags.
+    :param ascending: Sort in ascending order.
+    :param limit: Maximum number of archives to report.
+    :param sort: Sort order: time, size, source, or method (default: time).
+    :param unit_format: 'b' for KiB/MiB/... or 'd' for KB/MB/... (default: 'b')
+    :param method: Archive method.
+    :param source_name: Source name.
+    """
+    items = query_catalog_database(runtime,
+                                   source_name=source_name,
+                                   method_name=method,
+                                   tags=tags,
+                                   date_min=date_min,
+                                   date_max=date_max,
+                                   age_min=age_min,
+                                   age_max=age_max,
+                                   sort=sort,
+                                   ascending=ascending,
+                                   limit=limit)
+    if not items:
+        runtime.message('No archives found.')
+        return
+    for line in format_catalog_table(items, unit_format=unit_format):
+        print(line)
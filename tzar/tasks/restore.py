@@ -0,0 +1,45 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tzar restore command."""
+
+from pathlib import Path
+
+import jiig
+
+from tzar.internal import restore_file
+
+
+@jiig.task
+def restore(
+    runtime: jiig.Runtime,
+    archive_path: jiig.f.filesystem_object(exists=True),
+    member_path: jiig.f.text(),
+    output_path: jiig.f.text() = None,
+):
+    """
+    Restore one file from an archive, rebuilding it from deltas as needed.
+
+    :param runtime: Jiig runtime API.
+    :param archive_path: Path to archive file or folder.
+    :param member_path: File path in the archive, relative to the source folder.
+    :param output_path: Output file path (default: file name in the working folder).
+    """
+    if output_path is None:
+        output_path = Path(member_path).name
+    restore_file(runtime, Path(archive_path), member_path, Path(output_path).absolute())
+    runtime.message(f'Restored: {output_path}')
@@ -17,11 +17,19 @@
 
 """Tzar save command."""
 
+from pathlib import Path
+
 import jiig
+from jiig.util.log import abort
 
 from tzar.internal import (
     METHOD_NAMES,
+    SHARDS_METHOD_SUFFIX,
+    SaveDestination,
     get_catalog_spec,
+    get_latest_fingerprint,
+    get_source_fingerprint,
+    parse_size,
     save_archive,
 )
 
@@ -30,12 +38,17 @@ from tzar.internal import (
 def save(
     runtime: jiig.Runtime,
     exclude: jiig.f.text(repeat=()),
+    destination: jiig.f.text(repeat=()),
     progress: jiig.f.boolean(),
     disable_timestamp: jiig.f.boolean(),
     gitignore: jiig.f.boolean(),
     keep_list: jiig.f.boolean(),
     pending: jiig.f.boolean(),
+    skip_unchanged: jiig.f.boolean(),
     tags: jiig.f.comma_list(),
+    delta_min_size: jiig.f.text(),
+    delta_chain: jiig.f.integer() = None,
+    shards: jiig.f.integer() = None,
     archive_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
     source_name: jiig.f.text() = None,
     source_folder: jiig.f.filesystem_folder(absolute_path=True) = None,
@@ -46,12 +59,18 @@ def save(
 
     :param runtime: Jiig runtime API.
     :param exclude: Exclusion pattern(s), including gitignore-style wildcards.
+    :param destination: Additional archive folder(s), as FOLDER or FOLDER:METHOD.
     :param progress: Display progress statistics.
     :param disable_timestamp: Disable adding timestamp to name.
     :param gitignore: Use .gitignore exclusions.
     :param keep_list: Do not delete temporary file list when done.
     :param pending: Save only modified version-controlled files.
+    :param skip_unchanged: Skip saving if no files changed since the newest archive.
     :param tags: Comma-separated archive tags.
+    :param delta_min_size: Save files at least this large, e.g. 100M, as deltas
+                           against their previous version.
+    :param delta_chain: Maximum deltas in a row before a file is saved in full.
+    :param shards: Save a shard set with this many tarballs, created concurrently.
     :param archive_folder: Archive folder.
     :param source_name: Source name.
     :param source_folder: Source folder.
@@ -59,11 +78,43 @@ def save(
     """
     if method is None:
         method = str(runtime.get_param('method'))
+    if shards is not None:
+        if shards < 1:
+            abort('The number of shards must be positive.')
+        if not method.endswith(SHARDS_METHOD_SUFFIX):
+            method += SHARDS_METHOD_SUFFIX
+        if method not in METHOD_NAMES:
+            abort('Sharding is only supported for tarball methods.', method)
+    try:
+        delta_min_size_bytes = parse_size(delta_min_size) if delta_min_size else None
+    except ValueError as exc:
+        abort('Bad delta minimum size.', exc)
+    if delta_chain is not None and delta_chain < 1:
+        abort('The delta chain limit must be positive.')
     excludes: list[str] = runtime.get_param('exclusions')
     if exclude:
         excludes.extend(exclude)
+    catalog_spec = get_catalog_spec(runtime, source_folder, archive_folder, source_name)
+    destinations: list[SaveDestination] = []
+    for destination_spec in destination:
+        destination_folder, _separator, destination_method = destination_spec.rpartition(':')
+        if not destination_folder or destination_method not in METHOD_NAMES:
+            destination_folder, destination_method = destination_spec, method
+        destinations.append(
+            SaveDestination(Path(destination_folder).expanduser().absolute(), destination_method))
+    fingerprint: str | None = None
+    if skip_unchanged:
+        if pending:
+            abort('The skip-unchanged option can not be combined with pending.')
+        fingerprint = get_source_fingerprint(runtime,
+                                             catalog_spec.source_folder,
+                                             gitignore=gitignore,
+                                             excludes=excludes).digest
+        if fingerprint == get_latest_fingerprint(runtime, catalog_spec):
+            runtime.message('Source is unchanged since the newest archive.')
+            return
     save_archive(runtime,
-                 get_catalog_spec(runtime, source_folder, archive_folder, source_name),
+                 catalog_spec,
                  method,
                  gitignore=gitignore,
                  excludes=excludes,
@@ -71,4 +122,9 @@ def save(
                  timestamp=not disable_timestamp,
                  progress=progress,
                  keep_list=keep_list,
+                 fingerprint=fingerprint,
+                 destinations=destinations,
+                 shard_count=shards or 0,
+                 delta_min_size=delta_min_size_bytes,
+                 delta_chain_limit=delta_chain,
                  tags=tags)
@@ -0,0 +1,96 @@
+# Copyright (C) 2021-2022, Steven Cooper
+#
+# This file is part of Tzar.
+#
+# Tzar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tzar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tzar.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Tzar watch command.
+
+Runs until interrupted, saving archives of source folders when their files
+change, instead of on a fixed schedule. Idle sources are not saved.
+"""
+
+from contextlib import closing
+
+import jiig
+from jiig.util.log import abort
+
+from tzar.internal import (
+    METHOD_NAMES,
+    AutoSaver,
+    SaveSchedule,
+    create_folder_watcher,
+    get_catalog_spec,
+)
+
+
+@jiig.task
+def watch(
+    runtime: jiig.Runtime,
+    exclude: jiig.f.text(repeat=()),
+    gitignore: jiig.f.boolean(),
+    tags: jiig.f.comma_list(),
+    debounce: jiig.f.interval() = None,
+    min_interval: jiig.f.interval() = None,
+    max_staleness: jiig.f.interval() = None,
+    method: jiig.f.text(choices=METHOD_NAMES) = None,
+    source_folders: jiig.f.filesystem_folder(absolute_path=True, repeat=()) = None,
+):
+    """
+    Save archives of source folders when they change.
+
+    :param runtime: Jiig runtime API.
+    :param exclude: Exclusion pattern(s), including gitignore-style wildcards.
+    :param gitignore: Use .gitignore exclusions.
+    :param tags: Comma-separated archive tags.
+    :param debounce: Quiet time after changes before saving (default: 30 seconds).
+    :param min_interval: Minimum time between saves of a source (default: 10 minutes).
+    :param max_staleness: Maximum time changes may remain unsaved (default: 1 hour).
+    :param method: Archive method.
+    :param source_folders: Source folder(s) (default: working folder).
+    """
+    if method is None:
+        method = str(runtime.get_param('method'))
+    excludes: list[str] = runtime.get_param('exclusions')
+    if exclude:
+        excludes.extend(exclude)
+    schedule = SaveSchedule()
+    if debounce is not None:
+        schedule.debounce = debounce
+    if min_interval is not None:
+        schedule.min_interval = min_interval
+    if max_staleness is not None:
+        schedule.max_staleness = max_staleness
+    if schedule.max_staleness < schedule.debounce:
+        abort('Maximum staleness must not be less than the debounce time.')
+    catalog_specs = [
+        get_catalog_spec(runtime, source_folder)
+        for source_folder in (source_folders or [None])
+    ]
+    runtime.message(f'Watching {len(catalog_specs)} source folders.')
+    try:
+        with closing(create_folder_watcher()) as watcher:
+            auto_saver = AutoSaver(runtime,
+                                   catalog_specs,
+                                   watcher,
+                                   method,
+                                   schedule,
+                                   tags=tags,
+                                   gitignore=gitignore,
+                                   excludes=excludes)
+            auto_saver.start()
+            auto_saver.run()
+    except KeyboardInterrupt:
+        pass